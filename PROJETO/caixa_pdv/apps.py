@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class CaixaPdvConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'caixa_pdv'
+
+    def ready(self):
+        # Registra os sinais que mantêm o índice de busca de lotes e os
+        # fechamentos e as sessões de caixa atualizados e o ajuste das conexões SQLite.
+        from . import banco, busca, fechamento, sessoes  # noqa: F401
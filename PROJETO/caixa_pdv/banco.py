@@ -0,0 +1,111 @@
+# caixa_pdv/banco.py
+"""
+Ajustes de concorrência do SQLite para vários terminais gravando ao mesmo tempo.
+
+Cada conexão nova recebe os PRAGMAs de journal_mode (WAL: leitores não
+bloqueiam o escritor), busy_timeout e synchronous.
+
+As transações de escrita do PDV passam por 'transacao_com_retentativa', que
+as abre com BEGIN IMMEDIATE: a trava de escrita é pedida logo no início e a
+espera fica por conta do busy_timeout, em vez de falhar no meio da transação.
+Se mesmo assim o banco continuar travado, a transação inteira é refeita
+algumas vezes, com espera crescente. Os demais atomic() (admin, leituras,
+comandos) continuam com o BEGIN padrão (DEFERRED), para não disputar a trava
+de escrita com os caixas sem necessidade; por isso 'transaction_mode' não é
+definido em DATABASES.
+"""
+import functools
+import random
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+SQLITE_JOURNAL_MODE = getattr(settings, 'PDV_SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_BUSY_TIMEOUT_MS = getattr(settings, 'PDV_SQLITE_BUSY_TIMEOUT_MS', 5000)
+SQLITE_SYNCHRONOUS = getattr(settings, 'PDV_SQLITE_SYNCHRONOUS', 'NORMAL')
+
+# Tentativas (incluindo a primeira) e espera base, em segundos, entre elas.
+TRANSACAO_TENTATIVAS = getattr(settings, 'PDV_TRANSACAO_TENTATIVAS', 3)
+TRANSACAO_ESPERA = getattr(settings, 'PDV_TRANSACAO_ESPERA', 0.1)
+
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+
+def _banco_em_memoria(conexao):
+    nome = str(conexao.settings_dict.get('NAME') or '')
+    return nome == ':memory:' or 'mode=memory' in nome
+
+
+@receiver(connection_created)
+def configurar_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'PRAGMA busy_timeout = {int(SQLITE_BUSY_TIMEOUT_MS)}')
+        # O modo do journal fica gravado no arquivo; bancos em memória não usam WAL.
+        if SQLITE_JOURNAL_MODE and SQLITE_JOURNAL_MODE.upper() in JOURNAL_MODES and not _banco_em_memoria(connection):
+            cursor.execute(f'PRAGMA journal_mode = {SQLITE_JOURNAL_MODE.upper()}')
+        if SQLITE_SYNCHRONOUS and SQLITE_SYNCHRONOUS.upper() in SYNCHRONOUS:
+            cursor.execute(f'PRAGMA synchronous = {SQLITE_SYNCHRONOUS.upper()}')
+
+
+def banco_travado(erro):
+    """Indica se o OperationalError é de trava do SQLite ('database is locked'/'busy')."""
+    mensagem = str(erro).lower()
+    return 'locked' in mensagem or 'busy' in mensagem
+
+
+@contextmanager
+def begin_immediate():
+    """
+    Faz o próximo atomic() mais externo desta conexão abrir com BEGIN IMMEDIATE.
+    Dentro de outra transação (ou fora do SQLite) não muda nada.
+    """
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        yield
+        return
+    # A conexão lê 'transaction_mode' das OPTIONS ao abrir: abre antes de trocar.
+    connection.ensure_connection()
+    anterior = connection.transaction_mode
+    connection.transaction_mode = 'IMMEDIATE'
+    try:
+        yield
+    finally:
+        connection.transaction_mode = anterior
+
+
+def transacao_com_retentativa(func=None, *, tentativas=None, espera=None):
+    """
+    Executa a função dentro de transaction.atomic(), aberta com BEGIN
+    IMMEDIATE quando é a transação mais externa, e, se o banco estiver
+    travado, desfaz e tenta de novo, até 'tentativas' vezes, esperando
+    espera * 2^n (mais uma fração aleatória) entre as tentativas.
+
+    Só repete quando é a transação mais externa: dentro de outro atomic()
+    o erro é propagado, pois a transação de fora já está perdida.
+    Pode ser usada como @transacao_com_retentativa ou com argumentos.
+    """
+    if func is None:
+        return functools.partial(transacao_com_retentativa, tentativas=tentativas, espera=espera)
+
+    total = max(int(tentativas or TRANSACAO_TENTATIVAS), 1)
+    base = TRANSACAO_ESPERA if espera is None else espera
+
+    @functools.wraps(func)
+    def executar(*args, **kwargs):
+        for tentativa in range(total):
+            externa = not connection.in_atomic_block
+            try:
+                with begin_immediate(), transaction.atomic():
+                    return func(*args, **kwargs)
+            except OperationalError as e:
+                if not externa or not banco_travado(e) or tentativa == total - 1:
+                    raise
+            time.sleep(base * (2 ** tentativa) * (1 + random.random()))
+
+    return executar
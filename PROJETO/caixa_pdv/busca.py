@@ -0,0 +1,381 @@
+# caixa_pdv/busca.py
+import logging
+import threading
+import time
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from lotes.models import Lote, versao_texto_lotes
+from produtos.models import Produto
+from produtos.busca_textual import dobrar_acentos, ids_lotes_ranqueados
+
+logger = logging.getLogger(__name__)
+
+# Motor usado por search_lotes_api: 'memoria' (IndiceLotes) ou 'fts' (FTS5 do
+# SQLite, ver produtos.busca_textual). Sem FTS5, 'fts' volta ao índice em memória.
+BUSCA_LOTES_BACKEND = getattr(settings, 'PDV_BUSCA_LOTES_BACKEND', 'memoria')
+
+# Paginação e cache das respostas de search_lotes_api.
+BUSCA_LIMITE_PADRAO = getattr(settings, 'PDV_BUSCA_LIMITE_PADRAO', 20)
+BUSCA_LIMITE_MAXIMO = getattr(settings, 'PDV_BUSCA_LIMITE_MAXIMO', 100)
+BUSCA_CACHE_TTL = getattr(settings, 'PDV_BUSCA_CACHE_TTL', 10)
+
+# Cache LRU da leitura de código de barras: número máximo de entradas e
+# validade de cada entrada (curta, pois o estoque muda em outros workers).
+CACHE_SCAN_TAMANHO = getattr(settings, 'PDV_CACHE_SCAN_TAMANHO', 256)
+CACHE_SCAN_TTL = getattr(settings, 'PDV_CACHE_SCAN_TTL', 30)
+
+
+def lote_para_pdv(lote):
+    """
+    Representação de um lote usada pelas APIs do PDV (busca e leitura de código de barras).
+    """
+    imagem_url = None
+    if lote.produto and lote.produto.imagem:
+        try:
+            imagem_url = lote.produto.imagem.url
+        except ValueError:
+            imagem_url = None
+        except Exception as e:
+            logger.warning("Erro ao obter URL da imagem para produto %s: %s", lote.produto.id, e)
+            imagem_url = None
+
+    return {
+        'id': lote.id,
+        'codigo_lote': lote.codigo,
+        'quantidade_estoque': lote.quantidade,
+        'preco_unitario': str(lote.preco_unitario),
+        'nome_produto': lote.produto.variedade if lote.produto and lote.produto.variedade else (lote.produto.get_tipo_display() if lote.produto else 'Produto Desconhecido'),
+        'imagem_produto_url': imagem_url,
+    }
+
+
+class IndiceLotes:
+    """
+    Índice de busca em memória dos lotes do PDV.
+
+    Cada lote é indexado por prefixos das palavras (código, variedade e tipo)
+    e por trigramas do texto completo, tudo sem acentos. A busca devolve apenas
+    ids ordenados por relevância; os dados de estoque e preço são lidos do banco
+    pela chave primária, para nunca exibir estoque desatualizado.
+
+    Os sinais mantêm o índice em dia dentro do processo; alterações de texto
+    feitas por outros processos (workers) aparecem como mudança de
+    versao_texto_lotes(), e o índice é reconstruído na busca seguinte. Vendas e
+    outras mudanças de estoque não alteram essa versão. A versão é conferida
+    fora da trava das buscas, e uma reconstrução não bloqueia as buscas em
+    andamento: o índice novo é montado à parte e trocado no final.
+    """
+    TAMANHO_NGRAMA = 3
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._lock_construcao = threading.Lock()
+        self._documentos = {}
+        self._prefixos = defaultdict(set)
+        self._ngramas = defaultdict(set)
+        self._versao = None
+
+    @property
+    def construido(self):
+        return self._versao is not None
+
+    def _documento(self, lote):
+        produto = lote.produto
+        codigo = dobrar_acentos(lote.codigo)
+        variedade = dobrar_acentos(produto.variedade) if produto else ''
+        tipo = ' '.join(sorted({dobrar_acentos(produto.tipo), dobrar_acentos(produto.get_tipo_display())})) if produto else ''
+        nome = variedade or tipo
+
+        palavras = {codigo, *variedade.split(), *tipo.split()}
+        palavras.discard('')
+        prefixos = {palavra[:i] for palavra in palavras for i in range(1, len(palavra) + 1)}
+
+        texto = f"{codigo} {variedade} {tipo}"
+        ngramas = {
+            campo[i:i + self.TAMANHO_NGRAMA]
+            for campo in (codigo, variedade, tipo)
+            for i in range(len(campo) - self.TAMANHO_NGRAMA + 1)
+        }
+        return {
+            'codigo': codigo,
+            'variedade': variedade,
+            'tipo': tipo,
+            'nome': nome,
+            'texto': texto,
+            'prefixos': prefixos,
+            'ngramas': ngramas,
+        }
+
+    def _adicionar(self, lote_id, documento):
+        self._documentos[lote_id] = documento
+        for prefixo in documento['prefixos']:
+            self._prefixos[prefixo].add(lote_id)
+        for ngrama in documento['ngramas']:
+            self._ngramas[ngrama].add(lote_id)
+
+    def _remover(self, lote_id):
+        documento = self._documentos.pop(lote_id, None)
+        if documento is None:
+            return
+        for chave, indice in (('prefixos', self._prefixos), ('ngramas', self._ngramas)):
+            for termo in documento[chave]:
+                ids = indice.get(termo)
+                if ids is not None:
+                    ids.discard(lote_id)
+                    if not ids:
+                        del indice[termo]
+
+    def construir(self):
+        """
+        (Re)constrói o índice inteiro a partir do banco, numa única consulta.
+        """
+        # Lida antes dos lotes: uma alteração durante a leitura gera nova reconstrução.
+        versao = versao_texto_lotes()
+        lotes = Lote.objects.select_related('produto').only(
+            'id', 'codigo', 'produto__variedade', 'produto__tipo'
+        )
+        novo = IndiceLotes()
+        for lote in lotes.iterator(chunk_size=1000):
+            novo._adicionar(lote.id, novo._documento(lote))
+
+        with self._lock:
+            self._documentos = novo._documentos
+            self._prefixos = novo._prefixos
+            self._ngramas = novo._ngramas
+            self._versao = versao
+
+    def atualizar_lote(self, lote):
+        with self._lock:
+            if not self.construido:
+                return
+            self._remover(lote.id)
+            self._adicionar(lote.id, self._documento(lote))
+
+    def remover_lote(self, lote_id):
+        with self._lock:
+            if self.construido:
+                self._remover(lote_id)
+
+    def _garantir_construido(self):
+        """
+        Reconstrói o índice se o texto dos lotes mudou em outro processo. A
+        consulta da versão é feita sem a trava das buscas; só uma thread
+        reconstrói, e as demais esperam por ela em vez de reconstruir de novo.
+        """
+        versao = versao_texto_lotes()
+        if self._versao == versao:
+            return
+        with self._lock_construcao:
+            if self._versao != versao:
+                self.construir()
+
+    def _candidatos(self, termo):
+        if len(termo) < self.TAMANHO_NGRAMA:
+            return set(self._prefixos.get(termo, ()))
+
+        ngramas = [termo[i:i + self.TAMANHO_NGRAMA] for i in range(len(termo) - self.TAMANHO_NGRAMA + 1)]
+        conjuntos = sorted((self._ngramas.get(ngrama, set()) for ngrama in ngramas), key=len)
+        candidatos = set(conjuntos[0]).intersection(*conjuntos[1:])
+        return {lote_id for lote_id in candidatos if termo in self._documentos[lote_id]['texto']}
+
+    def _pontuar(self, documento, consulta, termos):
+        pontos = 0
+        if documento['codigo'] == consulta:
+            pontos += 1000
+        elif documento['codigo'].startswith(consulta):
+            pontos += 500
+        if documento['variedade'].startswith(consulta):
+            pontos += 50
+
+        palavras_nome = [documento['codigo'], *documento['variedade'].split()]
+        palavras_tipo = documento['tipo'].split()
+        for termo in termos:
+            if any(palavra.startswith(termo) for palavra in palavras_nome):
+                pontos += 100
+            elif any(palavra.startswith(termo) for palavra in palavras_tipo):
+                pontos += 30
+            else:
+                pontos += 10
+        return pontos
+
+    def buscar(self, consulta):
+        """
+        Devolve a lista de ids de lotes que contêm todos os termos da consulta,
+        do mais relevante para o menos relevante.
+        """
+        consulta = dobrar_acentos(consulta)
+        termos = consulta.split()
+        if not termos:
+            return []
+
+        self._garantir_construido()
+        with self._lock:
+            resultado = None
+            for termo in termos:
+                candidatos = self._candidatos(termo)
+                resultado = candidatos if resultado is None else resultado & candidatos
+                if not resultado:
+                    return []
+
+            documentos = self._documentos
+            return sorted(
+                resultado,
+                key=lambda lote_id: (
+                    -self._pontuar(documentos[lote_id], consulta, termos),
+                    documentos[lote_id]['nome'],
+                    documentos[lote_id]['codigo'],
+                ),
+            )
+
+
+indice_lotes = IndiceLotes()
+
+
+class CacheLotesPorCodigo:
+    """
+    Cache LRU pequeno, em memória, de lote_para_pdv() indexado pelo código do lote.
+    É invalidado pelos sinais de Lote/Produto e pelas baixas de estoque em massa.
+    """
+
+    def __init__(self, tamanho=CACHE_SCAN_TAMANHO, ttl=CACHE_SCAN_TTL):
+        self.tamanho = tamanho
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entradas = OrderedDict()
+        self._codigo_por_id = {}
+
+    def obter(self, codigo):
+        with self._lock:
+            entrada = self._entradas.get(codigo)
+            if entrada is None:
+                return None
+            dados, criado_em = entrada
+            if self.ttl and time.monotonic() - criado_em > self.ttl:
+                self._descartar(codigo)
+                return None
+            self._entradas.move_to_end(codigo)
+            return dados
+
+    def guardar(self, dados):
+        codigo = dados['codigo_lote']
+        with self._lock:
+            self._entradas[codigo] = (dados, time.monotonic())
+            self._entradas.move_to_end(codigo)
+            self._codigo_por_id[dados['id']] = codigo
+            while len(self._entradas) > self.tamanho:
+                _, (dados_antigos, _) = self._entradas.popitem(last=False)
+                self._codigo_por_id.pop(dados_antigos['id'], None)
+
+    def _descartar(self, codigo):
+        dados, _ = self._entradas.pop(codigo, (None, None))
+        if dados is not None:
+            self._codigo_por_id.pop(dados['id'], None)
+
+    def invalidar_ids(self, lote_ids):
+        with self._lock:
+            for lote_id in lote_ids:
+                codigo = self._codigo_por_id.get(lote_id)
+                if codigo is not None:
+                    self._descartar(codigo)
+
+    def limpar(self):
+        with self._lock:
+            self._entradas.clear()
+            self._codigo_por_id.clear()
+
+
+cache_scan = CacheLotesPorCodigo()
+
+
+def lotes_por_codigo(codigos):
+    """
+    Resolve códigos de barras (Lote.codigo) exatos em dados do PDV. Usa o cache
+    LRU e busca os códigos ausentes numa única consulta pelo índice único de codigo.
+    Devolve um dicionário {codigo: dados}; códigos inexistentes ficam de fora.
+    """
+    encontrados = {}
+    faltando = []
+    for codigo in codigos:
+        dados = cache_scan.obter(codigo)
+        if dados is not None:
+            encontrados[codigo] = dados
+        elif codigo not in faltando:
+            faltando.append(codigo)
+
+    if faltando:
+        for lote in Lote.objects.filter(codigo__in=faltando).select_related('produto'):
+            dados = lote_para_pdv(lote)
+            cache_scan.guardar(dados)
+            encontrados[lote.codigo] = dados
+    return encontrados
+
+
+def buscar_lotes_vendaveis(consulta, limite=None, inicio=0):
+    """
+    Busca lotes com estoque para o PDV, na ordem de relevância do índice.
+
+    Percorre a lista ranqueada a partir da posição 'inicio' em blocos, filtrando
+    pelo estoque com consultas só de ids, até juntar 'limite' lotes; depois lê
+    os dados da página com uma única consulta por chave primária.
+    Devolve (lotes, total_estimado, proxima_posicao); total_estimado é o número
+    de resultados do índice (inclui lotes sem estoque) e proxima_posicao é None
+    quando não há mais resultados.
+    """
+    ids = ids_lotes_ranqueados(consulta) if BUSCA_LOTES_BACKEND == 'fts' else None
+    if ids is None:
+        ids = indice_lotes.buscar(consulta)
+    if limite is None:
+        limite = len(ids)
+
+    pagina = []
+    posicao = inicio
+    tamanho_bloco = max(limite * 2, 50)
+    while posicao < len(ids) and len(pagina) <= limite:
+        bloco = ids[posicao:posicao + tamanho_bloco]
+        com_estoque = set(Lote.objects.filter(id__in=bloco, quantidade__gt=0).values_list('id', flat=True))
+        for deslocamento, lote_id in enumerate(bloco):
+            if lote_id in com_estoque:
+                pagina.append((posicao + deslocamento, lote_id))
+                if len(pagina) > limite:
+                    break
+        posicao += len(bloco)
+
+    proxima_posicao = None
+    if len(pagina) > limite:
+        # Um resultado a mais foi lido só para saber se existe próxima página.
+        proxima_posicao = pagina.pop()[0]
+    pagina = [lote_id for _, lote_id in pagina]
+
+    if not pagina:
+        return [], len(ids), proxima_posicao
+    lotes = Lote.objects.filter(id__in=pagina).select_related('produto').in_bulk()
+    return [lotes[lote_id] for lote_id in pagina if lote_id in lotes], len(ids), proxima_posicao
+
+
+@receiver(post_save, sender=Lote)
+def indexar_lote_salvo(sender, instance, **kwargs):
+    indice_lotes.atualizar_lote(instance)
+    cache_scan.invalidar_ids([instance.id])
+
+
+@receiver(post_delete, sender=Lote)
+def desindexar_lote_apagado(sender, instance, **kwargs):
+    indice_lotes.remover_lote(instance.id)
+    cache_scan.invalidar_ids([instance.id])
+
+
+@receiver(post_save, sender=Produto)
+def reindexar_lotes_do_produto(sender, instance, update_fields=None, **kwargs):
+    # Atualizações só de estoque (feitas pelo Lote.save) não mudam o texto indexado.
+    if update_fields and set(update_fields) <= {'estoque', 'status'}:
+        return
+    cache_scan.limpar()
+    if not indice_lotes.construido:
+        return
+    for lote in instance.lotes.only('id', 'codigo', 'produto_id'):
+        lote.produto = instance
+        indice_lotes.atualizar_lote(lote)
@@ -0,0 +1,86 @@
+# caixa_pdv/catalogo_local.py
+"""
+Catálogo local dos terminais do PDV: uma cópia compacta de todos os lotes
+vendáveis (com estoque), para a busca ser feita no próprio terminal, sem
+uma requisição por tecla.
+
+A versão do catálogo é o id do último EventoEstoque. Todo evento de lote
+(estoque, cadastro, remoção ou dados do produto) gera um id maior, então
+'alteracoes_catalogo(desde)' só precisa ler os lotes com eventos depois da
+versão do terminal. A versão é lida antes das linhas: uma alteração feita
+no meio da leitura aparece de novo no delta seguinte, que traz sempre os
+valores atuais.
+
+Os lotes vão como listas na ordem de CAMPOS_CATALOGO, sem repetir as
+chaves em cada linha.
+"""
+from django.conf import settings
+
+from lotes.models import EventoEstoque, Lote
+from .busca import lote_para_pdv
+
+CAMPOS_CATALOGO = ['id', 'codigo_lote', 'nome_produto', 'tipo_produto', 'preco_unitario', 'quantidade_estoque', 'imagem_produto_url']
+
+# Acima disso, o terminal baixa o catálogo inteiro em vez do delta.
+CATALOGO_DELTA_LIMITE = getattr(settings, 'PDV_CATALOGO_DELTA_LIMITE', 2000)
+CATALOGO_CHUNK_SIZE = 500
+
+
+def versao_catalogo():
+    """Id do último evento de lote (0 se não houver)."""
+    return EventoEstoque.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+
+def linha_catalogo(lote):
+    dados = lote_para_pdv(lote)
+    dados['tipo_produto'] = lote.produto.get_tipo_display() if lote.produto else ''
+    return [dados[campo] for campo in CAMPOS_CATALOGO]
+
+
+def _lotes_vendaveis():
+    return Lote.objects.filter(quantidade__gt=0).select_related('produto').order_by('id')
+
+
+def snapshot_catalogo():
+    """Todos os lotes vendáveis e a versão a partir da qual o terminal sincroniza."""
+    versao = versao_catalogo()
+    return {
+        'versao': versao,
+        'campos': CAMPOS_CATALOGO,
+        'lotes': [linha_catalogo(lote) for lote in _lotes_vendaveis().iterator(chunk_size=CATALOGO_CHUNK_SIZE)],
+    }
+
+
+def alteracoes_catalogo(desde):
+    """
+    Lotes alterados depois da versão 'desde': os vendáveis em 'lotes' e os
+    removidos ou sem estoque em 'removidos'. Devolve 'recarregar': True quando
+    os eventos daquele intervalo já foram descartados, a versão é desconhecida
+    ou há alterações demais; nesse caso o terminal baixa o snapshot.
+    """
+    versao = versao_catalogo()
+    recarregar = {'versao': versao, 'recarregar': True}
+    if desde > versao:
+        return recarregar
+    if desde == versao:
+        return {'versao': versao, 'recarregar': False, 'campos': CAMPOS_CATALOGO, 'lotes': [], 'removidos': []}
+
+    mais_antigo = EventoEstoque.objects.order_by('id').values_list('id', flat=True).first()
+    if mais_antigo is not None and mais_antigo > desde + 1:
+        return recarregar
+    alterados = set(
+        EventoEstoque.objects.filter(id__gt=desde, id__lte=versao)
+        .values_list('lote_id', flat=True).distinct()[:CATALOGO_DELTA_LIMITE + 1]
+    )
+    if len(alterados) > CATALOGO_DELTA_LIMITE:
+        return recarregar
+
+    lotes = [linha_catalogo(lote) for lote in _lotes_vendaveis().filter(id__in=alterados)]
+    vendaveis = {linha[0] for linha in lotes}
+    return {
+        'versao': versao,
+        'recarregar': False,
+        'campos': CAMPOS_CATALOGO,
+        'lotes': lotes,
+        'removidos': sorted(alterados - vendaveis),
+    }
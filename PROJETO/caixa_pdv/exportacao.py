@@ -0,0 +1,92 @@
+# caixa_pdv/exportacao.py
+"""
+Exportação do histórico de vendas (uma linha por item vendido) em CSV e XLSX.
+
+As linhas vêm do banco em blocos com '.iterator(chunk_size=...)' e são
+escritas à medida que chegam, então a memória usada não cresce com o período.
+"""
+import csv
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+from openpyxl import Workbook
+
+from .models import Venda
+
+EXPORTACAO_CHUNK_SIZE = getattr(settings, 'PDV_EXPORTACAO_CHUNK_SIZE', 2000)
+
+CABECALHO = [
+    'ID Venda', 'Data', 'Status', 'Total da Venda',
+    'ID Item', 'Código Produto', 'Produto', 'Lote',
+    'Quantidade', 'Preço Unitário', 'Subtotal',
+]
+
+CAMPOS = [
+    'id', 'data_venda', 'status', 'total_venda',
+    'itens__id', 'itens__produto__cod', 'itens__produto__variedade', 'itens__lote__codigo',
+    'itens__quantidade', 'itens__preco_unitario_vendido', 'itens__subtotal',
+]
+
+
+def periodo(data_inicio=None, data_fim=None):
+    """
+    Converte datas (inclusive) no intervalo [inicio, fim) do fuso local.
+    """
+    inicio = fim = None
+    if data_inicio:
+        inicio = timezone.make_aware(datetime.datetime.combine(data_inicio, datetime.time.min))
+    if data_fim:
+        fim = timezone.make_aware(datetime.datetime.combine(data_fim + datetime.timedelta(days=1), datetime.time.min))
+    return inicio, fim
+
+
+def linhas_vendas(inicio=None, fim=None, chunk_size=EXPORTACAO_CHUNK_SIZE):
+    """
+    Gera uma tupla por item vendido em [inicio, fim), em ordem cronológica,
+    só de vendas finalizadas. Vendas sem itens aparecem numa linha com as
+    colunas de item vazias.
+    """
+    vendas = Venda.objects.filter(status='finalizada')
+    if inicio is not None:
+        vendas = vendas.filter(data_venda__gte=inicio)
+    if fim is not None:
+        vendas = vendas.filter(data_venda__lt=fim)
+
+    linhas = vendas.order_by('data_venda', 'id', 'itens__id').values_list(*CAMPOS)
+    for linha in linhas.iterator(chunk_size=chunk_size):
+        linha = list(linha)
+        linha[1] = timezone.localtime(linha[1]).replace(tzinfo=None)
+        yield linha
+
+
+class _Eco:
+    """Arquivo falso cujo write devolve o texto, para o csv.writer gerar strings."""
+
+    def write(self, valor):
+        return valor
+
+
+def gerar_csv(linhas):
+    """
+    Gera o CSV em pedaços de texto (cabeçalho primeiro), no formato aberto
+    diretamente pelo Excel em português: separador ';' e BOM UTF-8.
+    """
+    escritor = csv.writer(_Eco(), delimiter=';')
+    yield '\ufeff' + escritor.writerow(CABECALHO)
+    for linha in linhas:
+        linha[1] = linha[1].strftime('%d/%m/%Y %H:%M:%S')
+        yield escritor.writerow(['' if valor is None else valor for valor in linha])
+
+
+def salvar_xlsx(linhas, destino):
+    """
+    Grava as linhas num XLSX em modo write-only do openpyxl, que despeja as
+    linhas em disco conforme são adicionadas. 'destino' é um caminho ou arquivo.
+    """
+    livro = Workbook(write_only=True)
+    planilha = livro.create_sheet('Vendas')
+    planilha.append(CABECALHO)
+    for linha in linhas:
+        planilha.append(linha)
+    livro.save(destino)
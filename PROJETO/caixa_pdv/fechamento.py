@@ -0,0 +1,342 @@
+# caixa_pdv/fechamento.py
+import datetime
+import logging
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Q, Sum, Value, When, Window
+from django.db.models.functions import TruncDate
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .banco import transacao_com_retentativa
+from .models import Venda, MovimentoCaixa, FechamentoCaixa
+from .paginacao import codificar_cursor, decodificar_cursor, filtro_antes
+
+logger = logging.getLogger(__name__)
+
+ZERO = Decimal('0.00')
+
+# Dia (local) até cujo início este processo já gerou os fechamentos diários.
+_fechamentos_gerados_ate = None
+
+
+def _filtro_periodo(campo, inicio, fim):
+    filtro = Q()
+    if inicio is not None:
+        filtro &= Q(**{f'{campo}__gte': inicio})
+    if fim is not None:
+        filtro &= Q(**{f'{campo}__lt': fim})
+    return filtro
+
+
+def totais_periodo(inicio=None, fim=None):
+    """
+    Soma vendas finalizadas, entradas e retiradas em [inicio, fim).
+    Usa os índices de Venda.data_venda e MovimentoCaixa.data_hora: duas consultas.
+    """
+    total_vendas = Venda.objects.filter(
+        _filtro_periodo('data_venda', inicio, fim), status='finalizada'
+    ).aggregate(total=Sum('total_venda'))['total'] or ZERO
+
+    movimentos = MovimentoCaixa.objects.filter(_filtro_periodo('data_hora', inicio, fim)).aggregate(
+        entradas=Sum('valor', filter=Q(tipo='entrada')),
+        retiradas=Sum('valor', filter=Q(tipo='retirada')),
+    )
+    return {
+        'total_vendas': total_vendas,
+        'total_entradas': movimentos['entradas'] or ZERO,
+        'total_retiradas': movimentos['retiradas'] or ZERO,
+    }
+
+
+def _inicio_do_dia(data):
+    return timezone.make_aware(datetime.datetime.combine(data, datetime.time.min))
+
+
+def ultimo_fechamento():
+    return FechamentoCaixa.objects.order_by('-periodo_fim').first()
+
+
+def _fechamentos_diarios(inicio, ate, saldo, saldo_movimentos):
+    """
+    Fechamentos 'diario' (ainda não gravados) para cada dia com movimento em
+    [inicio, ate), com duas consultas agregadas por dia, a partir do saldo
+    acumulado em 'inicio'.
+    """
+    if inicio is not None and inicio >= ate:
+        return []
+
+    tz = timezone.get_current_timezone()
+    por_dia = {}
+    vendas = (
+        Venda.objects.filter(_filtro_periodo('data_venda', inicio, ate), status='finalizada')
+        .annotate(dia=TruncDate('data_venda', tzinfo=tz))
+        .order_by()
+        .values('dia')
+        .annotate(total=Sum('total_venda'))
+    )
+    for linha in vendas:
+        por_dia.setdefault(linha['dia'], {})['total_vendas'] = linha['total']
+
+    movimentos = (
+        MovimentoCaixa.objects.filter(_filtro_periodo('data_hora', inicio, ate))
+        .annotate(dia=TruncDate('data_hora', tzinfo=tz))
+        .order_by()
+        .values('dia')
+        .annotate(
+            entradas=Sum('valor', filter=Q(tipo='entrada')),
+            retiradas=Sum('valor', filter=Q(tipo='retirada')),
+        )
+    )
+    for linha in movimentos:
+        totais = por_dia.setdefault(linha['dia'], {})
+        totais['total_entradas'] = linha['entradas']
+        totais['total_retiradas'] = linha['retiradas']
+
+    novos = []
+    for dia in sorted(por_dia):
+        fim = min(_inicio_do_dia(dia + datetime.timedelta(days=1)), ate)
+        totais = {chave: por_dia[dia].get(chave) or ZERO for chave in ('total_vendas', 'total_entradas', 'total_retiradas')}
+        saldo += totais['total_vendas'] + totais['total_entradas'] - totais['total_retiradas']
+        saldo_movimentos += totais['total_entradas'] - totais['total_retiradas']
+        novos.append(FechamentoCaixa(tipo='diario', periodo_inicio=inicio, periodo_fim=fim, saldo=saldo, saldo_movimentos=saldo_movimentos, **totais))
+        inicio = fim
+
+    if not novos or novos[-1].periodo_fim < ate:
+        # Marca o período sem movimento para que o próximo cálculo comece em 'ate'.
+        novos.append(FechamentoCaixa(tipo='diario', periodo_inicio=inicio, periodo_fim=ate, saldo=saldo, saldo_movimentos=saldo_movimentos))
+    return novos
+
+
+def gerar_fechamentos_diarios(ate=None):
+    """
+    Cria um fechamento 'diario' para cada dia com movimento entre o último
+    fechamento e 'ate' (padrão: início do dia de hoje). Devolve o último
+    fechamento existente depois da operação.
+    """
+    if ate is None:
+        ate = _inicio_do_dia(timezone.localdate())
+
+    anterior = ultimo_fechamento()
+    novos = _fechamentos_diarios(
+        anterior.periodo_fim if anterior else None, ate,
+        anterior.saldo if anterior else ZERO, anterior.saldo_movimentos if anterior else ZERO,
+    )
+    if not novos:
+        return anterior
+    # ignore_conflicts: outro processo pode ter gerado os mesmos fechamentos.
+    FechamentoCaixa.objects.bulk_create(novos, ignore_conflicts=True)
+    return ultimo_fechamento()
+
+
+def gerar_fechamentos_pendentes():
+    """
+    Gera os fechamentos diários que faltam até o início de hoje, no máximo uma
+    vez por dia em cada processo, numa transação própria. É chamada depois das
+    gravações do PDV (vendas e movimentos de caixa), nunca nas leituras: assim
+    o movimento somado por saldo_atual fica limitado ao dia corrente mesmo sem
+    agendar o comando fechamento_caixa. Uma falha é só registrada no log; a
+    próxima gravação tenta de novo.
+    """
+    global _fechamentos_gerados_ate
+    hoje = timezone.localdate()
+    if _fechamentos_gerados_ate == hoje:
+        return
+    try:
+        transacao_com_retentativa(gerar_fechamentos_diarios)()
+    except Exception:
+        logger.exception("Falha ao gerar os fechamentos diários pendentes.")
+        return
+    _fechamentos_gerados_ate = hoje
+
+
+def saldo_atual():
+    """
+    Saldo do caixa = saldo do último fechamento + movimento posterior a ele.
+    Só lê: os fechamentos diários são gerados depois das gravações do PDV
+    (gerar_fechamentos_pendentes), pelo comando fechamento_caixa e ao fechar o
+    caixa, o que mantém curto o movimento a somar.
+    """
+    ultimo = ultimo_fechamento()
+    totais = totais_periodo(ultimo.periodo_fim if ultimo else None, None)
+    saldo_anterior = ultimo.saldo if ultimo else ZERO
+    return saldo_anterior + totais['total_vendas'] + totais['total_entradas'] - totais['total_retiradas']
+
+
+@transaction.atomic
+def fechar_caixa(tipo='turno', ate=None):
+    """
+    Fecha o caixa (por padrão, agora): grava os totais desde o último fechamento
+    e o saldo acumulado.
+    """
+    if ate is None:
+        ate = timezone.now()
+    anterior = gerar_fechamentos_diarios(min(ate, _inicio_do_dia(timezone.localdate(ate))))
+    inicio = anterior.periodo_fim if anterior else None
+    if inicio is not None and inicio >= ate:
+        return anterior
+
+    totais = totais_periodo(inicio, ate)
+    saldo_anterior = anterior.saldo if anterior else ZERO
+    saldo = saldo_anterior + totais['total_vendas'] + totais['total_entradas'] - totais['total_retiradas']
+    saldo_movimentos = (anterior.saldo_movimentos if anterior else ZERO) + totais['total_entradas'] - totais['total_retiradas']
+    return FechamentoCaixa.objects.create(
+        tipo=tipo, periodo_inicio=inicio, periodo_fim=ate, saldo=saldo, saldo_movimentos=saldo_movimentos, **totais
+    )
+
+
+def invalidar_fechamentos_desde(data_hora):
+    """
+    Refaz os fechamentos que cobrem 'data_hora' ou são posteriores a ela após
+    uma alteração retroativa. Os fechamentos de turno são mantidos.
+    """
+    reconstruir_fechamentos(desde=data_hora)
+
+
+def aplicar_delta_fechamentos(data_hora, vendas=ZERO, entradas=ZERO, retiradas=ZERO):
+    """
+    Corrige no lugar os fechamentos já gravados após uma alteração retroativa
+    em 'data_hora': soma as variações aos totais do fechamento que cobre esse
+    instante e ao saldo acumulado dele e de todos os posteriores, com um único
+    UPDATE (F()). Nenhum fechamento é apagado.
+    """
+    if not (vendas or entradas or retiradas):
+        return
+    cobre = Q(periodo_inicio__isnull=True) | Q(periodo_inicio__lte=data_hora)
+
+    def no_periodo(valor):
+        return Case(When(cobre, then=Value(valor)), default=Value(ZERO))
+
+    FechamentoCaixa.objects.filter(periodo_fim__gt=data_hora).update(
+        total_vendas=F('total_vendas') + no_periodo(vendas),
+        total_entradas=F('total_entradas') + no_periodo(entradas),
+        total_retiradas=F('total_retiradas') + no_periodo(retiradas),
+        saldo=F('saldo') + Value(vendas + entradas - retiradas),
+        saldo_movimentos=F('saldo_movimentos') + Value(entradas - retiradas),
+    )
+
+
+def _valor_com_sinal():
+    return Case(When(tipo='retirada', then=-F('valor')), default=F('valor'))
+
+
+def saldo_movimentos_antes(data_hora, movimento_id):
+    """
+    Entradas menos retiradas de todos os movimentos anteriores a (data_hora, id).
+    Parte do último fechamento anterior e soma os movimentos depois dele.
+    """
+    fechamento = FechamentoCaixa.objects.filter(periodo_fim__lte=data_hora).order_by('-periodo_fim').first()
+    filtro = filtro_antes('data_hora', data_hora, movimento_id)
+    if fechamento is not None:
+        filtro &= Q(data_hora__gte=fechamento.periodo_fim)
+    soma = MovimentoCaixa.objects.filter(filtro).aggregate(total=Sum(_valor_com_sinal()))['total'] or ZERO
+    return (fechamento.saldo_movimentos if fechamento else ZERO) + soma
+
+
+def extrato_movimentos(cursor=None, limite=20):
+    """
+    Uma página do extrato de movimentos do caixa, do mais recente para o mais
+    antigo, paginada por cursor sobre (data_hora, id). Cada movimento recebe
+    'saldo_apos': o acumulado de entradas menos retiradas até ele, calculado
+    com uma função de janela sobre a página mais o saldo anterior a ela.
+    Devolve (movimentos, proximo_cursor).
+    """
+    movimentos = MovimentoCaixa.objects.order_by('-data_hora', '-id')
+    if cursor:
+        movimentos = movimentos.filter(filtro_antes('data_hora', *decodificar_cursor(cursor)))
+
+    ids = list(movimentos.values_list('id', flat=True)[:limite + 1])
+    tem_mais = len(ids) > limite
+    ids = ids[:limite]
+
+    pagina = list(
+        MovimentoCaixa.objects.filter(id__in=ids)
+        .annotate(saldo_pagina=Window(Sum(_valor_com_sinal()), order_by=[F('data_hora').asc(), F('id').asc()]))
+        .order_by('-data_hora', '-id')
+    )
+    if not pagina:
+        return [], None
+
+    mais_antigo = pagina[-1]
+    base = saldo_movimentos_antes(mais_antigo.data_hora, mais_antigo.id)
+    for movimento in pagina:
+        movimento.saldo_apos = base + movimento.saldo_pagina
+
+    return pagina, (codificar_cursor(mais_antigo.data_hora, mais_antigo.id) if tem_mais else None)
+
+
+@transaction.atomic
+def reconstruir_fechamentos(desde=None):
+    """
+    Refaz, a partir dos registros brutos, os fechamentos posteriores a 'desde'
+    (padrão: todos). Os fechamentos diários são apagados e gerados de novo; os
+    de turno, criados pelo operador, são mantidos e só têm período, totais e
+    saldo recalculados no lugar. Devolve o número de fechamentos diários.
+    """
+    depois = Q() if desde is None else Q(periodo_fim__gt=desde)
+    FechamentoCaixa.objects.filter(depois, tipo='diario').delete()
+
+    anterior = None
+    if desde is not None:
+        anterior = FechamentoCaixa.objects.filter(periodo_fim__lte=desde).order_by('-periodo_fim').first()
+    inicio = anterior.periodo_fim if anterior else None
+    saldo = anterior.saldo if anterior else ZERO
+    saldo_movimentos = anterior.saldo_movimentos if anterior else ZERO
+
+    novos = []
+    for turno in FechamentoCaixa.objects.filter(depois, tipo='turno').order_by('periodo_fim'):
+        # Como em fechar_caixa: os dias completos antes do turno viram fechamentos diários.
+        diarios = _fechamentos_diarios(inicio, _inicio_do_dia(timezone.localdate(turno.periodo_fim)), saldo, saldo_movimentos)
+        if diarios:
+            novos.extend(diarios)
+            inicio, saldo, saldo_movimentos = diarios[-1].periodo_fim, diarios[-1].saldo, diarios[-1].saldo_movimentos
+
+        totais = totais_periodo(inicio, turno.periodo_fim)
+        saldo += totais['total_vendas'] + totais['total_entradas'] - totais['total_retiradas']
+        saldo_movimentos += totais['total_entradas'] - totais['total_retiradas']
+        turno.periodo_inicio = inicio
+        turno.saldo = saldo
+        turno.saldo_movimentos = saldo_movimentos
+        for campo, valor in totais.items():
+            setattr(turno, campo, valor)
+        turno.save(update_fields=['periodo_inicio', 'saldo', 'saldo_movimentos', *totais])
+        inicio = turno.periodo_fim
+
+    FechamentoCaixa.objects.bulk_create(novos)
+    gerar_fechamentos_diarios()
+    return FechamentoCaixa.objects.filter(depois, tipo='diario').count()
+
+
+def _valor_decimal(valor):
+    return Decimal(str(valor or 0))
+
+
+def _delta_movimento(tipo, valor, sinal):
+    valor = _valor_decimal(valor) * sinal
+    return {'entradas': valor} if tipo == 'entrada' else {'retiradas': valor}
+
+
+@receiver(post_save, sender=MovimentoCaixa)
+def movimento_salvo(sender, instance, created, **kwargs):
+    original = None if created else getattr(instance, '_original', None)
+    if original is not None:
+        _, tipo, valor, data_hora = original
+        aplicar_delta_fechamentos(data_hora, **_delta_movimento(tipo, valor, -1))
+    elif not created:
+        # Sem o estado lido do banco não há como calcular a diferença.
+        invalidar_fechamentos_desde(instance.data_hora)
+        return
+    aplicar_delta_fechamentos(instance.data_hora, **_delta_movimento(instance.tipo, instance.valor, 1))
+
+
+@receiver(post_delete, sender=MovimentoCaixa)
+def movimento_apagado(sender, instance, **kwargs):
+    aplicar_delta_fechamentos(instance.data_hora, **_delta_movimento(instance.tipo, instance.valor, -1))
+
+
+@receiver(post_delete, sender=Venda)
+def venda_apagada(sender, instance, **kwargs):
+    if instance.status == 'finalizada':
+        aplicar_delta_fechamentos(instance.data_venda, vendas=-_valor_decimal(instance.total_venda))
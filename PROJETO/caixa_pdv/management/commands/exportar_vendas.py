@@ -0,0 +1,43 @@
+# caixa_pdv/management/commands/exportar_vendas.py
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from caixa_pdv.exportacao import gerar_csv, linhas_vendas, periodo, salvar_xlsx
+
+
+def _data(valor):
+    try:
+        return datetime.datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise CommandError(f"Data inválida '{valor}'. Use YYYY-MM-DD.")
+
+
+class Command(BaseCommand):
+    help = 'Exporta as vendas e seus itens de um período para CSV ou XLSX.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--inicio', help='Data inicial (YYYY-MM-DD), inclusive.')
+        parser.add_argument('--fim', help='Data final (YYYY-MM-DD), inclusive.')
+        parser.add_argument('--formato', choices=['csv', 'xlsx'], default='csv')
+        parser.add_argument('--saida', help="Arquivo de saída. Sem ele, o CSV é escrito na saída padrão.")
+
+    def handle(self, *args, **options):
+        inicio, fim = periodo(
+            _data(options['inicio']) if options['inicio'] else None,
+            _data(options['fim']) if options['fim'] else None,
+        )
+        linhas = linhas_vendas(inicio, fim)
+
+        if options['formato'] == 'xlsx':
+            if not options['saida']:
+                raise CommandError('Informe --saida para exportar em XLSX.')
+            salvar_xlsx(linhas, options['saida'])
+        elif options['saida']:
+            with open(options['saida'], 'w', encoding='utf-8', newline='') as arquivo:
+                arquivo.writelines(gerar_csv(linhas))
+        else:
+            for pedaco in gerar_csv(linhas):
+                self.stdout.write(pedaco, ending='')
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Vendas exportadas para {options['saida']}."))
@@ -0,0 +1,27 @@
+# caixa_pdv/management/commands/fechamento_caixa.py
+from django.core.management.base import BaseCommand
+from caixa_pdv.fechamento import fechar_caixa, gerar_fechamentos_diarios, reconstruir_fechamentos
+
+
+class Command(BaseCommand):
+    help = (
+        'Gera os fechamentos diários de caixa pendentes, fecha o turno atual ou reconstrói os fechamentos. '
+        'Os fechamentos diários também são gerados depois da primeira venda ou movimento de cada dia, '
+        'então agendar este comando (ex.: cron às 00:05) é opcional.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--reconstruir', action='store_true', help='Apaga e refaz os fechamentos diários e recalcula no lugar os totais e saldos dos fechamentos de turno (que são mantidos), a partir das vendas e movimentos.')
+        parser.add_argument('--turno', action='store_true', help='Fecha o turno atual (até agora).')
+
+    def handle(self, *args, **options):
+        if options['reconstruir']:
+            total = reconstruir_fechamentos()
+            self.stdout.write(self.style.SUCCESS(f"{total} fechamento(s) diário(s) reconstruído(s); fechamentos de turno recalculados."))
+            return
+
+        if options['turno']:
+            fechamento = fechar_caixa(tipo='turno')
+        else:
+            fechamento = gerar_fechamentos_diarios()
+        self.stdout.write(self.style.SUCCESS(f"Último fechamento: {fechamento}"))
@@ -0,0 +1,30 @@
+# caixa_pdv/management/commands/imprimir_recibo.py
+from django.core.management.base import BaseCommand, CommandError
+from caixa_pdv.models import Venda
+from caixa_pdv.recibo import carregar_venda, enviar_para_impressora, montar_recibo
+
+
+class Command(BaseCommand):
+    help = 'Imprime o recibo ESC/POS de uma venda numa impressora térmica, ou mostra a prévia em texto.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('venda_id', type=int)
+        parser.add_argument('--largura', type=int, choices=[58, 80], help='Largura da bobina em mm (padrão: PDV_RECIBO_LARGURA).')
+        parser.add_argument('--destino', help="Dispositivo ('/dev/usb/lp0'), arquivo ou 'tcp://host:porta' (padrão: PDV_RECIBO_IMPRESSORA).")
+        parser.add_argument('--texto', action='store_true', help='Apenas mostra a prévia em texto, sem imprimir.')
+
+    def handle(self, *args, **options):
+        try:
+            recibo = montar_recibo(carregar_venda(options['venda_id']), options['largura'])
+        except Venda.DoesNotExist:
+            raise CommandError(f"Venda #{options['venda_id']} não encontrada.")
+
+        if options['texto']:
+            self.stdout.write(recibo.como_texto(), ending='')
+            return
+
+        try:
+            enviar_para_impressora(recibo.dados, options['destino'])
+        except (ValueError, OSError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Recibo da venda #{options['venda_id']} enviado ({len(recibo.dados)} bytes)."))
@@ -0,0 +1,27 @@
+# caixa_pdv/management/commands/processar_tarefas.py
+from django.core.management.base import BaseCommand
+from caixa_pdv.tarefas import processar_pendentes, reabrir_tarefas_abandonadas, rodar_worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Worker da fila de documentos (termos de conformidade, etiquetas de lote). '
+        'Cada execução é um worker; rode várias para processar tarefas em paralelo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uma-vez', action='store_true', help='Processa as tarefas pendentes e termina.')
+        parser.add_argument('--intervalo', type=float, default=2.0, help='Segundos de espera quando a fila está vazia.')
+
+    def handle(self, *args, **options):
+        if options['uma_vez']:
+            reabrir_tarefas_abandonadas()
+            total = processar_pendentes()
+            self.stdout.write(self.style.SUCCESS(f"{total} tarefa(s) processada(s)."))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Worker de documentos iniciado. Ctrl+C para sair.'))
+        try:
+            rodar_worker(options['intervalo'])
+        except KeyboardInterrupt:
+            self.stdout.write('Worker encerrado.')
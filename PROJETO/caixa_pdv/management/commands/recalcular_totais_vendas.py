@@ -0,0 +1,23 @@
+# caixa_pdv/management/commands/recalcular_totais_vendas.py
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from caixa_pdv.models import Venda, recalcular_totais_vendas
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula o total_venda das vendas a partir da soma dos seus itens (reparo dos totais incrementais). '
+        'A diferença também corrige pagamentos, sessão aberta, resumos por forma de pagamento e fechamentos.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('venda_ids', nargs='*', type=int, help='IDs das vendas a recalcular. Sem IDs, recalcula todas.')
+
+    def handle(self, *args, **options):
+        vendas = Venda.objects.all()
+        if options['venda_ids']:
+            vendas = vendas.filter(id__in=options['venda_ids'])
+
+        with transaction.atomic():
+            total = recalcular_totais_vendas(vendas)
+        self.stdout.write(self.style.SUCCESS(f"Total corrigido em {total} venda(s)."))
@@ -0,0 +1,13 @@
+# caixa_pdv/management/commands/reconstruir_resumos_vendas.py
+from django.core.management.base import BaseCommand
+from caixa_pdv.resumos import reconstruir_resumos, reconstruir_resumos_pagamentos
+
+
+class Command(BaseCommand):
+    help = 'Apaga e refaz os resumos diários de vendas por produto e por forma de pagamento a partir dos itens e pagamentos.'
+
+    def handle(self, *args, **options):
+        total = reconstruir_resumos()
+        self.stdout.write(self.style.SUCCESS(f"{total} resumo(s) diário(s) reconstruído(s)."))
+        total = reconstruir_resumos_pagamentos()
+        self.stdout.write(self.style.SUCCESS(f"{total} resumo(s) diário(s) de pagamento reconstruído(s)."))
@@ -0,0 +1,234 @@
+# caixa_pdv/management/commands/teste_carga_pdv.py
+import datetime
+import math
+import os
+import random
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Sum
+from django.test import Client
+from django.test.utils import override_settings
+from django.urls import reverse
+
+from caixa_pdv.banco import banco_travado
+from caixa_pdv.models import ItemVenda, Venda
+from lotes.models import Lote
+from produtos.models import Produto
+
+NOMES = [
+    'Alface Crespa', 'Alface Americana', 'Rúcula Cultivada', 'Tomate Cereja', 'Pimenta Dedo de Moça',
+    'Manjericão Genovese', 'Salsa Lisa', 'Cebolinha Todo Ano', 'Couve Manteiga', 'Morango Albion',
+]
+
+
+def _percentil(valores, p):
+    """Percentil pelo método do posto mais próximo; valores já ordenados."""
+    if not valores:
+        return 0.0
+    posicao = max(math.ceil(p / 100 * len(valores)) - 1, 0)
+    return valores[min(posicao, len(valores) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        'Teste de carga do PDV: cria um banco temporário com lotes e simula N terminais '
+        'simultâneos (busca por digitação + finalização da venda) com o cliente de teste do Django. '
+        'Mostra latências p50/p95/p99, vazão, travamentos do banco e a conferência do estoque.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clientes', type=int, default=4, help='Terminais simultâneos (threads).')
+        parser.add_argument('--vendas', type=int, default=25, help='Vendas por terminal.')
+        parser.add_argument('--itens', type=int, default=3, help='Itens por venda.')
+        parser.add_argument('--produtos', type=int, default=50, help='Produtos criados (um lote cada).')
+        parser.add_argument('--estoque', type=int, default=100000, help='Quantidade inicial de cada lote.')
+        parser.add_argument('--pausa', type=float, default=0.0, help='Pausa entre teclas, em segundos.')
+        parser.add_argument('--semente', type=int, default=None, help='Semente do gerador aleatório.')
+        parser.add_argument('--banco', help='Arquivo do banco temporário (padrão: um arquivo em /tmp).')
+        parser.add_argument('--manter-banco', action='store_true', help='Não apaga o banco temporário no final.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('O teste de carga foi feito para o banco SQLite do projeto.')
+
+        # Banco em arquivo (não em memória) para reproduzir as travas de escrita reais.
+        arquivo = options['banco'] or os.path.join(tempfile.gettempdir(), f'teste_carga_pdv_{os.getpid()}.sqlite3')
+        connection.settings_dict.setdefault('TEST', {})['NAME'] = arquivo
+        nome_original = connection.settings_dict['NAME']
+        self.stdout.write(f'Criando banco temporário em {arquivo}...')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver']):
+                self._executar(options)
+        finally:
+            connection.creation.destroy_test_db(nome_original, verbosity=0, keepdb=options['manter_banco'])
+
+    def _popular(self, options):
+        produtos = Produto.objects.bulk_create([
+            Produto(
+                cod=f'CARGA{i:04d}', unidade='BDJ', qtd_unid='1UN', tipo='Hortalicas',
+                variedade=f'{NOMES[i % len(NOMES)]} {i:03d}', preco=Decimal('10.00'), estoque=0,
+            )
+            for i in range(options['produtos'])
+        ])
+        # save() individual: o lote soma sua quantidade ao estoque do produto.
+        for i, produto in enumerate(produtos):
+            Lote.objects.create(
+                produto=produto, data_semeadura=datetime.date(2025, 1, 1) + datetime.timedelta(days=i),
+                quantidade=options['estoque'], preco_unitario=Decimal('2.50'),
+            )
+        return {
+            lote.id: (lote.produto.variedade, lote.quantidade)
+            for lote in Lote.objects.select_related('produto')
+        }
+
+    def _cliente(self, numero, lotes, options, barreira, resultados):
+        gerador = random.Random(None if options['semente'] is None else options['semente'] + numero)
+        cliente = Client()
+        url_busca = reverse('caixa_pdv:search_lotes_api')
+        url_venda = reverse('caixa_pdv:finalizar_venda_api')
+        latencias = defaultdict(list)
+        respostas = Counter()
+        travamentos = [0]
+        vendidos = Counter()
+
+        def contar_travamentos(execute, sql, params, many, context):
+            try:
+                return execute(sql, params, many, context)
+            except OperationalError as e:
+                if banco_travado(e):
+                    travamentos[0] += 1
+                raise
+
+        ids = list(lotes)
+        with connection.execute_wrapper(contar_travamentos):
+            barreira.wait()
+            for _ in range(options['vendas']):
+                itens = []
+                for lote_id in gerador.sample(ids, min(options['itens'], len(ids))):
+                    variedade = lotes[lote_id][0]
+                    encontrados = []
+                    # Como no pdv.html: a busca começa no segundo caractere digitado.
+                    for tamanho in range(2, len(variedade) + 1):
+                        inicio = time.perf_counter()
+                        resposta = cliente.get(url_busca, {'query': variedade[:tamanho]})
+                        latencias['busca'].append(time.perf_counter() - inicio)
+                        respostas[('busca', resposta.status_code)] += 1
+                        if resposta.status_code == 200:
+                            encontrados = resposta.json()['lotes']
+                        if options['pausa']:
+                            time.sleep(options['pausa'])
+                    lote = next((item for item in encontrados if item['id'] == lote_id), None)
+                    if lote is None:
+                        respostas[('busca', 'lote não encontrado')] += 1
+                        continue
+                    itens.append({'lote_id': lote['id'], 'quantidade': gerador.randint(1, 3), 'preco_unitario': lote['preco_unitario']})
+
+                if not itens:
+                    continue
+                inicio = time.perf_counter()
+                resposta = cliente.post(
+                    url_venda,
+                    {'chave_idempotencia': uuid.uuid4().hex, 'itens': itens},
+                    content_type='application/json',
+                )
+                latencias['venda'].append(time.perf_counter() - inicio)
+                respostas[('venda', resposta.status_code)] += 1
+                if resposta.status_code == 200 and resposta.json().get('success'):
+                    for item in itens:
+                        vendidos[item['lote_id']] += item['quantidade']
+        connection.close()
+
+        with resultados['trava']:
+            for operacao, valores in latencias.items():
+                resultados['latencias'][operacao].extend(valores)
+            resultados['respostas'].update(respostas)
+            resultados['vendidos'].update(vendidos)
+            resultados['travamentos'] += travamentos[0]
+
+    def _conferir_estoque(self, lotes, vendidos):
+        """Devolve a lista de divergências entre o estoque esperado e o gravado."""
+        problemas = []
+        atuais = dict(Lote.objects.values_list('id', 'quantidade'))
+        gravados = dict(
+            ItemVenda.objects.filter(venda__status='finalizada').values('lote_id')
+            .annotate(total=Sum('quantidade')).values_list('lote_id', 'total')
+        )
+        for lote_id, (variedade, inicial) in lotes.items():
+            esperado = inicial - vendidos.get(lote_id, 0)
+            if atuais[lote_id] != esperado or gravados.get(lote_id, 0) != vendidos.get(lote_id, 0):
+                problemas.append(
+                    f'Lote {lote_id} ({variedade}): esperado {esperado}, gravado {atuais[lote_id]}, '
+                    f'itens vendidos {gravados.get(lote_id, 0)}.'
+                )
+        for produto_id, estoque, soma_lotes in (
+            Produto.objects.annotate(soma_lotes=Sum('lotes__quantidade')).values_list('id', 'estoque', 'soma_lotes')
+        ):
+            if Decimal(estoque or 0) != Decimal(soma_lotes or 0):
+                problemas.append(f'Produto {produto_id}: estoque {estoque}, soma dos lotes {soma_lotes}.')
+        return problemas
+
+    def _executar(self, options):
+        lotes = self._popular(options)
+        clientes = max(options['clientes'], 1)
+        self.stdout.write(
+            f"{len(lotes)} lotes criados. Simulando {clientes} terminais x {options['vendas']} vendas "
+            f"de {options['itens']} itens..."
+        )
+
+        resultados = {
+            'trava': threading.Lock(),
+            'latencias': defaultdict(list),
+            'respostas': Counter(),
+            'vendidos': Counter(),
+            'travamentos': 0,
+        }
+        barreira = threading.Barrier(clientes + 1)
+        threads = [
+            threading.Thread(target=self._cliente, args=(numero, lotes, options, barreira, resultados))
+            for numero in range(clientes)
+        ]
+        for thread in threads:
+            thread.start()
+        barreira.wait()
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.join()
+        duracao = time.perf_counter() - inicio
+
+        self.stdout.write('')
+        self.stdout.write(f"{'operação':<10}{'n':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'máx ms':>10}")
+        for operacao in ('busca', 'venda'):
+            valores = sorted(resultados['latencias'][operacao])
+            self.stdout.write(
+                f"{operacao:<10}{len(valores):>8}"
+                + ''.join(f'{_percentil(valores, p) * 1000:>10.1f}' for p in (50, 95, 99))
+                + f'{(valores[-1] * 1000 if valores else 0):>10.1f}'
+            )
+
+        respostas = resultados['respostas']
+        vendas_ok = respostas[('venda', 200)]
+        requisicoes = sum(len(valores) for valores in resultados['latencias'].values())
+        self.stdout.write('')
+        self.stdout.write(f'Duração: {duracao:.2f} s')
+        self.stdout.write(f'Vazão: {vendas_ok / duracao:.1f} vendas/s, {requisicoes / duracao:.1f} requisições/s')
+        self.stdout.write('Respostas: ' + ', '.join(f'{op} {codigo}: {n}' for (op, codigo), n in sorted(respostas.items(), key=str)))
+        self.stdout.write(f"Travamentos do banco (database is locked): {resultados['travamentos']}")
+
+        problemas = self._conferir_estoque(lotes, resultados['vendidos'])
+        vendas_gravadas = Venda.objects.filter(status='finalizada').count()
+        if vendas_gravadas != vendas_ok:
+            problemas.append(f'{vendas_ok} vendas confirmadas, {vendas_gravadas} gravadas.')
+        if problemas:
+            for problema in problemas:
+                self.stdout.write(self.style.ERROR(problema))
+            raise CommandError('Estoque inconsistente após o teste de carga.')
+        self.stdout.write(self.style.SUCCESS(f'Estoque consistente: {vendas_gravadas} vendas conferidas.'))
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caixa_pdv', '0002_movimentocaixa'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FechamentoCaixa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('diario', 'Diário'), ('turno', 'Turno')], default='diario', max_length=10, verbose_name='Tipo')),
+                ('periodo_inicio', models.DateTimeField(blank=True, null=True, verbose_name='Início do Período')),
+                ('periodo_fim', models.DateTimeField(unique=True, verbose_name='Fim do Período')),
+                ('total_vendas', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Total de Vendas')),
+                ('total_entradas', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Total de Entradas')),
+                ('total_retiradas', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Total de Retiradas')),
+                ('saldo', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Saldo ao Fechamento')),
+                ('criado_em', models.DateTimeField(auto_now_add=True, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Fechamento de Caixa',
+                'verbose_name_plural': 'Fechamentos de Caixa',
+                'ordering': ['-periodo_fim'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='movimentocaixa',
+            index=models.Index(fields=['data_hora'], name='movcaixa_data_hora_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['data_venda'], name='venda_data_idx'),
+        ),
+    ]
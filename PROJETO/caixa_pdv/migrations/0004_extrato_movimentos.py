@@ -0,0 +1,33 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:54
+
+from django.db import migrations, models
+
+
+def apagar_fechamentos(apps, schema_editor):
+    # Os fechamentos existentes não têm saldo_movimentos; são refeitos
+    # automaticamente (diários) no próximo cálculo de saldo.
+    apps.get_model('caixa_pdv', 'FechamentoCaixa').objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caixa_pdv', '0003_fechamentocaixa'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='movimentocaixa',
+            name='movcaixa_data_hora_idx',
+        ),
+        migrations.AddField(
+            model_name='fechamentocaixa',
+            name='saldo_movimentos',
+            field=models.DecimalField(decimal_places=2, default=0, help_text='Entradas menos retiradas desde o início, ao fim do período.', max_digits=12, verbose_name='Saldo Acumulado dos Movimentos'),
+        ),
+        migrations.AddIndex(
+            model_name='movimentocaixa',
+            index=models.Index(fields=['data_hora', 'id'], name='movcaixa_data_hora_id_idx'),
+        ),
+        migrations.RunPython(apagar_fechamentos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caixa_pdv', '0004_extrato_movimentos'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='venda',
+            name='venda_data_idx',
+        ),
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(fields=['data_venda', 'id'], name='venda_data_id_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:58
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def preencher_resumos(apps, schema_editor):
+    ItemVenda = apps.get_model('caixa_pdv', 'ItemVenda')
+    ResumoVendaDiaria = apps.get_model('caixa_pdv', 'ResumoVendaDiaria')
+    linhas = (
+        ItemVenda.objects.filter(venda__status='finalizada')
+        .annotate(dia=TruncDate('venda__data_venda', tzinfo=timezone.get_current_timezone()))
+        .order_by()
+        .values('dia', 'produto_id')
+        .annotate(total_quantidade=Sum('quantidade'), total_receita=Sum('subtotal'))
+    )
+    ResumoVendaDiaria.objects.bulk_create(
+        [
+            ResumoVendaDiaria(
+                data=linha['dia'], produto_id=linha['produto_id'],
+                quantidade=linha['total_quantidade'] or 0, receita=linha['total_receita'] or 0,
+            )
+            for linha in linhas
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caixa_pdv', '0005_venda_data_id_idx'),
+        ('produtos', '0002_busca_textual_fts'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumoVendaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('quantidade', models.IntegerField(default=0, verbose_name='Quantidade Vendida')),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Receita')),
+                ('produto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumos_venda', to='produtos.produto', verbose_name='Produto')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário de Vendas',
+                'verbose_name_plural': 'Resumos Diários de Vendas',
+                'ordering': ['-data'],
+                'constraints': [models.UniqueConstraint(fields=('data', 'produto'), name='resumo_venda_data_produto_uniq')],
+            },
+        ),
+        migrations.RunPython(preencher_resumos, migrations.RunPython.noop),
+    ]
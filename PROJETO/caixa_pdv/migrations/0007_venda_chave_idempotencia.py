@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caixa_pdv', '0006_resumovendadiaria'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='venda',
+            name='chave_idempotencia',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='Chave de Idempotência'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caixa_pdv', '0007_venda_chave_idempotencia'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TarefaDocumento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('termos', 'Termos de Conformidade'), ('etiquetas', 'Etiquetas de Lote')], max_length=20, verbose_name='Tipo')),
+                ('parametros', models.JSONField(blank=True, default=dict, verbose_name='Parâmetros')),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('executando', 'Executando'), ('concluida', 'Concluída'), ('erro', 'Erro')], default='pendente', max_length=20, verbose_name='Status')),
+                ('progresso', models.PositiveIntegerField(default=0, verbose_name='Progresso')),
+                ('total', models.PositiveIntegerField(default=0, verbose_name='Total')),
+                ('arquivo', models.CharField(blank=True, max_length=255, verbose_name='Arquivo Gerado')),
+                ('mensagem', models.TextField(blank=True, verbose_name='Mensagem')),
+                ('criada_em', models.DateTimeField(auto_now_add=True, verbose_name='Criada em')),
+                ('iniciada_em', models.DateTimeField(blank=True, null=True, verbose_name='Iniciada em')),
+                ('concluida_em', models.DateTimeField(blank=True, null=True, verbose_name='Concluída em')),
+            ],
+            options={
+                'verbose_name': 'Tarefa de Documento',
+                'verbose_name_plural': 'Tarefas de Documentos',
+                'ordering': ['-criada_em'],
+                'indexes': [models.Index(fields=['status', 'id'], name='tarefa_status_id_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caixa_pdv', '0008_tarefadocumento'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='venda',
+            index=models.Index(condition=models.Q(('status', 'finalizada')), fields=['data_venda', 'id'], name='venda_ativa_data_id_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:14
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caixa_pdv', '0009_venda_ativa_data_id_idx'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SessaoCaixa',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('terminal', models.CharField(max_length=50, verbose_name='Terminal')),
+                ('aberta_em', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Aberta em')),
+                ('fechada_em', models.DateTimeField(blank=True, null=True, verbose_name='Fechada em')),
+                ('valor_abertura', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Troco Inicial')),
+                ('quantidade_vendas', models.PositiveIntegerField(default=0, verbose_name='Quantidade de Vendas')),
+                ('total_vendas', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Total de Vendas')),
+                ('total_entradas', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Total de Entradas')),
+                ('total_retiradas', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Total de Retiradas')),
+                ('valor_contado', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True, verbose_name='Valor Contado')),
+                ('diferenca', models.DecimalField(blank=True, decimal_places=2, help_text='Valor contado menos o saldo esperado, no fechamento.', max_digits=12, null=True, verbose_name='Diferença')),
+                ('observacoes', models.TextField(blank=True, default='', verbose_name='Observações do Fechamento')),
+                ('operador', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sessoes_caixa', to=settings.AUTH_USER_MODEL, verbose_name='Operador')),
+            ],
+            options={
+                'verbose_name': 'Sessão de Caixa',
+                'verbose_name_plural': 'Sessões de Caixa',
+            },
+        ),
+        migrations.AddField(
+            model_name='movimentocaixa',
+            name='sessao',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movimentos', to='caixa_pdv.sessaocaixa', verbose_name='Sessão de Caixa'),
+        ),
+        migrations.AddField(
+            model_name='venda',
+            name='sessao',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='vendas', to='caixa_pdv.sessaocaixa', verbose_name='Sessão de Caixa'),
+        ),
+        migrations.AddConstraint(
+            model_name='sessaocaixa',
+            constraint=models.UniqueConstraint(condition=models.Q(('fechada_em__isnull', True)), fields=('terminal',), name='sessao_aberta_por_terminal_uniq'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def preencher_pagamentos(apps, schema_editor):
+    # Vendas anteriores não registravam a forma de pagamento: ficam em dinheiro.
+    Venda = apps.get_model('caixa_pdv', 'Venda')
+    PagamentoVenda = apps.get_model('caixa_pdv', 'PagamentoVenda')
+    ResumoPagamentoDiario = apps.get_model('caixa_pdv', 'ResumoPagamentoDiario')
+    SessaoCaixa = apps.get_model('caixa_pdv', 'SessaoCaixa')
+
+    PagamentoVenda.objects.bulk_create(
+        (
+            PagamentoVenda(venda_id=venda_id, forma='dinheiro', valor=total)
+            for venda_id, total in Venda.objects.values_list('id', 'total_venda').iterator()
+        ),
+        batch_size=500,
+    )
+    linhas = (
+        PagamentoVenda.objects.filter(venda__status='finalizada')
+        .annotate(dia=TruncDate('venda__data_venda', tzinfo=timezone.get_current_timezone()))
+        .order_by()
+        .values('dia', 'forma')
+        .annotate(total_quantidade=Count('id'), total_valor=Sum('valor'))
+    )
+    ResumoPagamentoDiario.objects.bulk_create(
+        [
+            ResumoPagamentoDiario(
+                data=linha['dia'], forma=linha['forma'],
+                quantidade=linha['total_quantidade'], valor=linha['total_valor'] or 0,
+            )
+            for linha in linhas
+        ],
+        batch_size=500,
+    )
+    SessaoCaixa.objects.update(total_dinheiro=F('total_vendas'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caixa_pdv', '0010_sessaocaixa'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sessaocaixa',
+            name='total_dinheiro',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Vendas em Dinheiro'),
+        ),
+        migrations.CreateModel(
+            name='PagamentoVenda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('forma', models.CharField(choices=[('dinheiro', 'Dinheiro'), ('pix', 'Pix'), ('cartao', 'Cartão')], max_length=20, verbose_name='Forma de Pagamento')),
+                ('valor', models.DecimalField(decimal_places=2, max_digits=10, verbose_name='Valor')),
+                ('venda', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pagamentos', to='caixa_pdv.venda', verbose_name='Venda')),
+            ],
+            options={
+                'verbose_name': 'Pagamento da Venda',
+                'verbose_name_plural': 'Pagamentos das Vendas',
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumoPagamentoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField(verbose_name='Data')),
+                ('forma', models.CharField(choices=[('dinheiro', 'Dinheiro'), ('pix', 'Pix'), ('cartao', 'Cartão')], max_length=20, verbose_name='Forma de Pagamento')),
+                ('quantidade', models.IntegerField(default=0, verbose_name='Quantidade de Pagamentos')),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='Valor Recebido')),
+            ],
+            options={
+                'verbose_name': 'Resumo Diário de Pagamentos',
+                'verbose_name_plural': 'Resumos Diários de Pagamentos',
+                'ordering': ['-data'],
+                'constraints': [models.UniqueConstraint(fields=('data', 'forma'), name='resumo_pagamento_data_forma_uniq')],
+            },
+        ),
+        migrations.RunPython(preencher_pagamentos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('caixa_pdv', '0011_pagamentovenda'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='venda',
+            name='data_venda',
+            field=models.DateTimeField(default=django.utils.timezone.now, verbose_name='Data da Venda'),
+        ),
+    ]
@@ -1,29 +1,110 @@
 # caixa_pdv/models.py
+from django.conf import settings
 from django.db import models
 from produtos.models import Produto
 from lotes.models import Lote
 from decimal import Decimal
-from django.db.models import Sum
+from contextlib import contextmanager
+from collections import defaultdict
+import threading
+from django.db.models import Case, Sum, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from django.db import models
 from django.utils import timezone
 
+# Estado por thread usado por suspender_totais_venda() para acumular os deltas
+# de total (e de itens, para os resumos diários) das vendas enquanto os sinais
+# de ItemVenda estão suspensos.
+_estado_totais = threading.local()
+
 class Venda(models.Model):
     STATUS_CHOICES = [
         ('finalizada', 'Finalizada'),
         ('cancelada', 'Cancelada'),
     ]
-    data_venda = models.DateTimeField(auto_now_add=True, verbose_name="Data da Venda")
+    # Hora da gravação, ou a hora informada pelo terminal para vendas feitas sem conexão.
+    data_venda = models.DateTimeField(default=timezone.now, verbose_name="Data da Venda")
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='finalizada', verbose_name="Status")
     total_venda = models.DecimalField(max_digits=10, decimal_places=2, default=0.00, verbose_name="Total da Venda")
     observacoes = models.TextField(blank=True, null=True, verbose_name="Observações")
+    # Gerada pelo terminal do PDV; impede que a mesma venda seja gravada duas vezes.
+    chave_idempotencia = models.CharField(max_length=64, unique=True, null=True, blank=True, verbose_name="Chave de Idempotência")
+    sessao = models.ForeignKey('SessaoCaixa', on_delete=models.PROTECT, null=True, blank=True, related_name='vendas', verbose_name="Sessão de Caixa")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['data_venda', 'id'], name='venda_data_id_idx'),
+            # Índice parcial das vendas ativas: histórico, saldo e relatórios não
+            # percorrem as vendas canceladas.
+            models.Index(
+                fields=['data_venda', 'id'], name='venda_ativa_data_id_idx',
+                condition=models.Q(status='finalizada'),
+            ),
+        ]
+
+    def recalcular_total(self):
+        """
+        Caminho de reparo: recalcula o total a partir da soma dos itens e aplica
+        a diferença com aplicar_delta_total, de modo que pagamentos, sessão,
+        resumos por forma de pagamento e fechamentos acompanham a correção.
+        """
+        soma_itens = self.itens.aggregate(total=Sum('subtotal'))['total'] or Decimal('0.00')
+        total_gravado = Venda.objects.filter(pk=self.pk).values_list('total_venda', flat=True).get()
+        Venda.aplicar_delta_total(self.pk, soma_itens - total_gravado)
+        self.total_venda = soma_itens
+
+    # Mantido por compatibilidade com chamadas antigas.
+    calcular_total = recalcular_total
+
+    @staticmethod
+    def aplicar_delta_total(venda_id, delta, itens=None):
+        """
+        Soma 'delta' ao total da venda com um UPDATE atômico (F()), sem ler o total.
+        'itens' são as variações {produto_id: (quantidade, receita)} dos itens
+        que originaram o delta, aplicadas ao ResumoVendaDiaria da venda.
+
+        Os pagamentos acompanham o total: a diferença é acertada em dinheiro
+        (um acréscimo entra no pagamento em dinheiro; uma redução sai primeiro
+        do dinheiro e depois das outras formas). Se a venda estiver finalizada,
+        a sessão aberta, os resumos por forma de pagamento e os fechamentos de
+        caixa já gravados recebem as mesmas variações.
+        """
+        itens = {produto_id: valores for produto_id, valores in (itens or {}).items() if valores[0] or valores[1]}
+        if not delta and not itens:
+            return
+        from .fechamento import aplicar_delta_fechamentos
+        from .resumos import aplicar_delta_pagamentos, aplicar_delta_resumo
 
-    def calcular_total(self):
-        total_itens_agg = self.itens.aggregate(total=Sum('subtotal'))
-        total_itens = total_itens_agg['total'] or Decimal('0.00')
-        self.total_venda = total_itens
-        self.save()
+        if delta:
+            Venda.objects.filter(pk=venda_id).update(total_venda=F('total_venda') + delta)
+        venda = Venda.objects.filter(pk=venda_id).only('status', 'data_venda', 'sessao_id').first()
+        if venda is None:
+            return
+
+        deltas_forma = _rebalancear_pagamentos(venda_id, delta) if delta else {}
+        if venda.status != 'finalizada':
+            return
+        data = timezone.localdate(venda.data_venda)
+        aplicar_delta_resumo({(data, produto_id): valores for produto_id, valores in itens.items()})
+        if not delta:
+            return
+        _, dinheiro = deltas_forma.get('dinheiro', (0, Decimal('0.00')))
+        if venda.sessao_id:
+            SessaoCaixa.objects.filter(pk=venda.sessao_id, fechada_em__isnull=True).update(
+                total_vendas=F('total_vendas') + delta,
+                total_dinheiro=F('total_dinheiro') + dinheiro,
+            )
+        aplicar_delta_pagamentos({(data, forma): (quantidade, valor) for forma, (quantidade, valor) in deltas_forma.items()})
+        aplicar_delta_fechamentos(venda.data_venda, vendas=delta)
+
+    @property
+    def forma_pagamento(self):
+        """
+        Formas de pagamento da venda para exibição ('Dinheiro', 'Pix + Dinheiro').
+        Use prefetch_related('pagamentos') ao listar várias vendas.
+        """
+        return ' + '.join(pagamento.get_forma_display() for pagamento in self.pagamentos.all())
 
     def __str__(self):
         return f"Venda #{self.id} - {self.data_venda.strftime('%d/%m/%Y %H:%M')}"
@@ -36,21 +117,170 @@ class ItemVenda(models.Model):
     preco_unitario_vendido = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Preço Unitário Vendido")
     subtotal = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Subtotal")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda o que foi lido do banco para calcular os deltas numa edição.
+        instance._subtotal_original = instance.__dict__.get('subtotal')
+        instance._item_original = (
+            instance.__dict__.get('produto_id'), instance.__dict__.get('quantidade'), instance._subtotal_original,
+        )
+        return instance
+
     def save(self, *args, **kwargs):
-        self.subtotal = self.quantidade * self.preco_unitario_vendido
+        # Em centavos, como o campo é gravado: o delta aplicado ao total confere com o banco.
+        self.subtotal = (self.quantidade * Decimal(str(self.preco_unitario_vendido))).quantize(Decimal('0.01'))
         super().save(*args, **kwargs)
     
     def __str__(self):
         return f"{self.quantidade}x {self.produto.variedade} ({self.lote.codigo})"
 
+def recalcular_totais_vendas(vendas=None):
+    """
+    Caminho de reparo dos totais incrementais: compara total_venda com a soma
+    dos itens numa única consulta (subconsulta correlacionada) e, só para as
+    vendas divergentes, aplica a diferença com Venda.aplicar_delta_total.
+    Devolve o número de vendas corrigidas. Deve ser chamada dentro de
+    transaction.atomic().
+    """
+    if vendas is None:
+        vendas = Venda.objects.all()
+    soma_itens = (
+        ItemVenda.objects.filter(venda=OuterRef('pk'))
+        .order_by()
+        .values('venda')
+        .annotate(total=Sum('subtotal'))
+        .values('total')
+    )
+    divergentes = list(
+        vendas.annotate(
+            soma_itens=Coalesce(Subquery(soma_itens), Value(Decimal('0.00')), output_field=models.DecimalField(max_digits=10, decimal_places=2))
+        )
+        .exclude(total_venda=F('soma_itens'))
+        .values_list('id', 'total_venda', 'soma_itens')
+    )
+    for venda_id, total_venda, soma in divergentes:
+        Venda.aplicar_delta_total(venda_id, soma - total_venda)
+    return len(divergentes)
+
+def _somar_itens(destino, itens):
+    for produto_id, (quantidade, receita) in itens.items():
+        quantidade_atual, receita_atual = destino.get(produto_id, (0, Decimal('0.00')))
+        destino[produto_id] = (quantidade_atual + quantidade, receita_atual + receita)
+
+def _registrar_delta_total(venda_id, delta, itens):
+    """
+    Aplica o delta (e as variações dos itens) imediatamente ou, se os totais
+    estiverem suspensos, acumula-os para o fim de suspender_totais_venda().
+    """
+    pendentes = getattr(_estado_totais, 'pendentes', None)
+    if pendentes is not None:
+        pendentes[venda_id] += delta
+        _somar_itens(_estado_totais.itens_pendentes[venda_id], itens)
+    else:
+        Venda.aplicar_delta_total(venda_id, delta, itens)
+
+@contextmanager
+def suspender_totais_venda(aplicar=True):
+    """
+    Suspende a atualização do total da venda pelos sinais de ItemVenda e
+    coalesce os deltas: ao sair do bloco, aplica um único UPDATE por venda.
+    Com aplicar=False os deltas são descartados (ex.: a venda será apagada).
+    Blocos aninhados são absorvidos pelo bloco mais externo.
+    """
+    if getattr(_estado_totais, 'pendentes', None) is not None:
+        yield
+        return
+
+    _estado_totais.pendentes = defaultdict(Decimal)
+    _estado_totais.itens_pendentes = defaultdict(dict)
+    try:
+        yield
+        pendentes, itens_pendentes = _estado_totais.pendentes, _estado_totais.itens_pendentes
+    finally:
+        _estado_totais.pendentes = _estado_totais.itens_pendentes = None
+
+    if aplicar:
+        for venda_id, delta in pendentes.items():
+            Venda.aplicar_delta_total(venda_id, delta, itens_pendentes.get(venda_id))
+
 @receiver(post_save, sender=ItemVenda)
 def update_venda_on_item_save(sender, instance, created, **kwargs):
+    itens = {instance.produto_id: (instance.quantidade, instance.subtotal)}
     if created:
-        instance.venda.calcular_total()
+        delta = instance.subtotal
+    else:
+        subtotal_original = getattr(instance, '_subtotal_original', None)
+        if subtotal_original is None:
+            return
+        delta = instance.subtotal - subtotal_original
+        produto_id, quantidade, subtotal = instance._item_original
+        _somar_itens(itens, {produto_id: (-quantidade, -subtotal)})
+    instance._subtotal_original = instance.subtotal
+    instance._item_original = (instance.produto_id, instance.quantidade, instance.subtotal)
+    _registrar_delta_total(instance.venda_id, delta, itens)
 
 @receiver(post_delete, sender=ItemVenda)
 def update_venda_on_item_delete(sender, instance, **kwargs):
-    instance.venda.calcular_total()
+    _registrar_delta_total(instance.venda_id, -instance.subtotal, {instance.produto_id: (-instance.quantidade, -instance.subtotal)})
+
+FORMA_PAGAMENTO_CHOICES = [
+    ('dinheiro', 'Dinheiro'),
+    ('pix', 'Pix'),
+    ('cartao', 'Cartão'),
+]
+
+class PagamentoVenda(models.Model):
+    """Parte do pagamento de uma venda; a soma dos valores é o total da venda."""
+    venda = models.ForeignKey(Venda, on_delete=models.CASCADE, related_name='pagamentos', verbose_name="Venda")
+    forma = models.CharField(max_length=20, choices=FORMA_PAGAMENTO_CHOICES, verbose_name="Forma de Pagamento")
+    valor = models.DecimalField(max_digits=10, decimal_places=2, verbose_name="Valor")
+
+    class Meta:
+        verbose_name = "Pagamento da Venda"
+        verbose_name_plural = "Pagamentos das Vendas"
+
+    def __str__(self):
+        return f"{self.get_forma_display()} - R$ {self.valor}"
+
+def _rebalancear_pagamentos(venda_id, delta):
+    """
+    Ajusta os pagamentos da venda para que somem o novo total (ver
+    Venda.aplicar_delta_total). Devolve {forma: (quantidade, valor)} com as
+    variações, para os resumos por forma de pagamento.
+    """
+    pagamentos = list(
+        PagamentoVenda.objects.filter(venda_id=venda_id)
+        .order_by(Case(When(forma='dinheiro', then=Value(0)), default=Value(1)), 'id')
+    )
+    if delta > 0:
+        dinheiro = next((pagamento for pagamento in pagamentos if pagamento.forma == 'dinheiro'), None)
+        if dinheiro is None:
+            PagamentoVenda.objects.create(venda_id=venda_id, forma='dinheiro', valor=delta)
+            return {'dinheiro': (1, delta)}
+        PagamentoVenda.objects.filter(pk=dinheiro.pk).update(valor=F('valor') + delta)
+        return {'dinheiro': (0, delta)}
+
+    restante = -delta
+    variacoes = {}
+    alterados, apagados = [], []
+    for pagamento in pagamentos:
+        if not restante:
+            break
+        retirado = min(pagamento.valor, restante)
+        restante -= retirado
+        pagamento.valor -= retirado
+        if pagamento.valor:
+            alterados.append(pagamento)
+        else:
+            apagados.append(pagamento.pk)
+        quantidade, valor = variacoes.get(pagamento.forma, (0, Decimal('0.00')))
+        variacoes[pagamento.forma] = (quantidade - (0 if pagamento.valor else 1), valor - retirado)
+    if alterados:
+        PagamentoVenda.objects.bulk_update(alterados, ['valor'])
+    if apagados:
+        PagamentoVenda.objects.filter(pk__in=apagados).delete()
+    return variacoes
 
 class MovimentoCaixa(models.Model):
     TIPO_MOVIMENTO_CHOICES = [
@@ -62,6 +292,23 @@ class MovimentoCaixa(models.Model):
     tipo = models.CharField(max_length=10, choices=TIPO_MOVIMENTO_CHOICES)
     valor = models.DecimalField(max_digits=10, decimal_places=2)
     descricao = models.CharField(max_length=255, blank=True, null=True)
+    sessao = models.ForeignKey('SessaoCaixa', on_delete=models.PROTECT, null=True, blank=True, related_name='movimentos', verbose_name="Sessão de Caixa")
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Guarda o que foi lido do banco para corrigir os totais da sessão e os
+        # fechamentos numa edição.
+        instance._original = (
+            instance.__dict__.get('sessao_id'), instance.__dict__.get('tipo'),
+            instance.__dict__.get('valor'), instance.__dict__.get('data_hora'),
+        )
+        return instance
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Depois dos sinais post_save, que ainda leem o estado anterior.
+        self._original = (self.sessao_id, self.tipo, self.valor, self.data_hora)
 
     def __str__(self):
         return f"{self.get_tipo_display()} - R$ {self.valor} em {self.data_hora.strftime('%d/%m/%Y %H:%M')}"
@@ -69,4 +316,166 @@ class MovimentoCaixa(models.Model):
     class Meta:
         verbose_name = "Movimento de Caixa"
         verbose_name_plural = "Movimentos de Caixa"
-        ordering = ['-data_hora']
\ No newline at end of file
+        ordering = ['-data_hora']
+        indexes = [
+            # Índice composto da paginação por cursor do extrato (data_hora, id).
+            models.Index(fields=['data_hora', 'id'], name='movcaixa_data_hora_id_idx'),
+        ]
+
+class SessaoCaixa(models.Model):
+    """
+    Sessão (turno) de um terminal do PDV, da abertura com o troco inicial até
+    o fechamento com a conferência do dinheiro. Os totais são mantidos de forma
+    incremental a cada venda e movimento (caixa_pdv/sessoes.py), de modo que
+    fechar a sessão só lê esta linha.
+    """
+    terminal = models.CharField(max_length=50, verbose_name="Terminal")
+    operador = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='sessoes_caixa', verbose_name="Operador")
+    aberta_em = models.DateTimeField(default=timezone.now, verbose_name="Aberta em")
+    fechada_em = models.DateTimeField(null=True, blank=True, verbose_name="Fechada em")
+    valor_abertura = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Troco Inicial")
+    quantidade_vendas = models.PositiveIntegerField(default=0, verbose_name="Quantidade de Vendas")
+    total_vendas = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Total de Vendas")
+    total_dinheiro = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Vendas em Dinheiro")
+    total_entradas = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Total de Entradas")
+    total_retiradas = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Total de Retiradas")
+    valor_contado = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="Valor Contado")
+    diferenca = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True, verbose_name="Diferença", help_text="Valor contado menos o saldo esperado, no fechamento.")
+    observacoes = models.TextField(blank=True, default='', verbose_name="Observações do Fechamento")
+
+    class Meta:
+        verbose_name = "Sessão de Caixa"
+        verbose_name_plural = "Sessões de Caixa"
+        constraints = [
+            # No máximo uma sessão aberta por terminal.
+            models.UniqueConstraint(
+                fields=['terminal'], condition=models.Q(fechada_em__isnull=True),
+                name='sessao_aberta_por_terminal_uniq',
+            ),
+        ]
+
+    @property
+    def aberta(self):
+        return self.fechada_em is None
+
+    @property
+    def saldo_esperado(self):
+        """Dinheiro esperado na gaveta: só a parte das vendas paga em dinheiro."""
+        return self.valor_abertura + self.total_dinheiro + self.total_entradas - self.total_retiradas
+
+    def __str__(self):
+        return f"Sessão #{self.id} - {self.terminal} - {timezone.localtime(self.aberta_em).strftime('%d/%m/%Y %H:%M')}"
+
+class FechamentoCaixa(models.Model):
+    """
+    Fotografia do caixa: totais do período [periodo_inicio, periodo_fim) e o
+    saldo acumulado ao fim dele. O saldo atual é o saldo do último fechamento
+    mais o movimento posterior a periodo_fim.
+    """
+    TIPO_CHOICES = [
+        ('diario', 'Diário'),
+        ('turno', 'Turno'),
+    ]
+
+    tipo = models.CharField(max_length=10, choices=TIPO_CHOICES, default='diario', verbose_name="Tipo")
+    periodo_inicio = models.DateTimeField(null=True, blank=True, verbose_name="Início do Período")
+    periodo_fim = models.DateTimeField(unique=True, verbose_name="Fim do Período")
+    total_vendas = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Total de Vendas")
+    total_entradas = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Total de Entradas")
+    total_retiradas = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Total de Retiradas")
+    saldo = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Saldo ao Fechamento")
+    saldo_movimentos = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Saldo Acumulado dos Movimentos", help_text="Entradas menos retiradas desde o início, ao fim do período.")
+    criado_em = models.DateTimeField(auto_now_add=True, verbose_name="Criado em")
+
+    def __str__(self):
+        return f"Fechamento {self.get_tipo_display()} - {timezone.localtime(self.periodo_fim).strftime('%d/%m/%Y %H:%M')} - Saldo R$ {self.saldo}"
+
+    class Meta:
+        verbose_name = "Fechamento de Caixa"
+        verbose_name_plural = "Fechamentos de Caixa"
+        ordering = ['-periodo_fim']
+
+class ResumoVendaDiaria(models.Model):
+    """
+    Totais de vendas finalizadas por dia (fuso local) e produto. Mantido pelo
+    checkout e pela exclusão de vendas (caixa_pdv.resumos); relatórios leem
+    estas linhas em vez de agregar todos os itens vendidos.
+    """
+    data = models.DateField(verbose_name="Data")
+    produto = models.ForeignKey(Produto, on_delete=models.CASCADE, related_name='resumos_venda', verbose_name="Produto")
+    quantidade = models.IntegerField(default=0, verbose_name="Quantidade Vendida")
+    receita = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Receita")
+
+    def __str__(self):
+        return f"{self.data.strftime('%d/%m/%Y')} - {self.produto.variedade}: {self.quantidade} un. / R$ {self.receita}"
+
+    class Meta:
+        verbose_name = "Resumo Diário de Vendas"
+        verbose_name_plural = "Resumos Diários de Vendas"
+        ordering = ['-data']
+        constraints = [
+            models.UniqueConstraint(fields=['data', 'produto'], name='resumo_venda_data_produto_uniq'),
+        ]
+
+
+class ResumoPagamentoDiario(models.Model):
+    """
+    Totais recebidos por dia (fuso local) e forma de pagamento, somente de
+    vendas finalizadas. Mantido na transação do checkout, cancelamento e
+    exclusão (caixa_pdv.resumos).
+    """
+    data = models.DateField(verbose_name="Data")
+    forma = models.CharField(max_length=20, choices=FORMA_PAGAMENTO_CHOICES, verbose_name="Forma de Pagamento")
+    quantidade = models.IntegerField(default=0, verbose_name="Quantidade de Pagamentos")
+    valor = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="Valor Recebido")
+
+    def __str__(self):
+        return f"{self.data.strftime('%d/%m/%Y')} - {self.get_forma_display()}: R$ {self.valor}"
+
+    class Meta:
+        verbose_name = "Resumo Diário de Pagamentos"
+        verbose_name_plural = "Resumos Diários de Pagamentos"
+        ordering = ['-data']
+        constraints = [
+            models.UniqueConstraint(fields=['data', 'forma'], name='resumo_pagamento_data_forma_uniq'),
+        ]
+
+
+class TarefaDocumento(models.Model):
+    """
+    Pedido de geração de documento (termos de conformidade, etiquetas de lote)
+    executado fora da requisição pelo comando 'processar_tarefas'.
+    """
+    TIPO_CHOICES = [
+        ('termos', 'Termos de Conformidade'),
+        ('etiquetas', 'Etiquetas de Lote'),
+    ]
+    STATUS_CHOICES = [
+        ('pendente', 'Pendente'),
+        ('executando', 'Executando'),
+        ('concluida', 'Concluída'),
+        ('erro', 'Erro'),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES, verbose_name="Tipo")
+    parametros = models.JSONField(default=dict, blank=True, verbose_name="Parâmetros")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente', verbose_name="Status")
+    progresso = models.PositiveIntegerField(default=0, verbose_name="Progresso")
+    total = models.PositiveIntegerField(default=0, verbose_name="Total")
+    arquivo = models.CharField(max_length=255, blank=True, verbose_name="Arquivo Gerado")
+    mensagem = models.TextField(blank=True, verbose_name="Mensagem")
+    criada_em = models.DateTimeField(auto_now_add=True, verbose_name="Criada em")
+    iniciada_em = models.DateTimeField(null=True, blank=True, verbose_name="Iniciada em")
+    concluida_em = models.DateTimeField(null=True, blank=True, verbose_name="Concluída em")
+
+    def __str__(self):
+        return f"Tarefa #{self.id} - {self.get_tipo_display()} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = "Tarefa de Documento"
+        verbose_name_plural = "Tarefas de Documentos"
+        ordering = ['-criada_em']
+        indexes = [
+            # Os workers pegam a tarefa pendente mais antiga.
+            models.Index(fields=['status', 'id'], name='tarefa_status_id_idx'),
+        ]
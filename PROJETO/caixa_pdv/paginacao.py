@@ -0,0 +1,48 @@
+# caixa_pdv/paginacao.py
+"""
+Paginação por cursor (keyset) sobre (data/hora, id), usada no histórico de
+vendas, no extrato do caixa e na API REST de vendas. O cursor é opaco para o cliente: codifica a
+chave do último item da página, e a página seguinte começa logo depois dela.
+"""
+import base64
+import datetime
+
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+
+def codificar_cursor(data_hora, pk):
+    valor = f"{data_hora.isoformat()}|{pk}"
+    return base64.urlsafe_b64encode(valor.encode('utf-8')).decode('ascii')
+
+
+def decodificar_cursor(cursor):
+    """Devolve (data_hora, pk). Levanta ValueError se o cursor for inválido."""
+    try:
+        data_hora, pk = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+        return datetime.datetime.fromisoformat(data_hora), int(pk)
+    except Exception:
+        raise ValueError('Cursor inválido.')
+
+
+def filtro_antes(campo, data_hora, pk):
+    """Itens anteriores a (data_hora, pk) na ordenação (campo, id)."""
+    return Q(**{f'{campo}__lt': data_hora}) | Q(**{campo: data_hora, 'id__lt': pk})
+
+
+class PaginacaoVendas(CursorPagination):
+    """
+    Paginação por cursor do VendaViewSet, da venda mais recente para a mais
+    antiga. Só vale quando o cliente pede ('cursor' ou 'page_size'); sem esses
+    parâmetros a listagem continua sendo a lista simples de antes.
+    """
+    ordering = ('-data_venda', '-id')
+    page_size = getattr(settings, 'PDV_API_VENDAS_POR_PAGINA', 50)
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params and self.page_size_query_param not in request.query_params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
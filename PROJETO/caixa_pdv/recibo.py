@@ -0,0 +1,164 @@
+# caixa_pdv/recibo.py
+"""
+Recibo de venda para impressoras térmicas ESC/POS (bobinas de 58 ou 80 mm).
+
+Os comandos são montados direto em bytes, sem PDF nem rasterização: o recibo
+de uma venda sai em poucos milissegundos. O texto vai na página de código
+860 (português) e o id da venda é impresso como código de barras Code128.
+O mesmo montador produz uma prévia em texto puro, com a largura da bobina.
+"""
+import socket
+import textwrap
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .models import Venda, ItemVenda, PagamentoVenda
+
+# Colunas de texto na fonte padrão (fonte A) de cada largura de bobina.
+COLUNAS_POR_LARGURA = {58: 32, 80: 48}
+
+RECIBO_LARGURA = getattr(settings, 'PDV_RECIBO_LARGURA', 80)
+# Arquivo do dispositivo ('/dev/usb/lp0') ou 'tcp://host:porta' de uma impressora de rede.
+RECIBO_IMPRESSORA = getattr(settings, 'PDV_RECIBO_IMPRESSORA', None)
+RECIBO_TIMEOUT = getattr(settings, 'PDV_RECIBO_TIMEOUT', 5)
+RECIBO_CABECALHO = getattr(settings, 'PDV_RECIBO_CABECALHO', [
+    'Rua Santa Rita, nº 595 - Centro',
+    'Chapecó - SC, CEP 89801-081',
+    'Fone: (49) 3328-5690',
+])
+RECIBO_RODAPE = getattr(settings, 'PDV_RECIBO_RODAPE', ['Obrigado pela preferência!'])
+
+ESC = b'\x1b'
+GS = b'\x1d'
+INICIAR = ESC + b'@'
+# ESC t 3: página de código 860 (português) nas impressoras compatíveis com Epson.
+PAGINA_CODIGO = ESC + b't\x03'
+CODIFICACAO = 'cp860'
+ALINHAMENTO = {'esquerda': ESC + b'a\x00', 'centro': ESC + b'a\x01', 'direita': ESC + b'a\x02'}
+NEGRITO = (ESC + b'E\x00', ESC + b'E\x01')
+TAMANHO = (GS + b'!\x00', GS + b'!\x11')  # normal / altura e largura dobradas
+CORTAR = GS + b'V\x42\x00'  # avança o papel até a guilhotina e corta (parcial)
+
+
+class Recibo:
+    """
+    Acumula as linhas do recibo em ESC/POS e, em paralelo, em texto puro.
+    """
+
+    def __init__(self, largura=None):
+        largura = int(largura or RECIBO_LARGURA)
+        if largura not in COLUNAS_POR_LARGURA:
+            raise ValueError(f"Largura de bobina inválida: {largura}. Use 58 ou 80.")
+        self.colunas = COLUNAS_POR_LARGURA[largura]
+        self.dados = bytearray(INICIAR + PAGINA_CODIGO)
+        self.texto = []
+
+    def linha(self, texto='', alinhamento='esquerda', negrito=False, grande=False):
+        colunas = self.colunas // 2 if grande else self.colunas
+        texto = str(texto)[:colunas]
+        self.dados += ALINHAMENTO[alinhamento] + NEGRITO[negrito] + TAMANHO[grande]
+        self.dados += texto.encode(CODIFICACAO, errors='replace') + b'\n'
+        self.dados += NEGRITO[False] + TAMANHO[False]
+        if alinhamento == 'centro':
+            texto = texto.center(colunas)
+        elif alinhamento == 'direita':
+            texto = texto.rjust(colunas)
+        self.texto.append(' '.join(texto) if grande else texto)
+
+    def paragrafo(self, texto):
+        """Texto longo quebrado em várias linhas na largura da bobina."""
+        for linha in textwrap.wrap(str(texto), self.colunas) or ['']:
+            self.linha(linha)
+
+    def colunas_ajustadas(self, esquerda, direita, negrito=False):
+        """Texto à esquerda e valor à direita na mesma linha."""
+        espaco = self.colunas - len(direita) - 1
+        self.linha(f"{esquerda[:espaco]:<{espaco}} {direita}", negrito=negrito)
+
+    def separador(self, caractere='-'):
+        self.linha(caractere * self.colunas)
+
+    def codigo_barras(self, valor):
+        """Code128 (conjunto B) com o texto legível abaixo das barras."""
+        conteudo = b'{B' + str(valor).encode('ascii')
+        self.dados += ALINHAMENTO['centro']
+        self.dados += GS + b'h\x50' + GS + b'w\x02' + GS + b'H\x02'
+        self.dados += GS + b'k\x49' + bytes([len(conteudo)]) + conteudo + b'\n'
+        self.dados += ALINHAMENTO['esquerda']
+        self.texto.append(f"||| {valor} |||".center(self.colunas))
+
+    def cortar(self, linhas_em_branco=3):
+        self.dados += ESC + b'd' + bytes([linhas_em_branco]) + CORTAR
+
+    def como_texto(self):
+        return '\n'.join(self.texto) + '\n'
+
+
+def _reais(valor):
+    return f"R$ {valor:.2f}".replace('.', ',')
+
+
+def carregar_venda(venda_id):
+    """Venda com os itens, lotes, produtos e pagamentos em três consultas. Levanta Venda.DoesNotExist."""
+    return Venda.objects.prefetch_related(
+        Prefetch('itens', queryset=ItemVenda.objects.select_related('produto', 'lote').order_by('id')),
+        Prefetch('pagamentos', queryset=PagamentoVenda.objects.order_by('id')),
+    ).get(id=venda_id)
+
+
+def montar_recibo(venda, largura=None):
+    """Recibo de uma venda carregada com carregar_venda()."""
+    recibo = Recibo(largura)
+    recibo.linha('Viveiro Lagni', alinhamento='centro', negrito=True, grande=True)
+    for linha in RECIBO_CABECALHO:
+        recibo.linha(linha, alinhamento='centro')
+    recibo.separador()
+    recibo.colunas_ajustadas(f"Venda #{venda.id}", timezone.localtime(venda.data_venda).strftime('%d/%m/%Y %H:%M'))
+    if venda.status == 'cancelada':
+        recibo.linha('*** VENDA CANCELADA ***', alinhamento='centro', negrito=True)
+    recibo.separador()
+
+    for item in venda.itens.all():
+        nome = item.produto.variedade if item.produto else 'Produto'
+        recibo.paragrafo(nome)
+        recibo.colunas_ajustadas(
+            f"  {item.quantidade} x {_reais(item.preco_unitario_vendido)}  {item.lote.codigo if item.lote else ''}",
+            _reais(item.subtotal),
+        )
+    recibo.separador()
+    recibo.colunas_ajustadas('TOTAL', _reais(venda.total_venda), negrito=True)
+
+    for pagamento in venda.pagamentos.all():
+        recibo.colunas_ajustadas(pagamento.get_forma_display(), _reais(pagamento.valor))
+    if venda.observacoes:
+        recibo.linha()
+        recibo.paragrafo(venda.observacoes)
+
+    recibo.linha()
+    recibo.codigo_barras(venda.id)
+    for linha in RECIBO_RODAPE:
+        recibo.linha(linha, alinhamento='centro')
+    recibo.cortar()
+    return recibo
+
+
+def enviar_para_impressora(dados, destino=None):
+    """
+    Escreve os bytes ESC/POS no dispositivo ou socket 'tcp://host:porta'.
+    Levanta ValueError sem destino configurado e OSError em falha de comunicação.
+    """
+    destino = destino or RECIBO_IMPRESSORA
+    if not destino:
+        raise ValueError('Nenhuma impressora de recibos configurada (PDV_RECIBO_IMPRESSORA).')
+    if destino.startswith('tcp://'):
+        endereco = destino[len('tcp://'):]
+        host, separador, porta = endereco.rpartition(':')
+        if not separador:
+            host, porta = endereco, 9100
+        with socket.create_connection((host, int(porta)), timeout=RECIBO_TIMEOUT) as conexao:
+            conexao.sendall(bytes(dados))
+    else:
+        with open(destino, 'wb') as dispositivo:
+            dispositivo.write(bytes(dados))
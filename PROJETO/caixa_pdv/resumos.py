@@ -0,0 +1,234 @@
+# caixa_pdv/resumos.py
+"""
+Resumos diários de vendas (ResumoVendaDiaria): quantidade e receita por dia
+e produto, somente de vendas finalizadas. ResumoPagamentoDiario guarda, do
+mesmo modo, os valores recebidos por dia e forma de pagamento.
+
+O checkout e a exclusão de vendas aplicam aqui as variações dentro da própria
+transação, e a edição de itens (API ou admin) pelos sinais de ItemVenda, via
+Venda.aplicar_delta_total; 'reconstruir_resumos' refaz tudo a partir dos itens
+vendidos.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ItemVenda, PagamentoVenda, ResumoPagamentoDiario, ResumoVendaDiaria
+
+ZERO = Decimal('0.00')
+
+
+def aplicar_delta_resumo(deltas):
+    """
+    Soma as variações {(data, produto_id): (quantidade, receita)} aos resumos:
+    cria as linhas que faltam e atualiza todas com um único UPDATE com F().
+    """
+    deltas = {chave: valores for chave, valores in deltas.items() if valores[0] or valores[1]}
+    if not deltas:
+        return
+
+    ResumoVendaDiaria.objects.bulk_create(
+        [ResumoVendaDiaria(data=data, produto_id=produto_id) for data, produto_id in deltas],
+        ignore_conflicts=True,
+    )
+    filtro = Q()
+    for data, produto_id in deltas:
+        filtro |= Q(data=data, produto_id=produto_id)
+    ResumoVendaDiaria.objects.filter(filtro).update(
+        quantidade=F('quantidade') + Case(
+            *[When(data=data, produto_id=produto_id, then=Value(quantidade))
+              for (data, produto_id), (quantidade, _) in deltas.items()],
+            default=Value(0),
+        ),
+        receita=F('receita') + Case(
+            *[When(data=data, produto_id=produto_id, then=Value(receita))
+              for (data, produto_id), (_, receita) in deltas.items()],
+            default=Value(ZERO),
+        ),
+    )
+
+
+def _deltas_da_venda(venda, itens, sinal):
+    data = timezone.localdate(venda.data_venda)
+    deltas = defaultdict(lambda: (0, ZERO))
+    for produto_id, quantidade, subtotal in itens:
+        quantidade_atual, receita_atual = deltas[(data, produto_id)]
+        deltas[(data, produto_id)] = (quantidade_atual + sinal * quantidade, receita_atual + sinal * subtotal)
+    return deltas
+
+
+def registrar_vendas(vendas_itens):
+    """Soma aos resumos os itens de várias vendas finalizadas: [(venda, [ItemVenda])]."""
+    deltas = defaultdict(lambda: (0, ZERO))
+    for venda, itens in vendas_itens:
+        for chave, (quantidade, receita) in _deltas_da_venda(
+            venda, [(item.produto_id, item.quantidade, item.subtotal) for item in itens], 1
+        ).items():
+            deltas[chave] = (deltas[chave][0] + quantidade, deltas[chave][1] + receita)
+    aplicar_delta_resumo(deltas)
+
+
+def registrar_venda(venda, itens):
+    """Soma os itens (ItemVenda) de uma venda finalizada aos resumos."""
+    registrar_vendas([(venda, itens)])
+
+
+def estornar_venda(venda, itens=None):
+    """
+    Retira dos resumos os itens de uma venda finalizada (antes de apagá-la).
+    'itens', se já lidos, são tuplas (produto_id, quantidade, subtotal).
+    """
+    if venda.status != 'finalizada':
+        return
+    if itens is None:
+        itens = ItemVenda.objects.filter(venda_id=venda.id).values_list('produto_id', 'quantidade', 'subtotal')
+    aplicar_delta_resumo(_deltas_da_venda(venda, itens, -1))
+
+
+@transaction.atomic
+def reconstruir_resumos():
+    """Apaga e refaz os resumos com uma agregação por dia e produto."""
+    ResumoVendaDiaria.objects.all().delete()
+    linhas = (
+        ItemVenda.objects.filter(venda__status='finalizada')
+        .annotate(dia=TruncDate('venda__data_venda', tzinfo=timezone.get_current_timezone()))
+        .order_by()
+        .values('dia', 'produto_id')
+        .annotate(total_quantidade=Sum('quantidade'), total_receita=Sum('subtotal'))
+    )
+    resumos = ResumoVendaDiaria.objects.bulk_create(
+        [
+            ResumoVendaDiaria(
+                data=linha['dia'], produto_id=linha['produto_id'],
+                quantidade=linha['total_quantidade'] or 0, receita=linha['total_receita'] or ZERO,
+            )
+            for linha in linhas.iterator()
+        ],
+        batch_size=500,
+    )
+    return len(resumos)
+
+
+def aplicar_delta_pagamentos(deltas):
+    """
+    Soma as variações {(data, forma): (quantidade, valor)} aos resumos de
+    pagamento, como aplicar_delta_resumo.
+    """
+    deltas = {chave: valores for chave, valores in deltas.items() if valores[0] or valores[1]}
+    if not deltas:
+        return
+
+    ResumoPagamentoDiario.objects.bulk_create(
+        [ResumoPagamentoDiario(data=data, forma=forma) for data, forma in deltas],
+        ignore_conflicts=True,
+    )
+    filtro = Q()
+    for data, forma in deltas:
+        filtro |= Q(data=data, forma=forma)
+    ResumoPagamentoDiario.objects.filter(filtro).update(
+        quantidade=F('quantidade') + Case(
+            *[When(data=data, forma=forma, then=Value(quantidade))
+              for (data, forma), (quantidade, _) in deltas.items()],
+            default=Value(0),
+        ),
+        valor=F('valor') + Case(
+            *[When(data=data, forma=forma, then=Value(valor))
+              for (data, forma), (_, valor) in deltas.items()],
+            default=Value(ZERO),
+        ),
+    )
+
+
+def registrar_pagamentos(vendas_pagamentos, sinal=1):
+    """
+    Soma (sinal=1) ou retira (sinal=-1) dos resumos os pagamentos de vendas
+    finalizadas: [(venda, [(forma, valor)])].
+    """
+    deltas = defaultdict(lambda: (0, ZERO))
+    for venda, pagamentos in vendas_pagamentos:
+        data = timezone.localdate(venda.data_venda)
+        for forma, valor in pagamentos:
+            quantidade_atual, valor_atual = deltas[(data, forma)]
+            deltas[(data, forma)] = (quantidade_atual + sinal, valor_atual + sinal * valor)
+    aplicar_delta_pagamentos(deltas)
+
+
+def estornar_pagamentos(venda, pagamentos=None):
+    """Retira dos resumos os pagamentos de uma venda finalizada (cancelamento ou exclusão)."""
+    if venda.status != 'finalizada':
+        return
+    if pagamentos is None:
+        pagamentos = PagamentoVenda.objects.filter(venda_id=venda.id).values_list('forma', 'valor')
+    registrar_pagamentos([(venda, pagamentos)], sinal=-1)
+
+
+@transaction.atomic
+def reconstruir_resumos_pagamentos():
+    """Apaga e refaz os resumos de pagamento com uma agregação por dia e forma."""
+    ResumoPagamentoDiario.objects.all().delete()
+    linhas = (
+        PagamentoVenda.objects.filter(venda__status='finalizada')
+        .annotate(dia=TruncDate('venda__data_venda', tzinfo=timezone.get_current_timezone()))
+        .order_by()
+        .values('dia', 'forma')
+        .annotate(total_quantidade=Count('id'), total_valor=Sum('valor'))
+    )
+    resumos = ResumoPagamentoDiario.objects.bulk_create(
+        [
+            ResumoPagamentoDiario(
+                data=linha['dia'], forma=linha['forma'],
+                quantidade=linha['total_quantidade'], valor=linha['total_valor'] or ZERO,
+            )
+            for linha in linhas.iterator()
+        ],
+        batch_size=500,
+    )
+    return len(resumos)
+
+
+# --- Consultas ---
+
+def resumos_periodo(data_inicio=None, data_fim=None):
+    """Resumos entre as datas dadas (inclusive)."""
+    resumos = ResumoVendaDiaria.objects.all()
+    if data_inicio:
+        resumos = resumos.filter(data__gte=data_inicio)
+    if data_fim:
+        resumos = resumos.filter(data__lte=data_fim)
+    return resumos
+
+
+def _agregar(resumos, *campos):
+    return resumos.order_by().values(*campos).annotate(
+        total_quantidade=Sum('quantidade'), total_receita=Sum('receita')
+    )
+
+
+def receita_por_dia(data_inicio=None, data_fim=None):
+    return _agregar(resumos_periodo(data_inicio, data_fim), 'data').order_by('data')
+
+
+def vendas_por_produto(data_inicio=None, data_fim=None):
+    return _agregar(
+        resumos_periodo(data_inicio, data_fim), 'produto_id', 'produto__cod', 'produto__variedade'
+    ).order_by('-total_receita')
+
+
+def receita_por_tipo(data_inicio=None, data_fim=None):
+    return _agregar(resumos_periodo(data_inicio, data_fim), 'produto__tipo').order_by('-total_receita')
+
+
+def receita_por_forma_pagamento(data_inicio=None, data_fim=None):
+    """Valores recebidos por dia e forma de pagamento (dinheiro x Pix do dia)."""
+    resumos = ResumoPagamentoDiario.objects.all()
+    if data_inicio:
+        resumos = resumos.filter(data__gte=data_inicio)
+    if data_fim:
+        resumos = resumos.filter(data__lte=data_fim)
+    return resumos.order_by('data', 'forma').values('data', 'forma').annotate(
+        total_quantidade=Sum('quantidade'), total_receita=Sum('valor')
+    )
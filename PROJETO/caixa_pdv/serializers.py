@@ -1,6 +1,6 @@
 # caixa_pdv/serializers.py
 from rest_framework import serializers
-from .models import Venda, ItemVenda, Lote, Produto, MovimentoCaixa
+from .models import Venda, ItemVenda, PagamentoVenda, Lote, Produto, MovimentoCaixa
 
 # Certifique-se de que o Produto e Lote são importados corretamente
 # se você não os tiver na mesma app, ajuste a importação
@@ -24,16 +24,30 @@ class ItemVendaSerializer(serializers.ModelSerializer):
         model = ItemVenda
         fields = ['id', 'lote', 'quantidade', 'preco_unitario_vendido', 'subtotal']
             
+class PagamentoVendaSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PagamentoVenda
+        fields = ['forma', 'valor']
+
 class VendaSerializer(serializers.ModelSerializer):
     itens = ItemVendaSerializer(many=True, read_only=True)
+    pagamentos = PagamentoVendaSerializer(many=True, read_only=True)
     
     # Este campo já estava comentado, o que é o correto
     # cliente_nome = serializers.CharField(source='cliente.nome_completo', read_only=True) 
 
     class Meta:
         model = Venda
-        # O campo 'forma_pagamento' foi removido porque não existe no seu models.py
-        fields = ['id', 'data_venda', 'total_venda', 'observacoes', 'itens']
+        fields = ['id', 'data_venda', 'total_venda', 'observacoes', 'itens', 'pagamentos']
+        read_only_fields = ['data_venda']
+
+class VendaResumoSerializer(serializers.ModelSerializer):
+    # Preenchido pela anotação Count('itens') do VendaViewSet, sem carregar os itens.
+    quantidade_itens = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = Venda
+        fields = ['id', 'data_venda', 'total_venda', 'status', 'quantidade_itens']
 
 class MovimentoCaixaSerializer(serializers.ModelSerializer):
     class Meta:
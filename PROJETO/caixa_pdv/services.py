@@ -0,0 +1,444 @@
+# caixa_pdv/services.py
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from lotes.models import Lote, incrementar_versao_lotes, registrar_eventos_estoque
+from produtos.models import Produto
+from .models import FORMA_PAGAMENTO_CHOICES, Venda, ItemVenda, PagamentoVenda, suspender_totais_venda
+from .busca import cache_scan
+from .fechamento import aplicar_delta_fechamentos, ultimo_fechamento
+from .resumos import estornar_pagamentos, estornar_venda, registrar_pagamentos, registrar_venda, registrar_vendas
+from .sessoes import registrar_vendas_sessao, sessao_aberta_id
+from .termos import apagar_termos_em_cache
+
+
+# Casas decimais dos campos de valor (DecimalField(decimal_places=2)).
+CENTAVO = Decimal('0.01')
+
+
+def centavos(valor):
+    """Arredonda para centavos como o DecimalField grava o valor."""
+    return valor.quantize(CENTAVO)
+
+
+def normalizar_itens(itens_venda):
+    """
+    Valida os itens recebidos do PDV e devolve uma lista de tuplas
+    (lote_id, quantidade, preco_unitario) já convertidas. O preço vem
+    arredondado para centavos, como será gravado no item.
+    """
+    itens = []
+    for item_data in itens_venda:
+        lote_id = item_data.get('lote_id')
+        preco_unitario = item_data.get('preco_unitario')
+
+        try:
+            quantidade_solicitada = int(item_data.get('quantidade'))
+        except (TypeError, ValueError):
+            raise ValueError("Dados incompletos ou inválidos para um item da venda.")
+
+        if not lote_id or quantidade_solicitada <= 0 or preco_unitario is None:
+            raise ValueError("Dados incompletos ou inválidos para um item da venda.")
+
+        try:
+            preco_unitario_decimal = centavos(Decimal(str(preco_unitario)))
+        except Exception:
+            raise ValueError(f"Preço unitário inválido para item do lote {lote_id}.")
+        if preco_unitario_decimal < 0:
+            raise ValueError(f"Preço unitário inválido para item do lote {lote_id}.")
+
+        itens.append((int(lote_id), quantidade_solicitada, preco_unitario_decimal))
+    return itens
+
+
+FORMAS_PAGAMENTO = dict(FORMA_PAGAMENTO_CHOICES)
+
+
+def normalizar_pagamentos(pagamentos, total, forma_pagamento=None):
+    """
+    Valida o pagamento de uma venda e devolve uma lista de tuplas
+    (forma, valor), uma por forma. 'pagamentos' é uma lista de
+    {'forma': ..., 'valor': ...} cuja soma deve ser o total da venda; sem ela,
+    o total inteiro é pago em 'forma_pagamento' (padrão: dinheiro).
+    Levanta ValueError.
+    """
+    if not pagamentos:
+        pagamentos = [{'forma': forma_pagamento or 'dinheiro', 'valor': total}]
+    if not isinstance(pagamentos, list):
+        raise ValueError("Os pagamentos da venda devem ser uma lista.")
+
+    valores = defaultdict(Decimal)
+    for pagamento in pagamentos:
+        forma = pagamento.get('forma') if isinstance(pagamento, dict) else None
+        if forma not in FORMAS_PAGAMENTO:
+            raise ValueError(f"Forma de pagamento inválida: {forma}.")
+        try:
+            valor = centavos(Decimal(str(pagamento.get('valor'))))
+        except Exception:
+            raise ValueError(f"Valor inválido para o pagamento em {FORMAS_PAGAMENTO[forma]}.")
+        if not valor.is_finite() or valor <= 0:
+            raise ValueError(f"Valor inválido para o pagamento em {FORMAS_PAGAMENTO[forma]}.")
+        valores[forma] += valor
+
+    soma = sum(valores.values(), Decimal('0.00'))
+    if soma != centavos(total):
+        raise ValueError(f"A soma dos pagamentos (R$ {soma:.2f}) não confere com o total da venda (R$ {total:.2f}).")
+    return list(valores.items())
+
+
+def _pagamentos_da_venda(venda, pagamentos):
+    return [PagamentoVenda(venda=venda, forma=forma, valor=valor) for forma, valor in pagamentos]
+
+
+def _dinheiro(vendas_pagamentos):
+    """{venda_id: valor pago em dinheiro} para registrar_vendas_sessao."""
+    return {
+        venda.id: sum((valor for forma, valor in pagamentos if forma == 'dinheiro'), Decimal('0.00'))
+        for venda, pagamentos in vendas_pagamentos
+    }
+
+
+def bloquear_lotes(lote_ids):
+    """
+    Trava todos os lotes solicitados numa única consulta (em ordem de id, para
+    evitar deadlocks entre terminais) e devolve um dicionário {id: lote}.
+    Levanta Lote.DoesNotExist se algum id não existir.
+    """
+    lotes = {
+        lote.id: lote
+        for lote in Lote.objects.select_for_update()
+        .filter(id__in=set(lote_ids))
+        .only('id', 'codigo', 'quantidade', 'produto_id')
+        .order_by('id')
+    }
+    if len(lotes) != len(set(lote_ids)):
+        raise Lote.DoesNotExist("Um dos lotes da venda não foi encontrado.")
+    return lotes
+
+
+def aplicar_delta_estoque(deltas_lote, deltas_produto):
+    """
+    Aplica variações de estoque (negativas na venda, positivas no estorno)
+    com um único UPDATE por tabela, usando F() para não depender de valores lidos.
+    """
+    deltas_lote = {pk: delta for pk, delta in deltas_lote.items() if delta}
+    deltas_produto = {pk: delta for pk, delta in deltas_produto.items() if delta}
+
+    if deltas_lote:
+        Lote.objects.filter(id__in=deltas_lote).update(
+            quantidade=F('quantidade') + Case(
+                *[When(id=pk, then=Value(delta)) for pk, delta in deltas_lote.items()],
+                default=Value(0),
+            )
+        )
+        # O UPDATE em massa não dispara sinais: descarta os dados em cache desses
+        # lotes quando a transação for confirmada.
+        lote_ids = list(deltas_lote)
+        transaction.on_commit(lambda: cache_scan.invalidar_ids(lote_ids))
+        incrementar_versao_lotes()
+        # Novas quantidades para o stream de estoque dos terminais (visíveis no commit).
+        registrar_eventos_estoque(dict(Lote.objects.filter(id__in=lote_ids).values_list('id', 'quantidade')))
+    if deltas_produto:
+        Produto.objects.filter(id__in=deltas_produto).update(
+            estoque=F('estoque') + Case(
+                *[When(id=pk, then=Value(Decimal(delta))) for pk, delta in deltas_produto.items()],
+                default=Value(Decimal('0.00')),
+            )
+        )
+
+
+def _quantidade_por_lote(itens):
+    quantidade_por_lote = defaultdict(int)
+    for lote_id, quantidade, _ in itens:
+        quantidade_por_lote[lote_id] += quantidade
+    return quantidade_por_lote
+
+
+def _subtotal(preco, quantidade):
+    return centavos(preco * quantidade)
+
+
+def _total(itens):
+    return sum((_subtotal(preco, quantidade) for _, quantidade, preco in itens), Decimal('0.00'))
+
+
+def _itens_da_venda(venda, itens, lotes):
+    return [
+        ItemVenda(
+            venda=venda,
+            lote_id=lote_id,
+            produto_id=lotes[lote_id].produto_id,
+            quantidade=quantidade,
+            preco_unitario_vendido=preco,
+            subtotal=_subtotal(preco, quantidade),
+        )
+        for lote_id, quantidade, preco in itens
+    ]
+
+
+def _baixar_estoque(quantidade_por_lote, lotes):
+    quantidade_por_produto = defaultdict(int)
+    for lote_id, quantidade in quantidade_por_lote.items():
+        quantidade_por_produto[lotes[lote_id].produto_id] += quantidade
+
+    aplicar_delta_estoque(
+        {lote_id: -quantidade for lote_id, quantidade in quantidade_por_lote.items()},
+        {produto_id: -quantidade for produto_id, quantidade in quantidade_por_produto.items()},
+    )
+
+
+def finalizar_venda(itens_venda, pagamentos=None, forma_pagamento=None, **campos_venda):
+    """
+    Motor de checkout do PDV: trava os lotes de uma vez, valida o estoque em
+    memória, insere os itens com bulk_create e baixa o estoque de lotes e
+    produtos com um UPDATE cada. O total da venda é calculado uma única vez
+    e os resumos diários são atualizados na mesma transação.
+
+    Uma 'sessao_id' em campos_venda liga a venda à sessão de caixa, se ela
+    ainda estiver aberta, e soma a venda aos totais da sessão.
+
+    O pagamento pode ser dividido entre várias formas ('pagamentos', ver
+    normalizar_pagamentos); os resumos por forma de pagamento também são
+    atualizados na transação.
+
+    Deve ser chamada dentro de transaction.atomic(). Levanta ValueError para
+    dados inválidos ou estoque insuficiente e Lote.DoesNotExist para lotes
+    inexistentes.
+    """
+    itens = normalizar_itens(itens_venda)
+    if not itens:
+        raise ValueError('Nenhum item na venda para finalizar.')
+    total = _total(itens)
+    pagamentos = normalizar_pagamentos(pagamentos, total, forma_pagamento)
+
+    lotes = bloquear_lotes([lote_id for lote_id, _, _ in itens])
+
+    quantidade_por_lote = _quantidade_por_lote(itens)
+    for lote_id, quantidade in quantidade_por_lote.items():
+        lote = lotes[lote_id]
+        if lote.quantidade < quantidade:
+            raise ValueError(f"Estoque insuficiente para o lote '{lote.codigo}'. Disponível: {lote.quantidade}, Solicitado: {quantidade}.")
+
+    # Verificada já dentro da transação de escrita: a sessão não fecha no meio da venda.
+    campos_venda['sessao_id'] = sessao_aberta_id(campos_venda.get('sessao_id'))
+    venda = Venda.objects.create(status='finalizada', total_venda=total, **campos_venda)
+    itens_criados = ItemVenda.objects.bulk_create(_itens_da_venda(venda, itens, lotes))
+    PagamentoVenda.objects.bulk_create(_pagamentos_da_venda(venda, pagamentos))
+    registrar_venda(venda, itens_criados)
+    registrar_pagamentos([(venda, pagamentos)])
+    registrar_vendas_sessao([venda], dinheiro=_dinheiro([(venda, pagamentos)]))
+
+    _baixar_estoque(quantidade_por_lote, lotes)
+    return venda
+
+
+def _devolver_estoque(venda):
+    """
+    Devolve ao estoque os itens de uma venda finalizada e os retira, com os
+    pagamentos, dos resumos e da sessão: lê os itens uma vez e aplica um
+    UPDATE por tabela.
+    """
+    itens = list(
+        ItemVenda.objects.filter(venda_id=venda.id).values_list('lote_id', 'produto_id', 'quantidade', 'subtotal')
+    )
+    deltas_lote = defaultdict(int)
+    deltas_produto = defaultdict(int)
+    for lote_id, produto_id, quantidade, _ in itens:
+        deltas_lote[lote_id] += quantidade
+        deltas_produto[produto_id] += quantidade
+    aplicar_delta_estoque(deltas_lote, deltas_produto)
+    estornar_venda(venda, [(produto_id, quantidade, subtotal) for _, produto_id, quantidade, subtotal in itens])
+    pagamentos = list(PagamentoVenda.objects.filter(venda_id=venda.id).values_list('forma', 'valor'))
+    estornar_pagamentos(venda, pagamentos)
+    registrar_vendas_sessao([venda], sinal=-1, dinheiro=_dinheiro([(venda, pagamentos)]))
+
+
+def cancelar_venda(venda_id):
+    """
+    Cancela uma venda sem apagá-la: devolve o estoque (um UPDATE por tabela),
+    retira a venda dos resumos e muda apenas o status. Itens e histórico
+    continuam no banco; saldo e relatórios consideram só vendas finalizadas.
+    Os termos em PDF da venda saem do cache no commit.
+
+    Deve ser chamada dentro de transaction.atomic(). Levanta Venda.DoesNotExist
+    e ValueError se a venda já estiver cancelada.
+    """
+    venda = Venda.objects.select_for_update().get(id=venda_id)
+    if venda.status != 'finalizada':
+        raise ValueError(f'A venda #{venda.id} já está cancelada.')
+
+    _devolver_estoque(venda)
+    Venda.objects.filter(id=venda.id).update(status='cancelada')
+    venda.status = 'cancelada'
+    # Fechamentos que já contavam a venda: corrige totais e saldos no lugar.
+    aplicar_delta_fechamentos(venda.data_venda, vendas=-venda.total_venda)
+    transaction.on_commit(lambda: apagar_termos_em_cache(venda.id))
+    return venda
+
+
+def apagar_venda(venda_id):
+    """
+    Apaga uma venda devolvendo o estoque (se ainda não foi devolvido por um
+    cancelamento) com um UPDATE por tabela. Na exclusão dos itens o recálculo
+    do total da venda é descartado, pois a venda também está sendo apagada.
+    O número de consultas não depende do número de itens. Os termos em PDF
+    da venda saem do cache no commit.
+
+    Deve ser chamada dentro de transaction.atomic(). Levanta Venda.DoesNotExist.
+    """
+    venda = Venda.objects.select_for_update().get(id=venda_id)
+    if venda.status == 'finalizada':
+        _devolver_estoque(venda)
+
+    with suspender_totais_venda(aplicar=False):
+        venda.delete()
+    transaction.on_commit(lambda: apagar_termos_em_cache(venda_id))
+    return venda
+
+
+def normalizar_data_venda(valor, agora):
+    """
+    Hora em que o terminal fez a venda (ISO 8601), para vendas enviadas depois
+    de um período sem conexão. Sem valor, vale 'agora'; horários no futuro
+    (relógio do terminal adiantado) são limitados a 'agora'.
+    """
+    if valor in (None, ''):
+        return agora
+    try:
+        data_venda = parse_datetime(str(valor))
+    except ValueError:
+        data_venda = None
+    if data_venda is None:
+        raise ValueError("Data da venda inválida. Use o formato ISO 8601 (AAAA-MM-DDTHH:MM:SS).")
+    if timezone.is_naive(data_venda):
+        data_venda = timezone.make_aware(data_venda)
+    return min(data_venda, agora)
+
+
+def _resultado(chave, success, message, venda_id=None, duplicada=False):
+    return {'chave_idempotencia': chave, 'success': success, 'venda_id': venda_id, 'duplicada': duplicada, 'message': message}
+
+
+def finalizar_vendas_em_lote(vendas_dados, sessao_id=None):
+    """
+    Grava de uma vez várias vendas enfileiradas por um terminal (por exemplo,
+    depois de ficar sem conexão). Cada venda traz 'chave_idempotencia',
+    'itens' e, opcionalmente, 'pagamentos' ou 'forma_pagamento' e a
+    'data_venda' em que foi feita no terminal (ver normalizar_data_venda); uma
+    chave já gravada não gera outra venda, apenas devolve a venda existente.
+
+    Todas as vendas válidas são gravadas com um bulk_create de vendas, um de
+    itens, um de pagamentos e uma baixa de estoque por tabela; as inválidas
+    (dados, pagamento, lote inexistente ou estoque insuficiente, na ordem
+    recebida) são apenas reportadas. Devolve um resultado por venda, na ordem recebida.
+
+    As vendas gravadas entram na sessão de caixa 'sessao_id', se estiver aberta.
+    Os resumos diários usam a data da venda, e as vendas anteriores ao último
+    fechamento de caixa são somadas aos fechamentos já gravados.
+
+    Deve ser chamada dentro de transaction.atomic().
+    """
+    agora = timezone.now()
+    resultados = [None] * len(vendas_dados)
+    pendentes = []
+    for posicao, dados in enumerate(vendas_dados):
+        chave = str(dados.get('chave_idempotencia') or '').strip() if isinstance(dados, dict) else ''
+        if not chave or len(chave) > 64:
+            resultados[posicao] = _resultado(chave or None, False, 'Chave de idempotência ausente ou inválida.')
+            continue
+        try:
+            itens = normalizar_itens(dados.get('itens') or [])
+        except ValueError as e:
+            resultados[posicao] = _resultado(chave, False, str(e))
+            continue
+        if not itens:
+            resultados[posicao] = _resultado(chave, False, 'Nenhum item na venda para finalizar.')
+            continue
+        try:
+            pagamentos = normalizar_pagamentos(dados.get('pagamentos'), _total(itens), dados.get('forma_pagamento'))
+            data_venda = normalizar_data_venda(dados.get('data_venda'), agora)
+        except ValueError as e:
+            resultados[posicao] = _resultado(chave, False, str(e))
+            continue
+        pendentes.append((posicao, chave, itens, pagamentos, data_venda))
+
+    existentes = dict(
+        Venda.objects.filter(chave_idempotencia__in=[chave for _, chave, _, _, _ in pendentes])
+        .values_list('chave_idempotencia', 'id')
+    )
+    lotes = {
+        lote.id: lote
+        for lote in Lote.objects.select_for_update()
+        .filter(id__in={lote_id for _, _, itens, _, _ in pendentes for lote_id, _, _ in itens})
+        .only('id', 'codigo', 'quantidade', 'produto_id')
+        .order_by('id')
+    }
+    disponivel = {lote_id: lote.quantidade for lote_id, lote in lotes.items()}
+
+    aceitas = []
+    chaves_aceitas = set()
+    repetidas = []
+    quantidade_total_por_lote = defaultdict(int)
+    for posicao, chave, itens, pagamentos, data_venda in pendentes:
+        if chave in existentes:
+            resultados[posicao] = _resultado(chave, True, 'Venda já registrada.', existentes[chave], duplicada=True)
+            continue
+        if chave in chaves_aceitas:
+            # A mesma venda reenviada dentro da remessa.
+            repetidas.append((posicao, chave))
+            continue
+
+        quantidade_por_lote = _quantidade_por_lote(itens)
+        if any(lote_id not in lotes for lote_id in quantidade_por_lote):
+            resultados[posicao] = _resultado(chave, False, 'Um dos lotes da venda não foi encontrado.')
+            continue
+        sem_estoque = next((lote_id for lote_id, quantidade in quantidade_por_lote.items() if disponivel[lote_id] < quantidade), None)
+        if sem_estoque is not None:
+            resultados[posicao] = _resultado(
+                chave, False,
+                f"Estoque insuficiente para o lote '{lotes[sem_estoque].codigo}'. Disponível: {disponivel[sem_estoque]}, Solicitado: {quantidade_por_lote[sem_estoque]}.",
+            )
+            continue
+
+        for lote_id, quantidade in quantidade_por_lote.items():
+            disponivel[lote_id] -= quantidade
+            quantidade_total_por_lote[lote_id] += quantidade
+        aceitas.append((posicao, Venda(status='finalizada', total_venda=_total(itens), chave_idempotencia=chave, data_venda=data_venda), itens, pagamentos))
+        chaves_aceitas.add(chave)
+
+    if aceitas:
+        sessao_id = sessao_aberta_id(sessao_id)
+        for _, venda, _, _ in aceitas:
+            venda.sessao_id = sessao_id
+        Venda.objects.bulk_create([venda for _, venda, _, _ in aceitas])
+        itens_criados = ItemVenda.objects.bulk_create([
+            item for _, venda, itens, _ in aceitas for item in _itens_da_venda(venda, itens, lotes)
+        ])
+        PagamentoVenda.objects.bulk_create([
+            pagamento for _, venda, _, pagamentos in aceitas for pagamento in _pagamentos_da_venda(venda, pagamentos)
+        ])
+        itens_por_venda = defaultdict(list)
+        for item in itens_criados:
+            itens_por_venda[item.venda_id].append(item)
+        vendas_pagamentos = [(venda, pagamentos) for _, venda, _, pagamentos in aceitas]
+        registrar_vendas([(venda, itens_por_venda[venda.id]) for _, venda, _, _ in aceitas])
+        registrar_pagamentos(vendas_pagamentos)
+        registrar_vendas_sessao([venda for venda, _ in vendas_pagamentos], dinheiro=_dinheiro(vendas_pagamentos))
+        _baixar_estoque(quantidade_total_por_lote, lotes)
+        fechamento = ultimo_fechamento()
+        if fechamento is not None:
+            for _, venda, _, _ in aceitas:
+                if venda.data_venda < fechamento.periodo_fim:
+                    aplicar_delta_fechamentos(venda.data_venda, vendas=venda.total_venda)
+
+    ids_aceitas = {venda.chave_idempotencia: venda.id for _, venda, _, _ in aceitas}
+    for posicao, venda, _, _ in aceitas:
+        resultados[posicao] = _resultado(venda.chave_idempotencia, True, 'Venda finalizada com sucesso!', venda.id)
+    for posicao, chave in repetidas:
+        resultados[posicao] = _resultado(chave, True, 'Venda já registrada.', ids_aceitas[chave], duplicada=True)
+    return resultados
@@ -0,0 +1,187 @@
+# caixa_pdv/sessoes.py
+"""
+Sessões de caixa por terminal.
+
+Os totais da sessão (quantidade e valor das vendas, parte recebida em
+dinheiro, entradas e retiradas) são
+atualizados com UPDATEs F() na mesma transação de cada venda, cancelamento ou
+movimento. Só sessões abertas mudam: uma sessão fechada guarda os números da
+sua conferência. Fechar é ler a linha da sessão e gravar o valor contado.
+"""
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import MovimentoCaixa, PagamentoVenda, SessaoCaixa, Venda
+
+ZERO = Decimal('0.00')
+
+
+def valor_decimal(valor, campo='valor'):
+    """Converte o valor digitado (aceita vírgula). Levanta ValueError se inválido ou negativo."""
+    try:
+        numero = Decimal(str(valor).strip().replace(',', '.'))
+    except (InvalidOperation, AttributeError):
+        raise ValueError(f"O {campo} informado é inválido.")
+    if not numero.is_finite() or numero < 0:
+        raise ValueError(f"O {campo} informado é inválido.")
+    return numero.quantize(Decimal('0.01'))
+
+
+def sessao_aberta_id(sessao_id):
+    """Devolve sessao_id se a sessão existir e estiver aberta; senão None."""
+    if not sessao_id:
+        return None
+    return SessaoCaixa.objects.filter(id=sessao_id, fechada_em__isnull=True).values_list('id', flat=True).first()
+
+
+def abrir_sessao(terminal, valor_abertura, operador=None):
+    """
+    Abre uma sessão no terminal. Levanta ValueError se os dados forem
+    inválidos ou se o terminal já tiver uma sessão aberta.
+    """
+    terminal = (terminal or '').strip()[:50]
+    if not terminal:
+        raise ValueError('Informe o nome do terminal.')
+    valor_abertura = valor_decimal(valor_abertura, 'troco inicial')
+    try:
+        with transaction.atomic():
+            return SessaoCaixa.objects.create(terminal=terminal, valor_abertura=valor_abertura, operador=operador)
+    except IntegrityError:
+        raise ValueError(f"O terminal '{terminal}' já tem uma sessão de caixa aberta.")
+
+
+def aplicar_delta_sessoes(deltas_vendas=None, deltas_movimentos=None):
+    """
+    Soma variações aos totais das sessões abertas com um UPDATE.
+    deltas_vendas: {sessao_id: (quantidade, valor, valor_em_dinheiro)};
+    deltas_movimentos: {sessao_id: (entradas, retiradas)}.
+    """
+    deltas_vendas = {pk: delta for pk, delta in (deltas_vendas or {}).items() if pk and any(delta)}
+    deltas_movimentos = {pk: delta for pk, delta in (deltas_movimentos or {}).items() if pk and any(delta)}
+    ids = set(deltas_vendas) | set(deltas_movimentos)
+    if not ids:
+        return
+
+    def soma(campo, deltas, posicao, zero):
+        return F(campo) + Case(
+            *[When(id=pk, then=Value(delta[posicao])) for pk, delta in deltas.items()],
+            default=Value(zero),
+        )
+
+    campos = {}
+    if deltas_vendas:
+        campos['quantidade_vendas'] = soma('quantidade_vendas', deltas_vendas, 0, 0)
+        campos['total_vendas'] = soma('total_vendas', deltas_vendas, 1, ZERO)
+        campos['total_dinheiro'] = soma('total_dinheiro', deltas_vendas, 2, ZERO)
+    if deltas_movimentos:
+        campos['total_entradas'] = soma('total_entradas', deltas_movimentos, 0, ZERO)
+        campos['total_retiradas'] = soma('total_retiradas', deltas_movimentos, 1, ZERO)
+    SessaoCaixa.objects.filter(id__in=ids, fechada_em__isnull=True).update(**campos)
+
+
+def registrar_vendas_sessao(vendas, sinal=1, dinheiro=None):
+    """
+    Conta as vendas (sinal=1) ou as retira (sinal=-1) dos totais das suas
+    sessões. 'dinheiro' é {venda_id: valor pago em dinheiro}; sem ele, os
+    pagamentos são lidos do banco.
+    """
+    vendas = [venda for venda in vendas if venda.sessao_id]
+    if not vendas:
+        return
+    if dinheiro is None:
+        dinheiro = dict(
+            PagamentoVenda.objects.filter(venda_id__in=[venda.id for venda in vendas], forma='dinheiro')
+            .order_by().values('venda_id').annotate(total=Sum('valor')).values_list('venda_id', 'total')
+        )
+    deltas = defaultdict(lambda: (0, ZERO, ZERO))
+    for venda in vendas:
+        quantidade, valor, em_dinheiro = deltas[venda.sessao_id]
+        deltas[venda.sessao_id] = (
+            quantidade + sinal,
+            valor + sinal * venda.total_venda,
+            em_dinheiro + sinal * dinheiro.get(venda.id, ZERO),
+        )
+    aplicar_delta_sessoes(deltas_vendas=deltas)
+
+
+def _delta_movimento(tipo, valor, sinal):
+    valor = Decimal(str(valor or 0)) * sinal
+    return (valor, ZERO) if tipo == 'entrada' else (ZERO, valor)
+
+
+@transaction.atomic
+def fechar_sessao(sessao_id, valor_contado, observacoes=''):
+    """
+    Fecha a sessão gravando o valor contado e a diferença para o saldo
+    esperado. Levanta SessaoCaixa.DoesNotExist e ValueError (valor inválido
+    ou sessão já fechada).
+    """
+    valor_contado = valor_decimal(valor_contado, 'valor contado')
+    sessao = SessaoCaixa.objects.select_for_update().get(id=sessao_id)
+    if not sessao.aberta:
+        raise ValueError(f'A sessão #{sessao.id} já foi fechada.')
+
+    sessao.fechada_em = timezone.now()
+    sessao.valor_contado = valor_contado
+    sessao.diferenca = valor_contado - sessao.saldo_esperado
+    sessao.observacoes = observacoes or ''
+    sessao.save(update_fields=['fechada_em', 'valor_contado', 'diferenca', 'observacoes'])
+    return sessao
+
+
+@transaction.atomic
+def recalcular_sessao(sessao_id):
+    """
+    Caminho de reparo: refaz os totais da sessão a partir das vendas
+    finalizadas e dos movimentos ligados a ela.
+    """
+    vendas = Venda.objects.filter(sessao_id=sessao_id, status='finalizada').aggregate(
+        quantidade=Count('id'), total=Sum('total_venda'),
+    )
+    dinheiro = PagamentoVenda.objects.filter(
+        venda__sessao_id=sessao_id, venda__status='finalizada', forma='dinheiro',
+    ).aggregate(total=Sum('valor'))
+    movimentos = MovimentoCaixa.objects.filter(sessao_id=sessao_id).aggregate(
+        entradas=Sum('valor', filter=Q(tipo='entrada')),
+        retiradas=Sum('valor', filter=Q(tipo='retirada')),
+    )
+    SessaoCaixa.objects.filter(id=sessao_id).update(
+        quantidade_vendas=vendas['quantidade'],
+        total_vendas=vendas['total'] or ZERO,
+        total_dinheiro=dinheiro['total'] or ZERO,
+        total_entradas=movimentos['entradas'] or ZERO,
+        total_retiradas=movimentos['retiradas'] or ZERO,
+    )
+    return SessaoCaixa.objects.get(id=sessao_id)
+
+
+@receiver(post_save, sender=MovimentoCaixa)
+def movimento_salvo_sessao(sender, instance, created, **kwargs):
+    deltas = defaultdict(lambda: (ZERO, ZERO))
+
+    def somar(sessao_id, delta):
+        if sessao_id:
+            entradas, retiradas = deltas[sessao_id]
+            deltas[sessao_id] = (entradas + delta[0], retiradas + delta[1])
+
+    original = None if created else getattr(instance, '_original', None)
+    if original is not None:
+        sessao_id, tipo, valor, _ = original
+        somar(sessao_id, _delta_movimento(tipo, valor, -1))
+    elif not created:
+        # Sem o estado lido do banco não há como calcular a diferença.
+        return
+    somar(instance.sessao_id, _delta_movimento(instance.tipo, instance.valor, 1))
+    aplicar_delta_sessoes(deltas_movimentos=deltas)
+
+
+@receiver(post_delete, sender=MovimentoCaixa)
+def movimento_apagado_sessao(sender, instance, **kwargs):
+    if instance.sessao_id:
+        aplicar_delta_sessoes(deltas_movimentos={instance.sessao_id: _delta_movimento(instance.tipo, instance.valor, -1)})
@@ -0,0 +1,232 @@
+# caixa_pdv/tarefas.py
+"""
+Fila de geração de documentos no banco (TarefaDocumento).
+
+As views só registram o pedido; o comando 'processar_tarefas' roda um ou mais
+workers que pegam as tarefas pendentes, geram o arquivo em disco e publicam
+o progresso na própria tarefa, consultado pela API de status.
+"""
+import datetime
+import os
+import tempfile
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+from lotes.etiqueta_pdf import renderizar_etiquetas
+from lotes.models import Lote
+from .exportacao import periodo
+from .models import TarefaDocumento
+from .termos import gerar_termos_zip, salvar_termos_pdf, vendas_para_termos
+
+TAREFAS_DIR = getattr(settings, 'PDV_TAREFAS_DIR', os.path.join(settings.BASE_DIR, 'cache', 'tarefas'))
+# Tarefa 'executando' há mais tempo que isto (segundos) é considerada abandonada e volta à fila.
+TAREFAS_TIMEOUT = getattr(settings, 'PDV_TAREFAS_TIMEOUT', 30 * 60)
+# Tarefas terminadas (e seus arquivos) são apagadas depois deste tempo (segundos).
+TAREFAS_RETENCAO = getattr(settings, 'PDV_TAREFAS_RETENCAO', 24 * 60 * 60)
+# Intervalo mínimo (segundos) entre gravações do progresso no banco.
+INTERVALO_PROGRESSO = 1.0
+
+NOMES_ARQUIVO = {
+    ('termos', 'pdf'): 'termos_conformidade.pdf',
+    ('termos', 'zip'): 'termos_conformidade.zip',
+    ('etiquetas', 'pdf'): 'etiquetas_lotes.pdf',
+}
+
+
+def _lista_de_ids(valor, campo):
+    if valor in (None, ''):
+        return None
+    if isinstance(valor, str):
+        valor = [parte for parte in valor.split(',') if parte.strip()]
+    if not isinstance(valor, list):
+        raise ValueError(f"O campo '{campo}' deve ser uma lista de ids.")
+    try:
+        return [int(item) for item in valor]
+    except (TypeError, ValueError):
+        raise ValueError(f"O campo '{campo}' deve conter apenas ids numéricos.")
+
+
+def _data(valor):
+    if not valor:
+        return None
+    try:
+        datetime.datetime.strptime(valor, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise ValueError('Formato de data inválido. Use YYYY-MM-DD.')
+    return valor
+
+
+def validar_parametros(tipo, parametros):
+    """
+    Confere e normaliza os parâmetros de uma tarefa. Levanta ValueError.
+    """
+    if not isinstance(parametros, dict):
+        raise ValueError("Os parâmetros da tarefa devem ser um objeto.")
+
+    if tipo == 'termos':
+        formato = parametros.get('formato', 'pdf')
+        if formato not in ('pdf', 'zip'):
+            raise ValueError("Formato inválido. Use 'pdf' ou 'zip'.")
+        normalizados = {
+            'formato': formato,
+            'ids': _lista_de_ids(parametros.get('ids'), 'ids'),
+            'start_date': _data(parametros.get('start_date')),
+            'end_date': _data(parametros.get('end_date')),
+        }
+        if not (normalizados['ids'] or normalizados['start_date'] or normalizados['end_date']):
+            raise ValueError('Informe um período ou uma lista de vendas.')
+        return normalizados
+
+    if tipo == 'etiquetas':
+        lote_ids = _lista_de_ids(parametros.get('lote_ids'), 'lote_ids')
+        if not lote_ids:
+            raise ValueError('Informe os lotes das etiquetas.')
+        return {'formato': 'pdf', 'lote_ids': lote_ids}
+
+    raise ValueError("Tipo de tarefa inválido. Use 'termos' ou 'etiquetas'.")
+
+
+def criar_tarefa(tipo, parametros):
+    return TarefaDocumento.objects.create(tipo=tipo, parametros=validar_parametros(tipo, parametros))
+
+
+def nome_arquivo(tarefa):
+    return NOMES_ARQUIVO[(tarefa.tipo, tarefa.parametros.get('formato', 'pdf'))]
+
+
+# --- Execução ---
+
+class _Progresso:
+    """Grava o progresso da tarefa no banco, no máximo uma vez por INTERVALO_PROGRESSO."""
+
+    def __init__(self, tarefa):
+        self.tarefa = tarefa
+        self.ultima_gravacao = 0.0
+
+    def __call__(self, feitos):
+        agora = time.monotonic()
+        if agora - self.ultima_gravacao >= INTERVALO_PROGRESSO:
+            TarefaDocumento.objects.filter(id=self.tarefa.id).update(progresso=feitos)
+            self.ultima_gravacao = agora
+
+
+def _definir_total(tarefa, total):
+    tarefa.total = total
+    TarefaDocumento.objects.filter(id=tarefa.id).update(total=total)
+
+
+def _executar_termos(tarefa, arquivo, ao_avancar):
+    parametros = tarefa.parametros
+    datas = [
+        datetime.datetime.strptime(parametros[campo], '%Y-%m-%d').date() if parametros.get(campo) else None
+        for campo in ('start_date', 'end_date')
+    ]
+    vendas = vendas_para_termos(parametros.get('ids'), *periodo(*datas))
+    _definir_total(tarefa, vendas.count())
+
+    if parametros['formato'] == 'zip':
+        for pedaco in gerar_termos_zip(vendas, ao_avancar):
+            arquivo.write(pedaco)
+    else:
+        salvar_termos_pdf(vendas, arquivo, ao_avancar)
+
+
+def _executar_etiquetas(tarefa, arquivo, ao_avancar):
+    lote_ids = tarefa.parametros['lote_ids']
+    lotes = Lote.objects.select_related('produto').in_bulk(lote_ids)
+    _definir_total(tarefa, len(lotes))
+
+    def lotes_em_ordem():
+        # Na ordem pedida, para a impressão sair na sequência escolhida.
+        for feitos, lote in enumerate((lotes[pk] for pk in lote_ids if pk in lotes), start=1):
+            yield lote
+            ao_avancar(feitos)
+
+    renderizar_etiquetas(lotes_em_ordem(), arquivo)
+
+
+EXECUTORES = {
+    'termos': _executar_termos,
+    'etiquetas': _executar_etiquetas,
+}
+
+
+def executar_tarefa(tarefa):
+    """Gera o arquivo de uma tarefa já marcada como 'executando'."""
+    os.makedirs(TAREFAS_DIR, exist_ok=True)
+    caminho = os.path.join(TAREFAS_DIR, f"tarefa_{tarefa.id}_{nome_arquivo(tarefa)}")
+    descritor, temporario = tempfile.mkstemp(dir=TAREFAS_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            EXECUTORES[tarefa.tipo](tarefa, arquivo, _Progresso(tarefa))
+        os.replace(temporario, caminho)
+    except Exception as e:
+        os.unlink(temporario)
+        TarefaDocumento.objects.filter(id=tarefa.id).update(
+            status='erro', mensagem=str(e), concluida_em=timezone.now()
+        )
+        return False
+
+    TarefaDocumento.objects.filter(id=tarefa.id).update(
+        status='concluida', arquivo=caminho, progresso=tarefa.total, concluida_em=timezone.now()
+    )
+    return True
+
+
+def pegar_proxima_tarefa():
+    """
+    Reserva a tarefa pendente mais antiga para este worker. A reserva é um
+    UPDATE condicionado ao status, então dois workers nunca pegam a mesma tarefa.
+    """
+    while True:
+        tarefa = TarefaDocumento.objects.filter(status='pendente').order_by('id').first()
+        if tarefa is None:
+            return None
+        agora = timezone.now()
+        if TarefaDocumento.objects.filter(id=tarefa.id, status='pendente').update(status='executando', iniciada_em=agora):
+            tarefa.status, tarefa.iniciada_em = 'executando', agora
+            return tarefa
+
+
+def reabrir_tarefas_abandonadas():
+    """Devolve à fila as tarefas de workers que morreram no meio da execução."""
+    limite = timezone.now() - datetime.timedelta(seconds=TAREFAS_TIMEOUT)
+    return TarefaDocumento.objects.filter(status='executando', iniciada_em__lt=limite).update(
+        status='pendente', progresso=0, iniciada_em=None
+    )
+
+
+def limpar_tarefas_antigas():
+    """Apaga as tarefas terminadas há mais de TAREFAS_RETENCAO segundos e seus arquivos."""
+    limite = timezone.now() - datetime.timedelta(seconds=TAREFAS_RETENCAO)
+    antigas = TarefaDocumento.objects.filter(status__in=['concluida', 'erro'], concluida_em__lt=limite)
+    for caminho in antigas.exclude(arquivo='').values_list('arquivo', flat=True):
+        try:
+            os.unlink(caminho)
+        except OSError:
+            pass
+    return antigas.delete()[0]
+
+
+def processar_pendentes():
+    """Executa as tarefas pendentes até a fila esvaziar. Devolve quantas foram executadas."""
+    executadas = 0
+    while True:
+        tarefa = pegar_proxima_tarefa()
+        if tarefa is None:
+            return executadas
+        executar_tarefa(tarefa)
+        executadas += 1
+
+
+def rodar_worker(intervalo=2.0):
+    """Laço de um worker: processa a fila e espera 'intervalo' segundos quando ela está vazia."""
+    while True:
+        close_old_connections()
+        reabrir_tarefas_abandonadas()
+        limpar_tarefas_antigas()
+        if not processar_pendentes():
+            time.sleep(intervalo)
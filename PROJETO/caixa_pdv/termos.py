@@ -0,0 +1,271 @@
+# caixa_pdv/termos.py
+"""
+Geração do Termo de Conformidade em PDF.
+
+Estilos, estilo da tabela e o cabeçalho fixo (dados do viveiro) são montados
+uma vez por processo. Os PDFs prontos ficam em cache no disco, com nome
+formado pelo id da venda e um hash do conteúdo: enquanto a venda não muda,
+baixar o termo de novo é só ler o arquivo. O cancelamento e a exclusão da
+venda apagam os PDFs dela (apagar_termos_em_cache).
+"""
+import copy
+import glob
+import hashlib
+import json
+import os
+import tempfile
+import zipfile
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import Prefetch
+from django.utils import timezone
+from pypdf import PdfWriter
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import cm
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
+
+from .models import Venda, ItemVenda
+
+TERMOS_CACHE_DIR = getattr(settings, 'PDV_TERMOS_CACHE_DIR', os.path.join(settings.BASE_DIR, 'cache', 'termos'))
+# Vendas carregadas por bloco na geração em lote: a consulta das vendas é lida
+# em blocos e cada bloco faz mais duas (itens com produto e lote, pagamentos).
+TERMOS_LOTE_CHUNK_SIZE = getattr(settings, 'PDV_TERMOS_LOTE_CHUNK_SIZE', 1000)
+
+# Mude ao alterar o layout, para que os PDFs em cache sejam refeitos.
+VERSAO_LAYOUT = 1
+
+COLUNAS_TABELA = [1*cm, 5*cm, 2.5*cm, 2.5*cm, 3*cm, 3*cm]
+
+TEXTO_TERMO = """
+<br/><b>Termo de Conformidade</b><br/><br/>
+Declaro, para os devidos fins, que os produtos listados acima foram inspecionados no ato da compra e se encontram em plenas condições de sanidade e vigor, de acordo com as informações fornecidas e as normas de qualidade do Viveiro Lagni. O cliente é responsável por seguir as instruções de plantio e cuidado para garantir o desenvolvimento saudável das plantas.
+<br/><br/><br/><br/>
+__________________________________<br/>
+Assinatura do Cliente
+<br/><br/><br/>
+__________________________________<br/>
+Assinatura do Responsável Viveiro Lagni
+"""
+
+
+@lru_cache(maxsize=None)
+def estilos():
+    styles = getSampleStyleSheet()
+    styles.add(ParagraphStyle(name='TitleStyle', fontSize=18, leading=22, alignment=1, fontName='Helvetica', spaceAfter=6))
+    styles.add(ParagraphStyle(name='HeaderInfo', fontSize=10, leading=12, alignment=1, fontName='Helvetica', spaceAfter=0))
+    styles.add(ParagraphStyle(name='SubTitleStyle', fontSize=14, leading=18, alignment=1, fontName='Helvetica', spaceAfter=12))
+    styles.add(ParagraphStyle(name='BodyTextCustom', fontSize=12, leading=14, fontName='Helvetica', spaceAfter=6))
+    styles.add(ParagraphStyle(name='TableHeading', fontSize=10, leading=12, fontName='Helvetica-Bold', alignment=1))
+    styles.add(ParagraphStyle(name='TableCell', fontSize=10, leading=12, fontName='Helvetica', alignment=0))
+    return styles
+
+
+@lru_cache(maxsize=None)
+def estilo_tabela():
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6D4C41')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#E0E0D4')),
+        ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#E0E0D4')),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F8F4E3')),
+    ])
+
+
+@lru_cache(maxsize=None)
+def _cabecalho():
+    styles = estilos()
+    return (
+        Paragraph("Viveiro Lagni", styles['TitleStyle']),
+        Paragraph("Rua Santa Rita, nº 595 - Centro", styles['HeaderInfo']),
+        Paragraph("Chapecó - SC, CEP 89801-081", styles['HeaderInfo']),
+        Paragraph("Fone: (49) 3328-5690 / (49) 99990-2550", styles['HeaderInfo']),
+        Paragraph("E-mail: viveiro@lagnimudas.com.br", styles['HeaderInfo']),
+        Spacer(1, 0.5*cm),
+        Paragraph("Termo de Conformidade de Produtos", styles['SubTitleStyle']),
+        Spacer(1, 0.5*cm),
+    )
+
+
+def cabecalho():
+    """
+    Cópias rasas do cabeçalho fixo: o texto já interpretado é compartilhado,
+    mas o estado do layout (wrap/split) fica em cada cópia.
+    """
+    return [copy.copy(flowable) for flowable in _cabecalho()]
+
+
+def dados_termo(venda, itens):
+    """Tudo o que aparece no termo de uma venda; base do hash do cache."""
+    forma_pagamento = getattr(venda, 'forma_pagamento', None)
+    return {
+        'layout': VERSAO_LAYOUT,
+        'venda_id': venda.id,
+        'data_venda': timezone.localtime(venda.data_venda).strftime('%d/%m/%Y'),
+        'total_venda': str(venda.total_venda),
+        'forma_pagamento': str(forma_pagamento) if forma_pagamento else 'Não informada',
+        'observacoes': venda.observacoes or '',
+        'itens': [
+            [
+                str(item.id),
+                item.produto.variedade if item.produto else 'N/A',
+                item.lote.codigo if item.lote else 'N/A',
+                f"{item.quantidade}",
+                f"R$ {item.preco_unitario_vendido}",
+                f"R$ {item.subtotal}",
+            ]
+            for item in itens
+        ],
+    }
+
+
+def hash_termo(dados):
+    return hashlib.sha256(json.dumps(dados, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def historia_termo(dados):
+    """Lista de flowables do termo de uma venda."""
+    styles = estilos()
+    story = cabecalho()
+
+    venda_info = "<b>Cliente:</b> Cliente não especificado<br/>"
+    venda_info += f"<b>ID da Venda:</b> {dados['venda_id']}<br/>"
+    venda_info += f"<b>Data da Venda:</b> {dados['data_venda']}<br/>"
+    story.append(Paragraph(venda_info, styles['BodyTextCustom']))
+    story.append(Spacer(1, 0.5*cm))
+
+    table = Table([['ID', 'Produto', 'Lote', 'Quantidade', 'Preço Unitário', 'Subtotal']] + dados['itens'], colWidths=COLUNAS_TABELA)
+    table.setStyle(estilo_tabela())
+    story.append(table)
+    story.append(Spacer(1, 0.5*cm))
+
+    story.append(Paragraph(f"<b>Total da Venda:</b> R$ {dados['total_venda']}", styles['BodyTextCustom']))
+    story.append(Paragraph(f"<b>Forma de Pagamento:</b> {dados['forma_pagamento']}", styles['BodyTextCustom']))
+    story.append(Paragraph(f"<b>Observações da Venda:</b> {dados['observacoes'] or 'N/A'}", styles['BodyTextCustom']))
+    story.append(Spacer(1, 1*cm))
+    story.append(Paragraph(TEXTO_TERMO, styles['BodyTextCustom']))
+    return story
+
+
+def renderizar_termo(dados, destino):
+    """Gera o PDF do termo em 'destino' (caminho ou arquivo aberto)."""
+    doc = SimpleDocTemplate(destino, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2.5*cm, bottomMargin=2.5*cm)
+    doc.build(historia_termo(dados))
+
+
+def caminho_termo(venda, itens):
+    """
+    Caminho do PDF do termo no cache do disco, gerando-o se ainda não existir
+    para o conteúdo atual da venda. Versões anteriores da mesma venda são apagadas.
+    """
+    dados = dados_termo(venda, itens)
+    caminho = os.path.join(TERMOS_CACHE_DIR, f"termo_{venda.id}_{hash_termo(dados)[:20]}.pdf")
+    if os.path.exists(caminho):
+        return caminho
+
+    os.makedirs(TERMOS_CACHE_DIR, exist_ok=True)
+    # Grava num temporário e renomeia: outro processo nunca lê um PDF pela metade.
+    descritor, temporario = tempfile.mkstemp(dir=TERMOS_CACHE_DIR, suffix='.tmp')
+    try:
+        with os.fdopen(descritor, 'wb') as arquivo:
+            renderizar_termo(dados, arquivo)
+        os.replace(temporario, caminho)
+    except BaseException:
+        os.unlink(temporario)
+        raise
+
+    apagar_termos_em_cache(venda.id, exceto=caminho)
+    return caminho
+
+
+def apagar_termos_em_cache(venda_id, exceto=None):
+    """Apaga do disco os PDFs em cache da venda (menos 'exceto', se dado)."""
+    for antigo in glob.glob(os.path.join(TERMOS_CACHE_DIR, f"termo_{venda_id}_*.pdf")):
+        if antigo != exceto:
+            try:
+                os.unlink(antigo)
+            except OSError:
+                pass
+
+
+# --- Geração em lote ---
+
+def vendas_para_termos(ids=None, inicio=None, fim=None):
+    """
+    Vendas (com itens, produto e lote) de uma lista de ids e/ou do período
+    [inicio, fim), em ordem cronológica. Por período, só as vendas finalizadas.
+    """
+    vendas = Venda.objects.all()
+    if ids is not None:
+        vendas = vendas.filter(id__in=ids)
+    else:
+        vendas = vendas.filter(status='finalizada')
+    if inicio is not None:
+        vendas = vendas.filter(data_venda__gte=inicio)
+    if fim is not None:
+        vendas = vendas.filter(data_venda__lt=fim)
+    return vendas.order_by('data_venda', 'id').prefetch_related(
+        Prefetch('itens', queryset=ItemVenda.objects.select_related('produto', 'lote').order_by('id')),
+        'pagamentos',
+    )
+
+
+def caminhos_termos(vendas, ao_avancar=None):
+    """
+    Gera (venda, caminho do PDF) para cada venda, usando o cache em disco.
+    As vendas vêm de uma única consulta, lida em blocos de TERMOS_LOTE_CHUNK_SIZE;
+    cada bloco faz mais duas (itens com produto e lote, pagamentos).
+    'ao_avancar', se dado, recebe o número de termos já prontos.
+    """
+    for feitos, venda in enumerate(vendas.iterator(chunk_size=TERMOS_LOTE_CHUNK_SIZE), start=1):
+        yield venda, caminho_termo(venda, venda.itens.all())
+        if ao_avancar:
+            ao_avancar(feitos)
+
+
+def salvar_termos_pdf(vendas, destino, ao_avancar=None):
+    """Junta os termos das vendas num único PDF, gravado em 'destino'."""
+    escritor = PdfWriter()
+    for _, caminho in caminhos_termos(vendas, ao_avancar):
+        escritor.append(caminho)
+    escritor.write(destino)
+    escritor.close()
+
+
+class _Buffer:
+    """Destino do zipfile que acumula os bytes até serem entregues ao cliente."""
+
+    def __init__(self):
+        self.partes = []
+
+    def write(self, dados):
+        self.partes.append(bytes(dados))
+        return len(dados)
+
+    def flush(self):
+        pass
+
+    def esvaziar(self):
+        dados = b''.join(self.partes)
+        self.partes = []
+        return dados
+
+
+def gerar_termos_zip(vendas, ao_avancar=None):
+    """
+    Gera um ZIP com um PDF por venda, em pedaços de bytes: cada termo é
+    enviado assim que entra no arquivo, sem montar o ZIP inteiro na memória.
+    """
+    buffer = _Buffer()
+    with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as arquivo_zip:
+        for venda, caminho in caminhos_termos(vendas, ao_avancar):
+            arquivo_zip.write(caminho, f'termo_conformidade_venda_{venda.id}.pdf')
+            yield buffer.esvaziar()
+    yield buffer.esvaziar()
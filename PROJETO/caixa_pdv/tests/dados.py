@@ -0,0 +1,20 @@
+# caixa_pdv/tests/dados.py
+"""Dados mínimos usados pelos testes do PDV."""
+import datetime
+from decimal import Decimal
+
+from lotes.models import Lote
+from produtos.models import Produto
+
+
+def criar_lote(cod, quantidade=100, preco='10.50', variedade=None, data_semeadura=datetime.date(2025, 1, 1)):
+    """Cria um produto e um lote dele; o Lote.save soma a quantidade ao estoque do produto."""
+    produto = Produto.objects.create(
+        cod=cod, unidade='BDJ', qtd_unid='1UN', tipo='Hortalicas',
+        variedade=variedade or f'Alface {cod}', preco=Decimal(preco), estoque=0,
+    )
+    return Lote.objects.create(produto=produto, data_semeadura=data_semeadura, quantidade=quantidade)
+
+
+def item(lote, quantidade, preco='10.50'):
+    return {'lote_id': lote.id, 'quantidade': quantidade, 'preco_unitario': preco}
@@ -0,0 +1,54 @@
+# caixa_pdv/tests/test_banco.py
+from unittest import mock
+
+from django.db import OperationalError, connection, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+
+from caixa_pdv import banco
+from caixa_pdv.banco import transacao_com_retentativa
+
+
+def inicios(contexto):
+    return [consulta['sql'] for consulta in contexto.captured_queries if consulta['sql'].startswith('BEGIN')]
+
+
+class TransacaoComRetentativaTests(TransactionTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(banco.time, 'sleep')
+        self.sleep = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_so_as_escritas_abrem_com_begin_immediate(self):
+        with CaptureQueriesContext(connection) as contexto:
+            transacao_com_retentativa(lambda: None)()
+        self.assertEqual(inicios(contexto), ['BEGIN IMMEDIATE'])
+        self.assertIsNone(connection.transaction_mode)
+
+        with CaptureQueriesContext(connection) as contexto, transaction.atomic():
+            pass
+        self.assertEqual(inicios(contexto), ['BEGIN'])
+
+    def test_repete_quando_o_banco_esta_travado(self):
+        funcao = mock.Mock(side_effect=[OperationalError('database is locked'), 'ok'])
+        self.assertEqual(transacao_com_retentativa(funcao)(), 'ok')
+        self.assertEqual(funcao.call_count, 2)
+        self.sleep.assert_called_once()
+
+    def test_desiste_depois_das_tentativas(self):
+        funcao = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError):
+            transacao_com_retentativa(tentativas=2)(funcao)()
+        self.assertEqual(funcao.call_count, 2)
+
+    def test_outros_erros_e_transacao_interna_nao_repetem(self):
+        funcao = mock.Mock(side_effect=OperationalError('no such table: x'))
+        with self.assertRaises(OperationalError):
+            transacao_com_retentativa(funcao)()
+        self.assertEqual(funcao.call_count, 1)
+
+        funcao = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError), transaction.atomic():
+            transacao_com_retentativa(funcao)()
+        self.assertEqual(funcao.call_count, 1)
+        self.sleep.assert_not_called()
@@ -0,0 +1,54 @@
+# caixa_pdv/tests/test_busca_api.py
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+
+from caixa_pdv.busca import buscar_lotes_vendaveis
+from caixa_pdv.services import finalizar_venda
+from .dados import criar_lote, item
+
+
+class BuscaLotesApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('caixa_pdv:search_lotes_api')
+        self.lotes = [criar_lote(f'ALF{i}', variedade=f'Alface {i}') for i in range(5)]
+        criar_lote('ALFX', quantidade=0, variedade='Alface sem estoque')
+
+    def test_paginas_por_cursor_so_com_estoque(self):
+        ids, cursor = [], None
+        while True:
+            parametros = {'query': 'alface', 'limit': 2}
+            if cursor:
+                parametros['cursor'] = cursor
+            resposta = self.client.get(self.url, parametros).json()
+            self.assertEqual(resposta['total_estimado'], 6)
+            ids.extend(lote['id'] for lote in resposta['lotes'])
+            cursor = resposta['proximo_cursor']
+            if not cursor:
+                break
+        self.assertEqual(sorted(ids), sorted(lote.id for lote in self.lotes))
+
+    def test_parametros_invalidos_e_limites(self):
+        self.assertEqual(self.client.get(self.url, {'query': 'alface', 'limit': 'x'}).status_code, 400)
+        resposta = self.client.get(self.url, {'query': 'alface', 'limit': 0}).json()
+        self.assertEqual(len(resposta['lotes']), 1)
+        self.assertEqual(self.client.get(self.url).json()['lotes'], [])
+
+    def test_etag_muda_com_o_estoque(self):
+        primeira = self.client.get(self.url, {'query': 'alface'})
+        etag = primeira['ETag']
+        self.assertEqual(self.client.get(self.url, {'query': 'alface'}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        finalizar_venda([item(self.lotes[0], 100)])
+        resposta = self.client.get(self.url, {'query': 'alface'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotIn(self.lotes[0].id, [lote['id'] for lote in resposta.json()['lotes']])
+
+    def test_pagina_le_os_lotes_por_chave(self):
+        # Índice já construído: ids ranqueados, uma consulta de estoque e uma da página.
+        buscar_lotes_vendaveis('alface', 2)
+        with self.assertNumQueries(3):
+            lotes, _, proxima = buscar_lotes_vendaveis('alface', 2)
+        self.assertEqual(len(lotes), 2)
+        self.assertIsNotNone(proxima)
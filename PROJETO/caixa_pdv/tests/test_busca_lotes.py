@@ -0,0 +1,68 @@
+# caixa_pdv/tests/test_busca_lotes.py
+from unittest import mock
+
+from django.test import TestCase
+
+from lotes.models import incrementar_versao_texto_lotes, versao_lotes, versao_texto_lotes
+from caixa_pdv.busca import IndiceLotes, dobrar_acentos
+from caixa_pdv.services import finalizar_venda
+from .dados import criar_lote, item
+
+
+class IndiceLotesTests(TestCase):
+    def setUp(self):
+        self.alface = criar_lote('ALF', variedade='Alface Crespa')
+        self.rucula = criar_lote('RUC', variedade='Rúcula Cultivada')
+        self.cebolinha = criar_lote('CEB', variedade='Cebolinha Todo Ano')
+        self.indice = IndiceLotes()
+        self.indice.construir()
+
+    def test_dobrar_acentos(self):
+        self.assertEqual(dobrar_acentos(' Hortaliças '), 'hortalicas')
+
+    def test_prefixo_trecho_e_acentos(self):
+        self.assertEqual(self.indice.buscar('alf'), [self.alface.id])
+        self.assertEqual(self.indice.buscar('cultiv'), [self.rucula.id])
+        self.assertEqual(self.indice.buscar('RUCULA'), [self.rucula.id])
+        # Trecho no meio da palavra ('olin' em Cebolinha).
+        self.assertEqual(self.indice.buscar('olin'), [self.cebolinha.id])
+        self.assertEqual(self.indice.buscar('alface ano'), [])
+        self.assertEqual(self.indice.buscar('   '), [])
+
+    def test_codigo_exato_vem_primeiro(self):
+        self.assertEqual(self.indice.buscar(self.rucula.codigo)[0], self.rucula.id)
+        self.assertEqual(set(self.indice.buscar('hortalicas')), {self.alface.id, self.rucula.id, self.cebolinha.id})
+
+    def test_venda_nao_reconstroi_o_indice(self):
+        versao_texto = versao_texto_lotes()
+        versao = versao_lotes()
+        finalizar_venda([item(self.alface, 3)])
+
+        self.assertGreater(versao_lotes(), versao)
+        self.assertEqual(versao_texto_lotes(), versao_texto)
+        with mock.patch.object(self.indice, 'construir') as construir:
+            self.assertEqual(self.indice.buscar('alface'), [self.alface.id])
+        construir.assert_not_called()
+
+    def test_alteracao_do_texto_em_outro_processo(self):
+        produto = self.alface.produto
+        # Mudança só de preço: o texto pesquisável continua o mesmo.
+        produto.preco = 12
+        produto.save()
+        with mock.patch.object(self.indice, 'construir') as construir:
+            self.indice.buscar('alface')
+        construir.assert_not_called()
+
+        # Outro worker renomeia o produto: aqui só a versão do texto muda.
+        type(produto).objects.filter(pk=produto.pk).update(variedade='Chicória')
+        incrementar_versao_texto_lotes()
+        self.assertEqual(self.indice.buscar('chicoria'), [self.alface.id])
+        self.assertEqual(self.indice.buscar('alface'), [])
+
+    def test_sinais_atualizam_o_indice(self):
+        novo = criar_lote('MOR', variedade='Morango Albion')
+        self.indice.atualizar_lote(novo)
+        self.assertEqual(self.indice.buscar('albion'), [novo.id])
+
+        self.indice.remover_lote(novo.id)
+        self.assertEqual(self.indice.buscar('albion'), [])
@@ -0,0 +1,30 @@
+# caixa_pdv/tests/test_carga.py
+from collections import Counter
+
+from django.test import TestCase
+
+from caixa_pdv.management.commands.teste_carga_pdv import Command, _percentil
+from caixa_pdv.services import finalizar_venda
+from lotes.models import Lote
+from .dados import criar_lote, item
+
+
+class TesteCargaTests(TestCase):
+    def test_percentil_pelo_posto_mais_proximo(self):
+        valores = [0.1 * i for i in range(1, 11)]
+        self.assertEqual(_percentil([], 95), 0.0)
+        self.assertEqual(_percentil(valores, 50), valores[4])
+        self.assertEqual(_percentil(valores, 99), valores[-1])
+
+    def test_conferencia_do_estoque(self):
+        lote = criar_lote('A')
+        lotes = {lote.id: (lote.produto.variedade, 100)}
+        finalizar_venda([item(lote, 3)])
+
+        self.assertEqual(Command()._conferir_estoque(lotes, Counter({lote.id: 3})), [])
+        # Venda confirmada ao terminal que não chegou ao banco.
+        self.assertEqual(len(Command()._conferir_estoque(lotes, Counter({lote.id: 4}))), 1)
+        # Lote alterado sem passar pelo Lote.save: estoque do produto fora da soma dos lotes.
+        Lote.objects.filter(pk=lote.pk).update(quantidade=97 - 5)
+        problemas = Command()._conferir_estoque(lotes, Counter({lote.id: 3}))
+        self.assertTrue(any(problema.startswith('Produto') for problema in problemas))
@@ -0,0 +1,107 @@
+# caixa_pdv/tests/test_catalogo.py
+import datetime
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from lotes.models import EventoEstoque, limpar_eventos_estoque
+from caixa_pdv.catalogo_local import CAMPOS_CATALOGO, alteracoes_catalogo, snapshot_catalogo
+from caixa_pdv.services import cancelar_venda, finalizar_venda
+from .dados import criar_lote, item
+
+
+class CatalogoLocalTests(TestCase):
+    def setUp(self):
+        self.lote_a = criar_lote('A')
+        self.lote_b = criar_lote('B', quantidade=2)
+        self.lote_vazio = criar_lote('C', quantidade=0)
+        self.snapshot = snapshot_catalogo()
+
+    def linhas(self, resposta):
+        return {linha[0]: dict(zip(CAMPOS_CATALOGO, linha)) for linha in resposta['lotes']}
+
+    def test_snapshot_so_com_lotes_vendaveis(self):
+        self.assertEqual(set(self.linhas(self.snapshot)), {self.lote_a.id, self.lote_b.id})
+
+    def test_delta_sem_alteracoes(self):
+        delta = alteracoes_catalogo(self.snapshot['versao'])
+        self.assertFalse(delta['recarregar'])
+        self.assertEqual((delta['lotes'], delta['removidos']), ([], []))
+
+    def test_delta_traz_estoque_e_lotes_esgotados(self):
+        finalizar_venda([item(self.lote_a, 3), item(self.lote_b, 2)])
+
+        delta = alteracoes_catalogo(self.snapshot['versao'])
+        self.assertFalse(delta['recarregar'])
+        self.assertEqual(self.linhas(delta)[self.lote_a.id]['quantidade_estoque'], 97)
+        self.assertEqual(delta['removidos'], [self.lote_b.id])
+        self.assertGreater(delta['versao'], self.snapshot['versao'])
+
+    def test_cancelamento_devolve_o_lote_ao_catalogo(self):
+        venda = finalizar_venda([item(self.lote_b, 2)])
+        versao = alteracoes_catalogo(self.snapshot['versao'])['versao']
+        cancelar_venda(venda.id)
+
+        self.assertEqual(self.linhas(alteracoes_catalogo(versao))[self.lote_b.id]['quantidade_estoque'], 2)
+
+    def test_alteracao_do_produto(self):
+        produto = self.lote_a.produto
+        produto.variedade = 'Rúcula'
+        produto.save()
+
+        delta = alteracoes_catalogo(self.snapshot['versao'])
+        self.assertEqual(self.linhas(delta)[self.lote_a.id]['nome_produto'], 'Rúcula')
+
+    def test_limpeza_preserva_o_ultimo_evento(self):
+        finalizar_venda([item(self.lote_a, 1), item(self.lote_b, 1)])
+        versao = alteracoes_catalogo(0)['versao']
+        EventoEstoque.objects.update(criado_em=timezone.now() - datetime.timedelta(days=1))
+        limpar_eventos_estoque()
+
+        self.assertEqual(EventoEstoque.objects.count(), 1)
+        # Terminal em dia ou só um evento atrás continua por delta; o que perdeu
+        # eventos baixa o snapshot.
+        self.assertFalse(alteracoes_catalogo(versao)['recarregar'])
+        self.assertFalse(alteracoes_catalogo(versao - 1)['recarregar'])
+        self.assertTrue(alteracoes_catalogo(self.snapshot['versao'])['recarregar'])
+        self.assertTrue(alteracoes_catalogo(versao + 1)['recarregar'])
+
+
+class CatalogoApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.lote = criar_lote('A')
+        self.url = reverse('caixa_pdv:catalogo_lotes_api')
+
+    def test_etag_e_304(self):
+        resposta = self.client.get(self.url)
+        etag = resposta['ETag']
+        self.assertEqual(len(resposta.json()['lotes']), 1)
+        self.assertIn('no-cache', resposta['Cache-Control'])
+
+        with self.assertNumQueries(1):
+            nao_modificado = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(nao_modificado.status_code, 304)
+        self.assertEqual(nao_modificado['ETag'], etag)
+
+        finalizar_venda([item(self.lote, 1)])
+        resposta = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertNotEqual(resposta['ETag'], etag)
+        self.assertEqual(resposta.json()['lotes'][0][CAMPOS_CATALOGO.index('quantidade_estoque')], 99)
+
+    def test_snapshot_em_cache_por_versao(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+
+    def test_alteracoes(self):
+        url = reverse('caixa_pdv:catalogo_alteracoes_api')
+        versao = self.client.get(self.url).json()['versao']
+        finalizar_venda([item(self.lote, 1)])
+
+        delta = self.client.get(url, {'desde': versao}).json()
+        self.assertEqual([linha[0] for linha in delta['lotes']], [self.lote.id])
+        self.assertEqual(self.client.get(url, {'desde': 'x'}).status_code, 400)
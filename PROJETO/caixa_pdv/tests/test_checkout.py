@@ -0,0 +1,61 @@
+# caixa_pdv/tests/test_checkout.py
+import json
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+
+from lotes.models import Lote
+from caixa_pdv.models import Venda
+from caixa_pdv.services import finalizar_venda
+from .dados import criar_lote, item
+
+
+class CheckoutTests(TestCase):
+    def setUp(self):
+        self.lote_a = criar_lote('A')
+        self.lote_b = criar_lote('B', preco='4.00')
+
+    def assertEstoque(self, lote, quantidade):
+        lote.refresh_from_db()
+        lote.produto.refresh_from_db()
+        self.assertEqual(lote.quantidade, quantidade)
+        self.assertEqual(lote.produto.estoque, Decimal(quantidade))
+
+    def test_venda_baixa_estoque_e_calcula_total(self):
+        venda = finalizar_venda([item(self.lote_a, 2), item(self.lote_b, 3, '4.00'), item(self.lote_a, 1)])
+
+        venda.refresh_from_db()
+        self.assertEqual(venda.total_venda, Decimal('43.50'))
+        self.assertEqual(venda.itens.count(), 3)
+        self.assertEstoque(self.lote_a, 97)
+        self.assertEstoque(self.lote_b, 97)
+
+    def test_estoque_insuficiente_nao_grava_a_venda(self):
+        with self.assertRaises(ValueError):
+            finalizar_venda([item(self.lote_a, 60), item(self.lote_a, 41)])
+
+        self.assertFalse(Venda.objects.exists())
+        self.assertEstoque(self.lote_a, 100)
+
+    def test_lote_inexistente(self):
+        with self.assertRaises(Lote.DoesNotExist):
+            finalizar_venda([{'lote_id': 999, 'quantidade': 1, 'preco_unitario': '1.00'}])
+
+    def test_preco_com_mais_de_duas_casas(self):
+        # 3 x 3.333 é gravado como 3 x 3.33; o pagamento confere com o total gravado.
+        venda = finalizar_venda([item(self.lote_a, 3, '3.333')], pagamentos=[{'forma': 'pix', 'valor': '9.99'}])
+
+        venda.refresh_from_db()
+        self.assertEqual(venda.total_venda, Decimal('9.99'))
+        self.assertEqual(venda.itens.get().subtotal, Decimal('9.99'))
+
+    def test_api_responde_erros_em_json(self):
+        url = reverse('caixa_pdv:finalizar_venda_api')
+        sem_estoque = self.client.post(url, data=json.dumps({'itens': [item(self.lote_a, 101)]}), content_type='application/json')
+        sem_lote = self.client.post(url, data=json.dumps({'itens': [{'lote_id': 999, 'quantidade': 1, 'preco_unitario': '1'}]}), content_type='application/json')
+        invalido = self.client.post(url, data='{', content_type='application/json')
+
+        self.assertEqual((sem_estoque.status_code, sem_lote.status_code, invalido.status_code), (400, 404, 400))
+        self.assertFalse(sem_estoque.json()['success'])
+        self.assertFalse(Venda.objects.exists())
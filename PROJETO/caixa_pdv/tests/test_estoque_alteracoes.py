@@ -0,0 +1,85 @@
+# caixa_pdv/tests/test_estoque_alteracoes.py
+import datetime
+from unittest import mock
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from lotes import models as lotes_models
+from lotes.models import EventoEstoque, limpar_eventos_estoque, registrar_eventos_estoque
+from caixa_pdv import views
+from caixa_pdv.services import finalizar_venda
+from .dados import criar_lote, item
+
+
+def envelhecer_eventos():
+    EventoEstoque.objects.update(criado_em=timezone.now() - datetime.timedelta(days=1))
+
+
+class EstoqueAlteracoesApiTests(TestCase):
+    def setUp(self):
+        self.lote = criar_lote('A')
+        self.url = reverse('caixa_pdv:estoque_alteracoes_api')
+
+    def test_eventos_depois_do_cursor(self):
+        ultimo = self.client.get(self.url).json()['ultimo']
+        finalizar_venda([item(self.lote, 4)])
+
+        resposta = self.client.get(self.url, {'desde': ultimo}).json()
+        self.assertEqual(resposta['lotes'], {str(self.lote.id): 96})
+        self.assertGreater(resposta['ultimo'], ultimo)
+        self.assertFalse(resposta['recarregar'])
+
+    def test_eventos_descartados_pedem_recarga(self):
+        finalizar_venda([item(self.lote, 1)])
+        envelhecer_eventos()
+        limpar_eventos_estoque()
+
+        self.assertTrue(self.client.get(self.url, {'desde': 0}).json()['recarregar'])
+
+    def test_espera_le_so_o_ultimo_id(self):
+        ultimo = self.client.get(self.url).json()['ultimo']
+        esperas = []
+
+        def vender_na_segunda_espera(segundos):
+            esperas.append(segundos)
+            if len(esperas) == 2:
+                finalizar_venda([item(self.lote, 1)])
+
+        with mock.patch.object(views.time, 'sleep', side_effect=vender_na_segunda_espera), \
+                mock.patch.object(views, '_eventos_estoque_depois', wraps=views._eventos_estoque_depois) as eventos:
+            resposta = self.client.get(self.url, {'desde': ultimo}).json()
+
+        self.assertEqual(len(esperas), 2)
+        eventos.assert_called_once_with(ultimo)
+        self.assertEqual(resposta['lotes'], {str(self.lote.id): 99})
+
+    def test_sem_eventos_responde_vazio(self):
+        ultimo = self.client.get(self.url).json()['ultimo']
+        with mock.patch.object(views, 'ESTOQUE_ESPERA', 0), \
+                mock.patch.object(views, '_eventos_estoque_depois') as eventos:
+            resposta = self.client.get(self.url, {'desde': ultimo}).json()
+        eventos.assert_not_called()
+        self.assertEqual((resposta['ultimo'], resposta['lotes']), (ultimo, {}))
+
+
+class LimpezaEventosTests(TestCase):
+    def setUp(self):
+        self.lote = criar_lote('A')
+        lotes_models._proxima_limpeza_eventos = 0.0
+
+    def test_gravacao_apaga_os_eventos_antigos(self):
+        finalizar_venda([item(self.lote, 1)])
+        envelhecer_eventos()
+        lotes_models._proxima_limpeza_eventos = 0.0
+
+        registrar_eventos_estoque({self.lote.id: 99})
+        self.assertEqual(EventoEstoque.objects.count(), 1)
+
+    def test_no_maximo_uma_limpeza_por_intervalo(self):
+        with mock.patch.object(lotes_models, 'limpar_eventos_estoque') as limpar:
+            registrar_eventos_estoque({self.lote.id: 100})
+            registrar_eventos_estoque({self.lote.id: 100})
+            registrar_eventos_estoque({})
+        limpar.assert_called_once_with()
@@ -0,0 +1,97 @@
+# caixa_pdv/tests/test_estorno.py
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from lotes.models import Lote
+from caixa_pdv.models import ItemVenda, PagamentoVenda, Venda
+from caixa_pdv.resumos import receita_por_forma_pagamento, vendas_por_produto
+from caixa_pdv.services import apagar_venda, cancelar_venda, finalizar_venda
+from .dados import criar_lote, item
+
+
+class EstornoMixin:
+    def setUp(self):
+        self.lote = criar_lote('A')
+        self.venda = finalizar_venda(
+            [item(self.lote, 4)],
+            pagamentos=[{'forma': 'pix', 'valor': '20.00'}, {'forma': 'dinheiro', 'valor': '22.00'}],
+        )
+
+    def assertEstornada(self):
+        self.lote.refresh_from_db()
+        self.assertEqual(self.lote.quantidade, 100)
+        self.assertEqual(Lote.objects.get(pk=self.lote.pk).produto.estoque, Decimal('100'))
+        self.assertTrue(all(linha['total_receita'] == 0 for linha in vendas_por_produto()))
+        self.assertTrue(all(linha['total_receita'] == 0 for linha in receita_por_forma_pagamento()))
+
+
+class ExclusaoTests(EstornoMixin, TestCase):
+    def test_apagar_devolve_estoque(self):
+        with transaction.atomic():
+            apagar_venda(self.venda.id)
+
+        self.assertEstornada()
+        self.assertFalse(Venda.objects.exists())
+        self.assertFalse(ItemVenda.objects.exists())
+        self.assertFalse(PagamentoVenda.objects.exists())
+
+    def test_consultas_nao_dependem_dos_itens(self):
+        lotes = [criar_lote(f'L{i}') for i in range(5)]
+        pequena = finalizar_venda([item(lotes[0], 1)])
+        grande = finalizar_venda([item(lote, 1) for lote in lotes])
+
+        consultas = []
+        for venda in (pequena, grande):
+            with CaptureQueriesContext(connection) as contexto, transaction.atomic():
+                apagar_venda(venda.id)
+            consultas.append(len(contexto))
+        self.assertEqual(consultas[0], consultas[1])
+        for lote in lotes:
+            lote.refresh_from_db()
+            self.assertEqual(lote.quantidade, 100)
+
+    def test_api(self):
+        url = reverse('caixa_pdv:delete_venda_api', args=[self.venda.id])
+        self.assertEqual(self.client.post(url).status_code, 405)
+        resposta = self.client.delete(url)
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.json()['success'])
+        self.assertEstornada()
+        self.assertEqual(self.client.delete(url).status_code, 404)
+
+
+class CancelamentoTests(EstornoMixin, TestCase):
+    def test_cancelar_devolve_estoque_e_mantem_a_venda(self):
+        with transaction.atomic():
+            cancelar_venda(self.venda.id)
+
+        self.assertEstornada()
+        self.venda.refresh_from_db()
+        self.assertEqual(self.venda.status, 'cancelada')
+        self.assertEqual(self.venda.itens.count(), 1)
+        self.assertEqual(self.venda.pagamentos.count(), 2)
+
+    def test_cancelar_duas_vezes(self):
+        with transaction.atomic():
+            cancelar_venda(self.venda.id)
+        with self.assertRaises(ValueError), transaction.atomic():
+            cancelar_venda(self.venda.id)
+        self.assertEstornada()
+
+    def test_apagar_venda_cancelada_nao_devolve_de_novo(self):
+        with transaction.atomic():
+            cancelar_venda(self.venda.id)
+            apagar_venda(self.venda.id)
+        self.assertEstornada()
+
+    def test_api(self):
+        url = reverse('caixa_pdv:cancelar_venda_api', args=[self.venda.id])
+        self.assertEqual(self.client.get(url).status_code, 405)
+        self.assertTrue(self.client.post(url).json()['success'])
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.post(reverse('caixa_pdv:cancelar_venda_api', args=[999])).status_code, 404)
+        self.assertEstornada()
@@ -0,0 +1,56 @@
+# caixa_pdv/tests/test_exportacao.py
+import datetime
+import io
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+
+from caixa_pdv.exportacao import CABECALHO, linhas_vendas
+from caixa_pdv.services import cancelar_venda, finalizar_venda
+from .dados import criar_lote, item
+
+
+class ExportacaoVendasTests(TestCase):
+    def setUp(self):
+        self.lote = criar_lote('A')
+        self.venda = finalizar_venda([item(self.lote, 2), item(self.lote, 1, preco='3.00')])
+        cancelar_venda(finalizar_venda([item(self.lote, 1)]).id)
+
+    def test_uma_linha_por_item_so_de_vendas_finalizadas(self):
+        linhas = list(linhas_vendas(chunk_size=1))
+        self.assertEqual([linha[0] for linha in linhas], [self.venda.id, self.venda.id])
+        self.assertEqual([linha[8] for linha in linhas], [2, 1])
+        self.assertIsNone(linhas[0][1].tzinfo)
+
+    def test_csv(self):
+        resposta = self.client.get(reverse('caixa_pdv:exportar_vendas_csv'))
+        self.assertEqual(resposta['Content-Disposition'], 'attachment; filename="vendas.csv"')
+
+        texto = b''.join(resposta.streaming_content).decode('utf-8')
+        self.assertTrue(texto.startswith('\ufeff' + ';'.join(CABECALHO)))
+        linhas = texto.strip().splitlines()
+        self.assertEqual(len(linhas), 3)
+        self.assertTrue(linhas[1].startswith(f'{self.venda.id};'))
+
+    def test_xlsx(self):
+        resposta = self.client.get(reverse('caixa_pdv:exportar_vendas_xlsx'))
+        planilha = load_workbook(io.BytesIO(b''.join(resposta.streaming_content)))['Vendas']
+
+        linhas = list(planilha.values)
+        self.assertEqual(list(linhas[0]), CABECALHO)
+        self.assertEqual(len(linhas), 3)
+
+    def test_periodo(self):
+        url = reverse('caixa_pdv:exportar_vendas_csv')
+        hoje = timezone.localdate()
+        amanha = (hoje + datetime.timedelta(days=1)).isoformat()
+
+        texto = b''.join(self.client.get(url, {'start_date': hoje.isoformat(), 'end_date': hoje.isoformat()}).streaming_content)
+        self.assertEqual(len(texto.decode('utf-8').strip().splitlines()), 3)
+        texto = b''.join(self.client.get(url, {'start_date': amanha}).streaming_content)
+        self.assertEqual(len(texto.decode('utf-8').strip().splitlines()), 1)
+
+        self.assertEqual(self.client.get(url, {'start_date': '18/10/2026'}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('caixa_pdv:exportar_vendas_xlsx'), {'end_date': 'x'}).status_code, 400)
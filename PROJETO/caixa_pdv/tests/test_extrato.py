@@ -0,0 +1,47 @@
+# caixa_pdv/tests/test_extrato.py
+import datetime
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from caixa_pdv.fechamento import extrato_movimentos, gerar_fechamentos_diarios
+from caixa_pdv.models import MovimentoCaixa
+
+
+def dias_atras(dias):
+    return timezone.now() - datetime.timedelta(days=dias)
+
+
+class ExtratoTests(TestCase):
+    def setUp(self):
+        for dias, tipo, valor in ((3, 'entrada', '10.00'), (2, 'entrada', '5.00'), (2, 'retirada', '1.00'), (1, 'entrada', '2.00')):
+            MovimentoCaixa.objects.create(tipo=tipo, valor=Decimal(valor), data_hora=dias_atras(dias))
+
+    def saldos(self, movimentos):
+        return [movimento.saldo_apos for movimento in movimentos]
+
+    def test_extrato_com_saldo_acumulado(self):
+        primeira, cursor = extrato_movimentos(limite=3)
+        segunda, fim = extrato_movimentos(cursor, limite=3)
+
+        self.assertIsNone(fim)
+        self.assertEqual(self.saldos(primeira + segunda), [Decimal(valor) for valor in ('16', '14', '15', '10')])
+
+    def test_saldo_parte_do_fechamento(self):
+        esperado = self.saldos(extrato_movimentos(limite=10)[0])
+        gerar_fechamentos_diarios()
+        with self.assertNumQueries(4):
+            # Ids da página, página com a janela, fechamento anterior e soma depois dele.
+            movimentos, _ = extrato_movimentos(limite=10)
+        self.assertEqual(self.saldos(movimentos), esperado)
+
+    def test_api_paginada(self):
+        url = reverse('caixa_pdv:movimentos_caixa_api')
+        primeira = self.client.get(url, {'limit': 2}).json()
+        segunda = self.client.get(url, {'limit': 2, 'cursor': primeira['proximo_cursor']}).json()
+
+        self.assertEqual(len(primeira['movimentos'] + segunda['movimentos']), 4)
+        self.assertIsNone(segunda['proximo_cursor'])
+        self.assertEqual(self.client.get(url, {'cursor': 'xyz'}).status_code, 400)
@@ -0,0 +1,125 @@
+# caixa_pdv/tests/test_fechamento.py
+import datetime
+import json
+from decimal import Decimal
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from caixa_pdv import fechamento
+from caixa_pdv.fechamento import fechar_caixa, gerar_fechamentos_diarios, reconstruir_fechamentos, saldo_atual, totais_periodo
+from caixa_pdv.models import FechamentoCaixa, MovimentoCaixa, Venda
+from caixa_pdv.services import cancelar_venda, finalizar_venda, finalizar_vendas_em_lote
+from .dados import criar_lote, item
+
+
+def dias_atras(dias):
+    return timezone.now() - datetime.timedelta(days=dias)
+
+
+def venda_offline(chave, lote, quantidade, data_venda, **dados):
+    with transaction.atomic():
+        resultado, = finalizar_vendas_em_lote([
+            {'chave_idempotencia': chave, 'itens': [item(lote, quantidade)], 'data_venda': data_venda.isoformat(), **dados},
+        ])
+    return Venda.objects.get(pk=resultado['venda_id'])
+
+
+class FechamentoTests(TestCase):
+    def setUp(self):
+        self.lote = criar_lote('A')
+        MovimentoCaixa.objects.create(tipo='entrada', valor=Decimal('100.00'), data_hora=dias_atras(4))
+        self.venda = venda_offline('antiga', self.lote, 2, dias_atras(3))
+        self.movimento = MovimentoCaixa.objects.create(tipo='retirada', valor=Decimal('30.00'), data_hora=dias_atras(2))
+        gerar_fechamentos_diarios()
+
+    def assertIgualAReconstrucao(self):
+        esperado = saldo_atual()
+        ultimo = FechamentoCaixa.objects.order_by('-periodo_fim').first()
+        reconstruir_fechamentos()
+        self.assertEqual(saldo_atual(), esperado)
+        self.assertEqual(FechamentoCaixa.objects.order_by('-periodo_fim').first().saldo, ultimo.saldo)
+
+    def test_saldo_parte_dos_fechamentos(self):
+        self.assertTrue(FechamentoCaixa.objects.exists())
+        self.assertEqual(saldo_atual(), Decimal('91.00'))
+        finalizar_venda([item(self.lote, 1)])
+        self.assertEqual(saldo_atual(), Decimal('101.50'))
+
+    def test_periodo_inclui_o_inicio_e_exclui_o_fim(self):
+        inicio = self.movimento.data_hora
+        self.assertEqual(totais_periodo(inicio, inicio + datetime.timedelta(seconds=1))['total_retiradas'], Decimal('30.00'))
+        self.assertEqual(totais_periodo(inicio - datetime.timedelta(seconds=1), inicio)['total_retiradas'], Decimal('0'))
+
+    def test_cancelamento_retroativo_corrige_os_fechamentos(self):
+        quantidade = FechamentoCaixa.objects.count()
+        cancelar_venda(self.venda.id)
+
+        self.assertEqual(FechamentoCaixa.objects.count(), quantidade)
+        self.assertEqual(saldo_atual(), Decimal('70.00'))
+        self.assertIgualAReconstrucao()
+
+    def test_venda_offline_retroativa_entra_nos_fechamentos(self):
+        venda_offline('atrasada', self.lote, 4, dias_atras(3))
+        self.assertEqual(saldo_atual(), Decimal('133.00'))
+        self.assertIgualAReconstrucao()
+
+    def test_edicao_e_exclusao_de_movimento(self):
+        self.movimento.valor = Decimal('10.00')
+        self.movimento.save()
+        self.assertEqual(saldo_atual(), Decimal('111.00'))
+
+        self.movimento.delete()
+        self.assertEqual(saldo_atual(), Decimal('121.00'))
+        self.assertIgualAReconstrucao()
+
+    def test_reconstrucao_mantem_os_turnos(self):
+        turno = fechar_caixa()
+        MovimentoCaixa.objects.create(tipo='entrada', valor=Decimal('9.00'), data_hora=dias_atras(1))
+
+        reconstruir_fechamentos()
+        turno.refresh_from_db()
+        self.assertEqual(turno.tipo, 'turno')
+        self.assertEqual(turno.saldo, Decimal('100.00'))
+        self.assertEqual(saldo_atual(), Decimal('100.00'))
+
+
+class FechamentosPendentesTests(TestCase):
+    def setUp(self):
+        self.lote = criar_lote('A')
+        MovimentoCaixa.objects.create(tipo='entrada', valor=Decimal('50.00'), data_hora=dias_atras(2))
+        fechamento._fechamentos_gerados_ate = None
+
+    def finalizar(self):
+        return self.client.post(
+            reverse('caixa_pdv:finalizar_venda_api'),
+            data=json.dumps({'itens': [item(self.lote, 1)]}),
+            content_type='application/json',
+        )
+
+    def test_primeira_venda_do_dia_gera_os_fechamentos(self):
+        self.assertFalse(FechamentoCaixa.objects.exists())
+        self.finalizar()
+
+        ultimo = FechamentoCaixa.objects.order_by('-periodo_fim').first()
+        self.assertEqual(timezone.localtime(ultimo.periodo_fim).date(), timezone.localdate())
+        self.assertEqual(ultimo.saldo, Decimal('50.00'))
+        self.assertEqual(saldo_atual(), Decimal('60.50'))
+
+        # No mesmo dia o processo não consulta os fechamentos de novo.
+        with mock.patch.object(fechamento, 'gerar_fechamentos_diarios') as gerar:
+            self.finalizar()
+        gerar.assert_not_called()
+
+    def test_leitura_do_saldo_nao_grava(self):
+        self.client.get(reverse('caixa_pdv:historico_vendas'))
+        self.assertFalse(FechamentoCaixa.objects.exists())
+
+    def test_falha_nao_derruba_a_venda(self):
+        with mock.patch.object(fechamento, 'gerar_fechamentos_diarios', side_effect=RuntimeError), self.assertLogs('caixa_pdv.fechamento'):
+            resposta = self.finalizar()
+        self.assertTrue(resposta.json()['success'])
+        self.assertIsNone(fechamento._fechamentos_gerados_ate)
@@ -0,0 +1,51 @@
+# caixa_pdv/tests/test_historico.py
+import datetime
+
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from caixa_pdv.models import Venda
+from caixa_pdv.services import cancelar_venda, finalizar_venda
+from .dados import criar_lote, item
+
+
+class HistoricoVendasTests(TestCase):
+    def setUp(self):
+        self.url = reverse('caixa_pdv:search_vendas_api')
+        lote = criar_lote('A')
+        vendas = [finalizar_venda([item(lote, 1)]) for _ in range(5)]
+        # Duas vendas no mesmo instante: o id desempata.
+        Venda.objects.filter(pk=vendas[1].pk).update(data_venda=vendas[2].data_venda)
+        Venda.objects.filter(pk=vendas[4].pk).update(data_venda=timezone.now() - datetime.timedelta(days=1))
+        cancelar_venda(vendas[0].id)
+        self.cancelada = vendas[0].id
+        self.esperado = list(Venda.objects.order_by('-data_venda', '-id').values_list('id', flat=True))
+
+    def paginas(self, **filtros):
+        ids, cursor = [], None
+        while True:
+            parametros = {'page_size': 2, **filtros}
+            if cursor:
+                parametros['cursor'] = cursor
+            resposta = self.client.get(self.url, parametros).json()
+            ids.extend(venda['id'] for venda in resposta['vendas'])
+            cursor = resposta['proximo_cursor']
+            if not cursor:
+                return ids
+
+    def test_historico_por_cursor(self):
+        self.assertEqual(self.paginas(status='todas'), self.esperado)
+        self.assertEqual(self.paginas(), [venda_id for venda_id in self.esperado if venda_id != self.cancelada])
+        self.assertEqual(self.paginas(status='cancelada'), [self.cancelada])
+
+    def test_pagina_com_consultas_fixas(self):
+        # Vendas, itens com produto e lote, e pagamentos.
+        with self.assertNumQueries(3):
+            resposta = self.client.get(self.url, {'page_size': 3, 'status': 'todas'}).json()
+        self.assertIsNone(resposta['total_vendas'])
+        self.assertEqual(self.client.get(self.url, {'incluir_total': '1', 'page_size': 3}).json()['total_paginas'], 2)
+
+    def test_parametros_invalidos(self):
+        for parametros in ({'cursor': 'xyz'}, {'status': 'outra'}, {'page_size': 'x'}, {'start_date': '01/01/2025'}):
+            self.assertEqual(self.client.get(self.url, parametros).status_code, 400, parametros)
@@ -0,0 +1,76 @@
+# caixa_pdv/tests/test_idempotencia.py
+import datetime
+import json
+
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from caixa_pdv.models import Venda
+from caixa_pdv.services import finalizar_vendas_em_lote
+from .dados import criar_lote, item
+from .test_fechamento import venda_offline
+
+
+class IdempotenciaTests(TestCase):
+    def setUp(self):
+        self.lote = criar_lote('A')
+
+    def post(self, nome, dados):
+        return self.client.post(reverse(f'caixa_pdv:{nome}'), data=json.dumps(dados), content_type='application/json')
+
+    def test_reenvio_devolve_a_mesma_venda(self):
+        dados = {'chave_idempotencia': 'terminal-1-0001', 'itens': [item(self.lote, 2)]}
+        primeira = self.post('finalizar_venda_api', dados).json()
+        segunda = self.post('finalizar_venda_api', dados).json()
+
+        self.assertTrue(primeira['success'])
+        self.assertFalse(primeira.get('duplicada', False))
+        self.assertTrue(segunda['duplicada'])
+        self.assertEqual(segunda['venda_id'], primeira['venda_id'])
+        self.assertEqual(Venda.objects.count(), 1)
+        self.lote.refresh_from_db()
+        self.assertEqual(self.lote.quantidade, 98)
+
+    def test_sincronizacao_em_lote(self):
+        venda = {'chave_idempotencia': 'offline-1', 'itens': [item(self.lote, 1)], 'forma_pagamento': 'pix'}
+        with transaction.atomic():
+            resultados = finalizar_vendas_em_lote([
+                venda,
+                venda,
+                {'chave_idempotencia': 'offline-2', 'itens': [item(self.lote, 500)]},
+                {'itens': [item(self.lote, 1)]},
+            ])
+
+        self.assertEqual([resultado['success'] for resultado in resultados], [True, True, False, False])
+        self.assertTrue(resultados[1]['duplicada'])
+        self.assertEqual(resultados[1]['venda_id'], resultados[0]['venda_id'])
+
+        with transaction.atomic():
+            reenvio = finalizar_vendas_em_lote([venda])
+        self.assertTrue(reenvio[0]['duplicada'])
+        self.assertEqual(reenvio[0]['venda_id'], resultados[0]['venda_id'])
+        self.assertEqual(Venda.objects.count(), 1)
+        self.lote.refresh_from_db()
+        self.assertEqual(self.lote.quantidade, 99)
+
+    def test_api_de_sincronizacao(self):
+        resposta = self.post('sincronizar_vendas_api', {'vendas': [
+            {'chave_idempotencia': 'offline-1', 'itens': [item(self.lote, 1)]},
+            {'chave_idempotencia': 'offline-2', 'itens': [item(self.lote, 500)]},
+        ]}).json()
+        self.assertFalse(resposta['success'])
+        self.assertEqual([resultado['success'] for resultado in resposta['resultados']], [True, False])
+
+        self.assertEqual(self.post('sincronizar_vendas_api', {'vendas': []}).status_code, 400)
+        self.assertEqual(self.client.post(reverse('caixa_pdv:sincronizar_vendas_api'), data='x', content_type='application/json').status_code, 400)
+
+    def test_data_da_venda_offline(self):
+        venda = venda_offline('futura', self.lote, 1, timezone.now() + datetime.timedelta(days=2))
+        self.assertLessEqual(venda.data_venda, timezone.now())
+        with transaction.atomic():
+            resultado, = finalizar_vendas_em_lote([
+                {'chave_idempotencia': 'data-invalida', 'itens': [item(self.lote, 1)], 'data_venda': 'ontem'},
+            ])
+        self.assertFalse(resultado['success'])
@@ -0,0 +1,63 @@
+# caixa_pdv/tests/test_pagamentos.py
+import json
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+
+from caixa_pdv.models import PagamentoVenda, Venda
+from caixa_pdv.resumos import receita_por_forma_pagamento
+from caixa_pdv.services import finalizar_venda
+from .dados import criar_lote, item
+
+
+class PagamentoDivididoTests(TestCase):
+    def setUp(self):
+        self.lote = criar_lote('A')
+
+    def test_pagamento_dividido(self):
+        venda = finalizar_venda(
+            [item(self.lote, 2)],
+            pagamentos=[{'forma': 'pix', 'valor': '10.00'}, {'forma': 'dinheiro', 'valor': '11.00'}],
+        )
+
+        self.assertEqual(
+            dict(PagamentoVenda.objects.filter(venda=venda).values_list('forma', 'valor')),
+            {'pix': Decimal('10.00'), 'dinheiro': Decimal('11.00')},
+        )
+        self.assertEqual(venda.forma_pagamento, 'Pix + Dinheiro')
+        resumo = {linha['forma']: linha['total_receita'] for linha in receita_por_forma_pagamento()}
+        self.assertEqual(resumo, {'pix': Decimal('10.00'), 'dinheiro': Decimal('11.00')})
+
+    def test_mesma_forma_repetida_vira_um_pagamento(self):
+        venda = finalizar_venda(
+            [item(self.lote, 2)],
+            pagamentos=[{'forma': 'cartao', 'valor': '10.00'}, {'forma': 'cartao', 'valor': '11.00'}],
+        )
+        self.assertEqual(list(venda.pagamentos.values_list('forma', 'valor')), [('cartao', Decimal('21.00'))])
+
+    def test_pagamentos_que_nao_somam_o_total(self):
+        with self.assertRaises(ValueError):
+            finalizar_venda([item(self.lote, 2)], pagamentos=[{'forma': 'pix', 'valor': '20.00'}])
+        with self.assertRaises(ValueError):
+            finalizar_venda([item(self.lote, 1)], pagamentos=[{'forma': 'cheque', 'valor': '10.50'}])
+        with self.assertRaises(ValueError):
+            finalizar_venda([item(self.lote, 1)], pagamentos=[{'forma': 'pix', 'valor': '-1'}, {'forma': 'dinheiro', 'valor': '11.50'}])
+        self.assertFalse(Venda.objects.exists())
+
+    def test_sem_pagamentos_o_total_vai_para_a_forma_informada(self):
+        venda = finalizar_venda([item(self.lote, 1)], forma_pagamento='cartao')
+        self.assertEqual(list(venda.pagamentos.values_list('forma', 'valor')), [('cartao', Decimal('10.50'))])
+
+    def test_api(self):
+        url = reverse('caixa_pdv:finalizar_venda_api')
+        dados = {'itens': [item(self.lote, 1)], 'pagamentos': [{'forma': 'pix', 'valor': '5.50'}, {'forma': 'dinheiro', 'valor': '5.00'}]}
+        self.assertTrue(self.client.post(url, data=json.dumps(dados), content_type='application/json').json()['success'])
+
+        dados['pagamentos'][0]['valor'] = '5.00'
+        resposta = self.client.post(url, data=json.dumps(dados), content_type='application/json')
+        self.assertEqual(resposta.status_code, 400)
+        self.assertFalse(resposta.json()['success'])
+
+        linhas = self.client.get(reverse('caixa_pdv:resumo_vendas_api'), {'agrupar': 'pagamento'}).json()['linhas']
+        self.assertEqual({linha['forma']: linha['total_receita'] for linha in linhas}, {'pix': '5.50', 'dinheiro': '5.00'})
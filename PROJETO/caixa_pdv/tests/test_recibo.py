@@ -0,0 +1,64 @@
+# caixa_pdv/tests/test_recibo.py
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from caixa_pdv import recibo
+from caixa_pdv.recibo import CORTAR, INICIAR, carregar_venda, montar_recibo
+from caixa_pdv.services import cancelar_venda, finalizar_venda
+from .dados import criar_lote, item
+
+
+class ReciboTests(TestCase):
+    def setUp(self):
+        self.lote = criar_lote('A', variedade='Alface Crespa Verde Folha Larga Resistente ao Calor')
+        self.venda = finalizar_venda(
+            [item(self.lote, 2)],
+            pagamentos=[{'forma': 'pix', 'valor': '1.00'}, {'forma': 'dinheiro', 'valor': '20.00'}],
+        )
+
+    def test_bytes_e_texto(self):
+        with self.assertNumQueries(3):
+            venda = carregar_venda(self.venda.id)
+        documento = montar_recibo(venda, 58)
+
+        self.assertTrue(documento.dados.startswith(INICIAR))
+        self.assertTrue(documento.dados.endswith(CORTAR))
+        self.assertIn('Pix'.encode('cp860'), documento.dados)
+        texto = documento.como_texto()
+        self.assertIn('R$ 21,00', texto)
+        self.assertTrue(all(len(linha) <= 32 for linha in texto.splitlines()))
+        self.assertEqual(max(len(linha) for linha in montar_recibo(venda, 80).como_texto().splitlines()), 48)
+
+    def test_venda_cancelada(self):
+        cancelar_venda(self.venda.id)
+        self.assertIn('VENDA CANCELADA', montar_recibo(carregar_venda(self.venda.id)).como_texto())
+
+    def test_view(self):
+        url = reverse('caixa_pdv:recibo_venda', args=[self.venda.id])
+        resposta = self.client.get(url)
+        self.assertEqual(resposta['Content-Disposition'], f'attachment; filename="recibo_venda_{self.venda.id}.bin"')
+        self.assertTrue(resposta.content.startswith(INICIAR))
+
+        resposta = self.client.get(url, {'formato': 'texto', 'largura': 58})
+        self.assertIn(f'Venda #{self.venda.id}', resposta.content.decode('utf-8'))
+        self.assertEqual(self.client.get(url, {'largura': 70}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('caixa_pdv:recibo_venda', args=[999])).status_code, 404)
+
+    def test_impressao(self):
+        url = reverse('caixa_pdv:imprimir_recibo_api', args=[self.venda.id])
+        with tempfile.TemporaryDirectory() as diretorio:
+            destino = os.path.join(diretorio, 'lp0')
+            call_command('imprimir_recibo', self.venda.id, '--destino', destino, stdout=StringIO())
+            with open(destino, 'rb') as arquivo:
+                self.assertTrue(arquivo.read().startswith(INICIAR))
+
+        with mock.patch.object(recibo, 'RECIBO_IMPRESSORA', None):
+            self.assertEqual(self.client.post(url).status_code, 400)
+        with self.assertRaises(CommandError):
+            call_command('imprimir_recibo', 999, stdout=StringIO())
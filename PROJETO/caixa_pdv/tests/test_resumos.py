@@ -0,0 +1,77 @@
+# caixa_pdv/tests/test_resumos.py
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from caixa_pdv.models import ItemVenda, ResumoVendaDiaria, suspender_totais_venda
+from caixa_pdv.resumos import receita_por_dia, reconstruir_resumos
+from caixa_pdv.services import cancelar_venda, finalizar_venda
+from .dados import criar_lote, item
+from .test_fechamento import dias_atras, venda_offline
+
+
+class ResumoTests(TestCase):
+    def setUp(self):
+        self.lote_a = criar_lote('A')
+        self.lote_b = criar_lote('B', preco='2.00')
+
+    def resumos(self):
+        return set(ResumoVendaDiaria.objects.exclude(quantidade=0, receita=0).values_list('data', 'produto_id', 'quantidade', 'receita'))
+
+    def assertIgualAReconstrucao(self):
+        incrementais = self.resumos()
+        reconstruir_resumos()
+        self.assertEqual(self.resumos(), incrementais)
+
+    def test_resumos_incrementais_iguais_a_reconstrucao(self):
+        finalizar_venda([item(self.lote_a, 2), item(self.lote_b, 5, '2.00')])
+        venda_offline('ontem', self.lote_a, 1, dias_atras(1))
+        cancelada = finalizar_venda([item(self.lote_b, 3, '2.00')])
+        cancelar_venda(cancelada.id)
+
+        self.assertIgualAReconstrucao()
+        por_dia = {linha['data']: linha['total_receita'] for linha in receita_por_dia()}
+        self.assertEqual(por_dia[timezone.localdate()], Decimal('31.00'))
+        self.assertEqual(por_dia[timezone.localdate(dias_atras(1))], Decimal('10.50'))
+
+    def test_edicao_de_itens_pela_api(self):
+        venda = finalizar_venda([item(self.lote_a, 2), item(self.lote_b, 5, '2.00')])
+        item_a, item_b = venda.itens.order_by('id')
+        cliente = APIClient()
+        cliente.force_authenticate(get_user_model().objects.create_user('caixa'))
+
+        resposta = cliente.patch(reverse('caixa_pdv:itemvenda-detail', args=[item_a.id]), {'quantidade': 4}, format='json')
+        self.assertEqual(resposta.status_code, 200)
+        resumo = ResumoVendaDiaria.objects.get(produto=self.lote_a.produto)
+        self.assertEqual((resumo.quantidade, resumo.receita), (4, Decimal('42.00')))
+
+        self.assertEqual(cliente.delete(reverse('caixa_pdv:itemvenda-detail', args=[item_b.id])).status_code, 204)
+        self.assertFalse(ResumoVendaDiaria.objects.filter(produto=self.lote_b.produto).exclude(quantidade=0).exists())
+        self.assertIgualAReconstrucao()
+
+    def test_troca_de_produto_e_itens_em_bloco(self):
+        venda = finalizar_venda([item(self.lote_a, 2)])
+        item_a = venda.itens.get()
+        # Mesmo subtotal, outro produto: o total não muda, os resumos sim.
+        item_a.produto, item_a.lote, item_a.quantidade = self.lote_b.produto, self.lote_b, 21
+        item_a.preco_unitario_vendido = Decimal('1.00')
+        item_a.save()
+        self.assertIgualAReconstrucao()
+
+        with suspender_totais_venda():
+            ItemVenda.objects.create(venda=venda, produto=self.lote_a.produto, lote=self.lote_a, quantidade=1, preco_unitario_vendido=Decimal('10.50'))
+            ItemVenda.objects.create(venda=venda, produto=self.lote_a.produto, lote=self.lote_a, quantidade=2, preco_unitario_vendido=Decimal('10.50'))
+        self.assertEqual(ResumoVendaDiaria.objects.get(produto=self.lote_a.produto).quantidade, 3)
+        self.assertIgualAReconstrucao()
+
+    def test_venda_cancelada_nao_entra_nos_resumos(self):
+        venda = finalizar_venda([item(self.lote_a, 2)])
+        cancelar_venda(venda.id)
+        item_a = venda.itens.get()
+        item_a.quantidade = 5
+        item_a.save()
+        self.assertIgualAReconstrucao()
@@ -0,0 +1,48 @@
+# caixa_pdv/tests/test_scan.py
+import json
+
+from django.test import TestCase
+from django.urls import reverse
+
+from caixa_pdv.busca import cache_scan, lotes_por_codigo
+from caixa_pdv.services import finalizar_venda
+from .dados import criar_lote, item
+
+
+class ScanLoteTests(TestCase):
+    def setUp(self):
+        cache_scan.limpar()
+        self.lote_a = criar_lote('A')
+        self.lote_b = criar_lote('B')
+
+    def test_leitura_de_um_codigo(self):
+        url = reverse('caixa_pdv:scan_lote_api')
+        resposta = self.client.get(url, {'codigo': self.lote_a.codigo})
+
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.json()['lote']['id'], self.lote_a.id)
+        self.assertEqual(self.client.get(url, {'codigo': 'NAOEXISTE'}).status_code, 404)
+        self.assertEqual(self.client.get(url).status_code, 400)
+
+    def test_leitura_em_lote(self):
+        resposta = self.client.post(
+            reverse('caixa_pdv:scan_lotes_api'),
+            data=json.dumps({'codigos': [self.lote_b.codigo, 'XYZ', self.lote_a.codigo]}),
+            content_type='application/json',
+        ).json()
+
+        self.assertEqual([lote['id'] for lote in resposta['lotes']], [self.lote_b.id, self.lote_a.id])
+        self.assertEqual(resposta['nao_encontrados'], ['XYZ'])
+
+    def test_cache_e_invalidacao_pela_venda(self):
+        codigos = [self.lote_a.codigo, self.lote_b.codigo]
+        lotes_por_codigo(codigos)
+        with self.assertNumQueries(0):
+            lotes_por_codigo(codigos)
+
+        # A baixa de estoque em massa descarta as entradas no commit da transação.
+        with self.captureOnCommitCallbacks(execute=True):
+            finalizar_venda([item(self.lote_a, 5)])
+        with self.assertNumQueries(1):
+            encontrados = lotes_por_codigo(codigos)
+        self.assertEqual(encontrados[self.lote_a.codigo]['quantidade_estoque'], 95)
@@ -0,0 +1,98 @@
+# caixa_pdv/tests/test_sessoes.py
+import json
+from decimal import Decimal
+
+from django.test import TestCase
+from django.urls import reverse
+
+from caixa_pdv.models import ItemVenda, MovimentoCaixa, SessaoCaixa, Venda
+from caixa_pdv.services import cancelar_venda, finalizar_venda
+from caixa_pdv.sessoes import abrir_sessao, fechar_sessao, recalcular_sessao
+from .dados import criar_lote, item
+
+
+class SessaoCaixaTests(TestCase):
+    def setUp(self):
+        self.lote = criar_lote('A')
+        self.sessao = abrir_sessao('caixa-1', '50.00')
+
+    def test_totais_acompanham_vendas_movimentos_e_cancelamentos(self):
+        finalizar_venda([item(self.lote, 2)], sessao_id=self.sessao.id)
+        finalizar_venda(
+            [item(self.lote, 4)], sessao_id=self.sessao.id,
+            pagamentos=[{'forma': 'pix', 'valor': '30.00'}, {'forma': 'dinheiro', 'valor': '12.00'}],
+        )
+        cancelada = finalizar_venda([item(self.lote, 1)], sessao_id=self.sessao.id)
+        cancelar_venda(cancelada.id)
+        MovimentoCaixa.objects.create(tipo='entrada', valor=Decimal('5.00'), sessao=self.sessao)
+        MovimentoCaixa.objects.create(tipo='retirada', valor=Decimal('20.00'), sessao=self.sessao)
+
+        self.sessao.refresh_from_db()
+        self.assertEqual(self.sessao.quantidade_vendas, 2)
+        self.assertEqual(self.sessao.total_vendas, Decimal('63.00'))
+        self.assertEqual(self.sessao.total_dinheiro, Decimal('33.00'))
+        self.assertEqual(self.sessao.saldo_esperado, Decimal('68.00'))
+
+        recalculada = recalcular_sessao(self.sessao.id)
+        for campo in ('quantidade_vendas', 'total_vendas', 'total_dinheiro', 'total_entradas', 'total_retiradas'):
+            self.assertEqual(getattr(recalculada, campo), getattr(self.sessao, campo), campo)
+
+    def test_edicao_de_item_rebalanceia_pagamentos(self):
+        venda = finalizar_venda(
+            [item(self.lote, 2)], sessao_id=self.sessao.id,
+            pagamentos=[{'forma': 'pix', 'valor': '10.00'}, {'forma': 'dinheiro', 'valor': '11.00'}],
+        )
+        item_venda = ItemVenda.objects.get(venda=venda)
+        item_venda.quantidade = 1
+        item_venda.save()
+
+        venda.refresh_from_db()
+        self.sessao.refresh_from_db()
+        self.assertEqual(venda.total_venda, Decimal('10.50'))
+        self.assertEqual(sum(venda.pagamentos.values_list('valor', flat=True)), venda.total_venda)
+        self.assertEqual(self.sessao.total_vendas, Decimal('10.50'))
+        self.assertEqual(self.sessao.total_dinheiro, Decimal('0.50'))
+
+    def test_fechar_sessao(self):
+        finalizar_venda([item(self.lote, 2)], sessao_id=self.sessao.id)
+        sessao = fechar_sessao(self.sessao.id, '70.00')
+
+        self.assertFalse(sessao.aberta)
+        self.assertEqual(sessao.diferenca, Decimal('-1.00'))
+        with self.assertRaises(ValueError):
+            fechar_sessao(self.sessao.id, '70.00')
+        # Uma venda depois do fechamento não entra mais na sessão.
+        venda = finalizar_venda([item(self.lote, 1)], sessao_id=self.sessao.id)
+        self.assertIsNone(venda.sessao_id)
+
+    def test_um_terminal_uma_sessao_aberta(self):
+        with self.assertRaises(ValueError):
+            abrir_sessao('caixa-1', '10.00')
+        with self.assertRaises(ValueError):
+            abrir_sessao('', '10.00')
+        self.assertEqual(abrir_sessao('caixa-2', '0').terminal, 'caixa-2')
+
+
+class SessaoCaixaViewsTests(TestCase):
+    def setUp(self):
+        self.lote = criar_lote('A')
+
+    def sessao_api(self):
+        return self.client.get(reverse('caixa_pdv:sessao_caixa_api')).json()['sessao']
+
+    def test_abrir_vender_e_fechar_pelo_terminal(self):
+        self.assertIsNone(self.sessao_api())
+        self.client.post(reverse('caixa_pdv:abrir_sessao_caixa'), {'terminal': 'caixa-1', 'valor_abertura': '20.00'})
+        sessao_id = self.sessao_api()['id']
+
+        self.client.post(
+            reverse('caixa_pdv:finalizar_venda_api'),
+            data=json.dumps({'itens': [item(self.lote, 2)]}),
+            content_type='application/json',
+        )
+        self.assertEqual(Venda.objects.get().sessao_id, sessao_id)
+        self.assertEqual(self.sessao_api()['saldo_esperado'], '41.00')
+
+        self.client.post(reverse('caixa_pdv:fechar_sessao_caixa'), {'valor_contado': '41.00'})
+        self.assertEqual(SessaoCaixa.objects.get().diferenca, Decimal('0.00'))
+        self.assertIsNone(self.sessao_api())
@@ -0,0 +1,106 @@
+# caixa_pdv/tests/test_tarefas.py
+import datetime
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from caixa_pdv import tarefas, termos
+from caixa_pdv.models import TarefaDocumento
+from caixa_pdv.services import finalizar_venda
+from caixa_pdv.tarefas import (
+    criar_tarefa, limpar_tarefas_antigas, pegar_proxima_tarefa, processar_pendentes, reabrir_tarefas_abandonadas,
+)
+from .dados import criar_lote, item
+
+
+class TarefaDocumentoTests(TestCase):
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        for modulo, nome in ((tarefas, 'TAREFAS_DIR'), (termos, 'TERMOS_CACHE_DIR')):
+            patcher = mock.patch.object(modulo, nome, os.path.join(diretorio.name, nome))
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.lote = criar_lote('A')
+        self.venda = finalizar_venda([item(self.lote, 2)])
+
+    def criar(self, dados):
+        return self.client.post(reverse('caixa_pdv:criar_tarefa_api'), data=json.dumps(dados), content_type='application/json')
+
+    def status(self, tarefa_id):
+        return self.client.get(reverse('caixa_pdv:status_tarefa_api', args=[tarefa_id])).json()['tarefa']
+
+    def test_validacao(self):
+        self.assertEqual(self.criar({'tipo': 'planilha'}).status_code, 400)
+        self.assertEqual(self.criar({'tipo': 'termos', 'parametros': {}}).status_code, 400)
+        self.assertEqual(self.criar({'tipo': 'termos', 'parametros': {'ids': ['x']}}).status_code, 400)
+        self.assertEqual(self.criar({'tipo': 'termos', 'parametros': {'start_date': '01/01/2025'}}).status_code, 400)
+        self.assertEqual(self.criar({'tipo': 'etiquetas', 'parametros': {'lote_ids': []}}).status_code, 400)
+        self.assertEqual(self.client.post(reverse('caixa_pdv:criar_tarefa_api'), data='x', content_type='application/json').status_code, 400)
+        self.assertFalse(TarefaDocumento.objects.exists())
+
+    def test_fila_de_termos_ate_o_download(self):
+        resposta = self.criar({'tipo': 'termos', 'parametros': {'formato': 'zip', 'ids': f'{self.venda.id}'}})
+        self.assertEqual(resposta.status_code, 202)
+        tarefa_id = resposta.json()['tarefa']['id']
+        self.assertEqual(self.status(tarefa_id)['status'], 'pendente')
+        download = reverse('caixa_pdv:download_tarefa', args=[tarefa_id])
+        self.assertEqual(self.client.get(download).status_code, 409)
+
+        self.assertEqual(processar_pendentes(), 1)
+        status = self.status(tarefa_id)
+        self.assertEqual((status['status'], status['progresso'], status['total']), ('concluida', 1, 1))
+        self.assertEqual(status['download_url'], download)
+        resposta = self.client.get(download)
+        self.assertEqual(resposta['Content-Disposition'], 'attachment; filename="termos_conformidade.zip"')
+        self.assertTrue(b''.join(resposta.streaming_content).startswith(b'PK'))
+
+        os.unlink(TarefaDocumento.objects.get(pk=tarefa_id).arquivo)
+        self.assertEqual(self.client.get(download).status_code, 410)
+
+    def test_etiquetas_e_erro(self):
+        etiquetas = criar_tarefa('etiquetas', {'lote_ids': [self.lote.id]})
+        com_erro = criar_tarefa('termos', {'ids': [self.venda.id]})
+        with mock.patch.object(tarefas, 'salvar_termos_pdf', side_effect=RuntimeError('falhou')):
+            self.assertEqual(processar_pendentes(), 2)
+
+        etiquetas.refresh_from_db()
+        self.assertEqual(etiquetas.status, 'concluida')
+        self.assertTrue(os.path.exists(etiquetas.arquivo))
+        com_erro.refresh_from_db()
+        self.assertEqual((com_erro.status, com_erro.mensagem), ('erro', 'falhou'))
+        self.assertEqual([nome for nome in os.listdir(tarefas.TAREFAS_DIR) if nome.endswith('.tmp')], [])
+
+    def test_reserva_e_tarefas_abandonadas(self):
+        primeira = criar_tarefa('etiquetas', {'lote_ids': [self.lote.id]})
+        criar_tarefa('etiquetas', {'lote_ids': [self.lote.id]})
+        self.assertEqual(pegar_proxima_tarefa().id, primeira.id)
+        self.assertNotEqual(pegar_proxima_tarefa().id, primeira.id)
+        self.assertIsNone(pegar_proxima_tarefa())
+
+        TarefaDocumento.objects.filter(pk=primeira.pk).update(iniciada_em=timezone.now() - datetime.timedelta(hours=1))
+        self.assertEqual(reabrir_tarefas_abandonadas(), 1)
+        self.assertEqual(pegar_proxima_tarefa().id, primeira.id)
+
+    def test_limpeza_das_tarefas_antigas(self):
+        tarefa = criar_tarefa('etiquetas', {'lote_ids': [self.lote.id]})
+        processar_pendentes()
+        tarefa.refresh_from_db()
+        self.assertEqual(limpar_tarefas_antigas(), 0)
+
+        TarefaDocumento.objects.filter(pk=tarefa.pk).update(concluida_em=timezone.now() - datetime.timedelta(days=2))
+        self.assertEqual(limpar_tarefas_antigas(), 1)
+        self.assertFalse(os.path.exists(tarefa.arquivo))
+
+    def test_comando_uma_vez(self):
+        criar_tarefa('etiquetas', {'lote_ids': [self.lote.id]})
+        saida = StringIO()
+        call_command('processar_tarefas', '--uma-vez', stdout=saida)
+        self.assertIn('1 tarefa(s) processada(s).', saida.getvalue())
@@ -0,0 +1,112 @@
+# caixa_pdv/tests/test_termos.py
+import io
+import os
+import tempfile
+import zipfile
+from unittest import mock
+
+from django.db import transaction
+from django.test import TestCase
+from django.urls import reverse
+
+from caixa_pdv import termos
+from caixa_pdv.models import TarefaDocumento
+from caixa_pdv.services import apagar_venda, cancelar_venda, finalizar_venda
+from .dados import criar_lote, item
+
+
+class CacheTermosMixin:
+    def setUp(self):
+        diretorio = tempfile.TemporaryDirectory()
+        self.addCleanup(diretorio.cleanup)
+        patcher = mock.patch.object(termos, 'TERMOS_CACHE_DIR', diretorio.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.lote = criar_lote('A')
+        self.venda = finalizar_venda([item(self.lote, 2)])
+
+    def arquivos(self):
+        return sorted(os.listdir(termos.TERMOS_CACHE_DIR))
+
+
+class TermoCacheTests(CacheTermosMixin, TestCase):
+    def baixar(self):
+        resposta = self.client.get(reverse('caixa_pdv:termo_conformidade_pdf', args=[self.venda.id]))
+        self.assertEqual(resposta.status_code, 200)
+        conteudo = b''.join(resposta.streaming_content)
+        self.assertTrue(conteudo.startswith(b'%PDF'))
+        return conteudo
+
+    def test_segundo_download_le_o_arquivo(self):
+        self.baixar()
+        with mock.patch.object(termos, 'renderizar_termo') as renderizar:
+            self.baixar()
+        renderizar.assert_not_called()
+        self.assertEqual(len(self.arquivos()), 1)
+
+    def test_alteracao_da_venda_refaz_o_termo(self):
+        self.baixar()
+        antigo = self.arquivos()
+        self.venda.observacoes = 'Entregar amanhã'
+        self.venda.save()
+        self.baixar()
+
+        self.assertEqual(len(self.arquivos()), 1)
+        self.assertNotEqual(self.arquivos(), antigo)
+
+    def test_cancelamento_e_exclusao_apagam_o_cache(self):
+        outra = finalizar_venda([item(self.lote, 1)])
+        for venda in (self.venda, outra):
+            termos.caminho_termo(venda, venda.itens.all())
+        self.assertEqual(len(self.arquivos()), 2)
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            cancelar_venda(self.venda.id)
+        self.assertEqual(len(self.arquivos()), 1)
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            apagar_venda(outra.id)
+        self.assertEqual(self.arquivos(), [])
+
+    def test_venda_inexistente(self):
+        self.assertEqual(self.client.get(reverse('caixa_pdv:termo_conformidade_pdf', args=[999])).status_code, 404)
+
+
+class TermosEmLoteTests(CacheTermosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.outra = finalizar_venda([item(self.lote, 1)])
+        self.url = reverse('caixa_pdv:termos_conformidade_lote')
+
+    def test_zip_transmitido(self):
+        resposta = self.client.get(self.url, {'formato': 'zip', 'ids': f'{self.venda.id},{self.outra.id}'})
+        self.assertEqual(resposta['Content-Type'], 'application/zip')
+        arquivo_zip = zipfile.ZipFile(io.BytesIO(b''.join(resposta.streaming_content)))
+        self.assertEqual(
+            arquivo_zip.namelist(),
+            [f'termo_conformidade_venda_{self.venda.id}.pdf', f'termo_conformidade_venda_{self.outra.id}.pdf'],
+        )
+        self.assertEqual(len(self.arquivos()), 2)
+
+    def test_pdf_unico_vai_para_a_fila(self):
+        resposta = self.client.get(self.url, {'start_date': '2000-01-01'})
+        self.assertEqual(resposta.status_code, 202)
+        tarefa = TarefaDocumento.objects.get()
+        self.assertEqual(resposta['Location'], reverse('caixa_pdv:status_tarefa_api', args=[tarefa.id]))
+        self.assertEqual(tarefa.parametros['formato'], 'pdf')
+        self.assertEqual(tarefa.status, 'pendente')
+
+    def test_blocos_de_vendas(self):
+        vendas = termos.vendas_para_termos([self.venda.id, self.outra.id])
+        # Uma consulta das vendas e, por bloco, itens e pagamentos.
+        with mock.patch.object(termos, 'TERMOS_LOTE_CHUNK_SIZE', 1), self.assertNumQueries(5):
+            feitos = [venda.id for venda, _ in termos.caminhos_termos(vendas)]
+        self.assertEqual(feitos, [self.venda.id, self.outra.id])
+
+    def test_parametros_invalidos(self):
+        self.assertEqual(self.client.get(self.url, {'formato': 'doc', 'ids': '1'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'ids': 'a,b'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'ids': '999'}).status_code, 404)
+        with mock.patch('caixa_pdv.views.TERMOS_LOTE_LIMITE', 1):
+            self.assertEqual(self.client.get(self.url, {'start_date': '2000-01-01'}).status_code, 400)
@@ -0,0 +1,78 @@
+# caixa_pdv/tests/test_totais_venda.py
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from caixa_pdv.models import ItemVenda, Venda, recalcular_totais_vendas, suspender_totais_venda
+from caixa_pdv.resumos import receita_por_forma_pagamento
+from caixa_pdv.services import finalizar_venda
+from .dados import criar_lote, item
+
+
+class TotalVendaTests(TestCase):
+    def setUp(self):
+        self.lote = criar_lote('A')
+        self.venda = finalizar_venda([item(self.lote, 2)])
+
+    def total(self):
+        return Venda.objects.values_list('total_venda', flat=True).get(pk=self.venda.pk)
+
+    def test_total_acompanha_os_itens(self):
+        novo = ItemVenda.objects.create(
+            venda=self.venda, produto=self.lote.produto, lote=self.lote, quantidade=1, preco_unitario_vendido=Decimal('5.00'),
+        )
+        self.assertEqual(self.total(), Decimal('26.00'))
+
+        novo.quantidade = 3
+        novo.save()
+        self.assertEqual(self.total(), Decimal('36.00'))
+
+        novo.delete()
+        self.assertEqual(self.total(), Decimal('21.00'))
+
+    def test_deltas_suspensos_sao_aplicados_uma_vez(self):
+        with mock.patch.object(Venda, 'aplicar_delta_total', wraps=Venda.aplicar_delta_total) as aplicar:
+            with suspender_totais_venda():
+                for quantidade in (1, 2, 3):
+                    ItemVenda.objects.create(
+                        venda=self.venda, produto=self.lote.produto, lote=self.lote,
+                        quantidade=quantidade, preco_unitario_vendido=Decimal('1.00'),
+                    )
+                self.assertEqual(self.total(), Decimal('21.00'))
+        aplicar.assert_called_once_with(self.venda.id, Decimal('6.00'), {self.lote.produto_id: (6, Decimal('6.00'))})
+        self.assertEqual(self.total(), Decimal('27.00'))
+
+    def test_deltas_descartados(self):
+        with suspender_totais_venda(aplicar=False):
+            ItemVenda.objects.filter(venda=self.venda).get().delete()
+        self.assertEqual(self.total(), Decimal('21.00'))
+
+    def test_reparo_corrige_total_e_pagamentos(self):
+        # Subtotal alterado sem passar pelos sinais: total e pagamentos ficam para trás.
+        ItemVenda.objects.filter(venda=self.venda).update(subtotal=Decimal('30.00'))
+
+        self.assertEqual(recalcular_totais_vendas(), 1)
+        self.assertEqual(self.total(), Decimal('30.00'))
+        self.assertEqual(list(self.venda.pagamentos.values_list('forma', 'valor')), [('dinheiro', Decimal('30.00'))])
+        self.assertEqual(
+            {linha['forma']: linha['total_receita'] for linha in receita_por_forma_pagamento()},
+            {'dinheiro': Decimal('30.00')},
+        )
+        # Nada mais a corrigir.
+        self.assertEqual(recalcular_totais_vendas(), 0)
+
+    def test_reparo_de_uma_venda(self):
+        ItemVenda.objects.filter(venda=self.venda).update(subtotal=Decimal('15.00'))
+        self.venda.recalcular_total()
+
+        self.assertEqual(self.venda.total_venda, Decimal('15.00'))
+        self.assertEqual(self.total(), Decimal('15.00'))
+        self.assertEqual(sum(self.venda.pagamentos.values_list('valor', flat=True)), Decimal('15.00'))
+
+    def test_comando_de_reparo(self):
+        ItemVenda.objects.filter(venda=self.venda).update(subtotal=Decimal('1.00'))
+        call_command('recalcular_totais_vendas', self.venda.id, stdout=StringIO())
+        self.assertEqual(self.total(), Decimal('1.00'))
@@ -0,0 +1,50 @@
+# caixa_pdv/tests/test_vendas_api.py
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from caixa_pdv.models import ResumoVendaDiaria, Venda
+from caixa_pdv.services import finalizar_venda
+from .dados import criar_lote, item
+
+
+class VendaViewSetTests(TestCase):
+    def setUp(self):
+        self.cliente = APIClient()
+        self.cliente.force_authenticate(get_user_model().objects.create_user('caixa'))
+        self.lote = criar_lote('A')
+        self.vendas = [finalizar_venda([item(self.lote, 1), item(self.lote, 2)]) for _ in range(3)]
+        # Duas vendas no mesmo instante: o id desempata.
+        Venda.objects.filter(pk=self.vendas[0].pk).update(data_venda=self.vendas[1].data_venda)
+        self.esperado = list(Venda.objects.order_by('-data_venda', '-id').values_list('id', flat=True))
+        self.url = reverse('caixa_pdv:venda-list')
+
+    def test_sem_parametros_lista_simples(self):
+        resposta = self.cliente.get(self.url).json()
+        self.assertIsInstance(resposta, list)
+        self.assertEqual([venda['id'] for venda in resposta], self.esperado)
+        self.assertEqual(resposta[0]['quantidade_itens'], 2)
+
+    def test_paginas_por_cursor(self):
+        ids, url = [], f'{self.url}?page_size=2'
+        while url:
+            resposta = self.cliente.get(url).json()
+            ids.extend(venda['id'] for venda in resposta['results'])
+            url = resposta['next']
+        self.assertEqual(ids, self.esperado)
+        self.assertEqual(self.cliente.get(self.url, {'cursor': 'xyz'}).status_code, 404)
+
+    def test_detalhe_com_itens(self):
+        with self.assertNumQueries(3):
+            resposta = self.cliente.get(reverse('caixa_pdv:venda-detail', args=[self.vendas[0].id]))
+        self.assertEqual(len(resposta.json()['itens']), 2)
+
+    def test_exclusao_devolve_o_estoque(self):
+        for venda in self.vendas:
+            self.assertEqual(self.cliente.delete(reverse('caixa_pdv:venda-detail', args=[venda.id])).status_code, 204)
+
+        self.lote.refresh_from_db()
+        self.assertEqual(self.lote.quantidade, 100)
+        self.assertFalse(Venda.objects.exists())
+        self.assertFalse(ResumoVendaDiaria.objects.exclude(quantidade=0).exists())
@@ -16,11 +16,32 @@ router.register(r'caixa', views.MovimentoCaixaViewSet)
 urlpatterns = [
     path('', views.pdv_view, name='pdv'),
     path('api/search-lotes/', views.search_lotes_api, name='search_lotes_api'), # <--- NOVA URL DA API
+    path('api/scan-lote/', views.scan_lote_api, name='scan_lote_api'),
+    path('api/scan-lotes/', views.scan_lotes_api, name='scan_lotes_api'),
+    path('api/estoque-alteracoes/', views.estoque_alteracoes_api, name='estoque_alteracoes_api'),
+    path('api/catalogo-lotes/', views.catalogo_lotes_api, name='catalogo_lotes_api'),
+    path('api/catalogo-lotes/alteracoes/', views.catalogo_alteracoes_api, name='catalogo_alteracoes_api'),
     path('api/finalizar-venda/', views.finalizar_venda_api, name='finalizar_venda_api'),
+    path('api/sincronizar-vendas/', views.sincronizar_vendas_api, name='sincronizar_vendas_api'),
     path('historico/', views.historico_vendas_view, name='historico_vendas'),
     path('api/search-vendas/', views.search_vendas_api, name='search_vendas_api'),
+    path('api/resumo-vendas/', views.resumo_vendas_api, name='resumo_vendas_api'),
+    path('exportar/vendas.csv', views.exportar_vendas_csv, name='exportar_vendas_csv'),
+    path('exportar/vendas.xlsx', views.exportar_vendas_xlsx, name='exportar_vendas_xlsx'),
+    path('api/cancelar-venda/<int:venda_id>/', views.cancelar_venda_api, name='cancelar_venda_api'),
     path('api/delete-venda/<int:venda_id>/', views.delete_venda_api, name='delete_venda_api'),
     path('termo-de-conformidade/<int:venda_id>/', views.gerar_termo_conformidade_pdf, name='termo_conformidade_pdf'),
+    path('recibo/<int:venda_id>/', views.recibo_venda, name='recibo_venda'),
+    path('api/imprimir-recibo/<int:venda_id>/', views.imprimir_recibo_api, name='imprimir_recibo_api'),
+    path('termos-de-conformidade/', views.gerar_termos_conformidade_lote, name='termos_conformidade_lote'),
+    path('api/tarefas/', views.criar_tarefa_api, name='criar_tarefa_api'),
+    path('api/tarefas/<int:tarefa_id>/', views.status_tarefa_api, name='status_tarefa_api'),
+    path('tarefas/<int:tarefa_id>/download/', views.download_tarefa, name='download_tarefa'),
     path('caixa/movimento/', views.caixa_movimento, name='caixa_movimento'),
+    path('api/movimentos-caixa/', views.movimentos_caixa_api, name='movimentos_caixa_api'),
+    path('sessao/abrir/', views.abrir_sessao_caixa, name='abrir_sessao_caixa'),
+    path('sessao/fechar/', views.fechar_sessao_caixa, name='fechar_sessao_caixa'),
+    path('api/sessao-caixa/', views.sessao_caixa_api, name='sessao_caixa_api'),
+    path('caixa/fechar/', views.fechar_caixa_view, name='fechar_caixa'),
     path('api/', include(router.urls)),
 ]
\ No newline at end of file
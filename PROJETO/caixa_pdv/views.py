@@ -1,43 +1,92 @@
 # viveiro_lagni/PROJETO/caixa_pdv/views.py
-from django.shortcuts import render
-from produtos.models import Produto 
-from lotes.models import Lote 
-from .models import Venda, ItemVenda, MovimentoCaixa 
+from django.shortcuts import render, redirect
+from lotes.models import Lote
+from .models import Venda, ItemVenda, MovimentoCaixa, FechamentoCaixa, TarefaDocumento, SessaoCaixa
 from django.http import JsonResponse
-from django.db.models import Q
+from django.db.models import Count, Prefetch, prefetch_related_objects
 from django.views.decorators.http import require_GET, require_POST
-from django.db import transaction
 import json
-from decimal import Decimal
+import logging
 from django.shortcuts import get_object_or_404
 from django.views.decorators.http import require_http_methods
 from django.utils import timezone
 import datetime
-from reportlab.lib.pagesizes import A4
-from reportlab.pdfgen import canvas
-from reportlab.lib.units import cm
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-from reportlab.lib import colors
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from django.http import HttpResponse
 from rest_framework import viewsets
-from .serializers import VendaSerializer, ItemVendaSerializer, MovimentoCaixaSerializer
-from django.db.models import Sum
+from .serializers import VendaSerializer, VendaResumoSerializer, ItemVendaSerializer, MovimentoCaixaSerializer
 from django.contrib import messages
-from django.shortcuts import render, redirect
-from lotes.models import Lote
 from lotes.serializers import LoteSerializer
+from .banco import transacao_com_retentativa
+from .services import finalizar_venda, finalizar_vendas_em_lote, apagar_venda, cancelar_venda
+from django.db import IntegrityError
+from .fechamento import fechar_caixa, gerar_fechamentos_pendentes, saldo_atual, extrato_movimentos
+from .paginacao import codificar_cursor, decodificar_cursor, filtro_antes, PaginacaoVendas
+from .busca import (
+    BUSCA_CACHE_TTL, BUSCA_LIMITE_MAXIMO, BUSCA_LIMITE_PADRAO, BUSCA_LOTES_BACKEND,
+    buscar_lotes_vendaveis, lote_para_pdv, lotes_por_codigo,
+)
+from lotes.models import versao_lotes, EventoEstoque
+import time
+from django.core.cache import cache
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+import hashlib
+from django.urls import reverse
+from django.conf import settings
+import tempfile
+from django.http import StreamingHttpResponse, FileResponse
+from .resumos import receita_por_dia, vendas_por_produto, receita_por_tipo, receita_por_forma_pagamento
+from .tarefas import criar_tarefa, nome_arquivo
+from .sessoes import abrir_sessao, fechar_sessao, sessao_aberta_id
+from .recibo import RECIBO_IMPRESSORA, carregar_venda, enviar_para_impressora, montar_recibo
+from .catalogo_local import alteracoes_catalogo, snapshot_catalogo, versao_catalogo
+from django.views.decorators.gzip import gzip_page
+from .termos import caminho_termo, vendas_para_termos, gerar_termos_zip
+from .exportacao import gerar_csv, linhas_vendas, periodo, salvar_xlsx
+
+logger = logging.getLogger(__name__)
 
 # A importação de 'clientes.models.Cliente' foi removida.
 
+# Chave da sessão do navegador com o id da sessão de caixa aberta neste terminal.
+SESSAO_CAIXA_CHAVE = 'pdv_sessao_caixa_id'
+
+def _sessao_caixa_id(request):
+    """Id da sessão de caixa aberta deste terminal; esquece a sessão se já foi fechada."""
+    sessao_id = sessao_aberta_id(request.session.get(SESSAO_CAIXA_CHAVE))
+    if sessao_id is None and SESSAO_CAIXA_CHAVE in request.session:
+        del request.session[SESSAO_CAIXA_CHAVE]
+    return sessao_id
+
+def _sessao_json(sessao):
+    return {
+        'id': sessao.id,
+        'terminal': sessao.terminal,
+        'operador': sessao.operador.get_username() if sessao.operador else None,
+        'aberta_em': sessao.aberta_em.isoformat(),
+        'fechada_em': sessao.fechada_em.isoformat() if sessao.fechada_em else None,
+        'valor_abertura': str(sessao.valor_abertura),
+        'quantidade_vendas': sessao.quantidade_vendas,
+        'total_vendas': str(sessao.total_vendas),
+        'total_dinheiro': str(sessao.total_dinheiro),
+        'total_entradas': str(sessao.total_entradas),
+        'total_retiradas': str(sessao.total_retiradas),
+        'saldo_esperado': str(sessao.saldo_esperado),
+    }
+
 def pdv_view(request):
     """
     Renderiza a interface principal do PDV.
     """
+    sessao_id = _sessao_caixa_id(request)
     context = {
         'page_title': 'Caixa PDV',
+        'sessao_caixa': SessaoCaixa.objects.select_related('operador').get(id=sessao_id) if sessao_id else None,
+        # Com impressora configurada, o recibo é impresso ao finalizar cada venda.
+        'imprimir_recibo': bool(RECIBO_IMPRESSORA),
+        'estoque_ao_vivo': getattr(settings, 'PDV_ESTOQUE_AO_VIVO', True),
+        # Busca feita no navegador sobre a cópia local dos lotes (catalogo_lotes_api).
+        'catalogo_local': getattr(settings, 'PDV_CATALOGO_LOCAL', True),
     }
     return render(request, 'caixa_pdv/pdv.html', context)
 
@@ -45,91 +94,278 @@ def pdv_view(request):
 def search_lotes_api(request):
     """
     API para buscar lotes por código do lote, variedade do produto ou tipo do produto.
+    Usa o índice em memória de caixa_pdv.busca (sem acentos, ordenado por relevância).
+
+    Aceita 'limit' (padrão PDV_BUSCA_LIMITE_PADRAO, máximo PDV_BUSCA_LIMITE_MAXIMO)
+    e 'cursor' (valor de 'proximo_cursor' da página anterior). A resposta leva um
+    ETag derivado da versão da tabela de lotes: repetições da mesma busca recebem
+    304 ou a resposta guardada em cache por alguns segundos.
     """
     query = request.GET.get('query', '').strip()
-    lotes_data = []
-
-    if query:
-        lotes = Lote.objects.filter(
-            Q(codigo__icontains=query) |
-            Q(produto__variedade__icontains=query) |
-            Q(produto__tipo__icontains=query)
-        ).select_related('produto').distinct()
-
-        for lote in lotes:
-            imagem_url = None
-            if lote.produto and lote.produto.imagem:
-                try:
-                    imagem_url = lote.produto.imagem.url
-                except ValueError:
-                    imagem_url = None
-                except Exception as e:
-                    print(f"Erro ao obter URL da imagem para produto {lote.produto.id}: {e}")
-                    imagem_url = None
-
-            lotes_data.append({
-                'id': lote.id,
-                'codigo_lote': lote.codigo,
-                'quantidade_estoque': lote.quantidade,
-                'preco_unitario': str(lote.preco_unitario),
-                'nome_produto': lote.produto.variedade if lote.produto and lote.produto.variedade else (lote.produto.get_tipo_display() if lote.produto else 'Produto Desconhecido'),
-                'imagem_produto_url': imagem_url,
-            })
-    
-    return JsonResponse({'lotes': lotes_data})
+    try:
+        limite = int(request.GET.get('limit', BUSCA_LIMITE_PADRAO))
+        inicio = int(request.GET.get('cursor') or 0)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': "Parâmetros 'limit' e 'cursor' devem ser números inteiros."}, status=400)
+    limite = min(max(limite, 1), BUSCA_LIMITE_MAXIMO)
+    inicio = max(inicio, 0)
+
+    chave = f"{versao_lotes()}:{BUSCA_LOTES_BACKEND}:{limite}:{inicio}:{query}"
+    etag = '"' + hashlib.md5(chave.encode('utf-8')).hexdigest() + '"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        cache_key = f"pdv:search_lotes:{etag}"
+        dados = cache.get(cache_key)
+        if dados is None:
+            dados = {'lotes': [], 'total_estimado': 0, 'proximo_cursor': None}
+            if query:
+                lotes, total_estimado, proxima_posicao = buscar_lotes_vendaveis(query, limite, inicio)
+                dados = {
+                    'lotes': [lote_para_pdv(lote) for lote in lotes],
+                    'total_estimado': total_estimado,
+                    'proximo_cursor': str(proxima_posicao) if proxima_posicao is not None else None,
+                }
+            cache.set(cache_key, dados, BUSCA_CACHE_TTL)
+        response = JsonResponse(dados)
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+@require_GET
+def scan_lote_api(request):
+    """
+    Leitura de código de barras: busca exata de um lote pelo código impresso na
+    etiqueta (Code128 de Lote.codigo), pelo índice único do campo.
+    """
+    codigo = request.GET.get('codigo', '').strip()
+    if not codigo:
+        return JsonResponse({'success': False, 'message': 'Informe o código do lote.'}, status=400)
+
+    lote_data = lotes_por_codigo([codigo]).get(codigo)
+    if lote_data is None:
+        return JsonResponse({'success': False, 'message': f"Lote '{codigo}' não encontrado."}, status=404)
+    return JsonResponse({'success': True, 'lote': lote_data})
 
 @require_POST
-def finalizar_venda_api(request):
+def scan_lotes_api(request):
     """
-    Finaliza uma venda, criando a Venda e os Itens de Venda,
-    e deduzindo a quantidade dos lotes correspondentes.
+    Versão em lote da leitura de código de barras: resolve uma lista de códigos
+    lidos numa única chamada (e numa única consulta para os que não estão em cache).
     """
     try:
         data = json.loads(request.body)
-        itens_venda = data.get('itens', [])
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'Requisição inválida: O corpo da requisição não é um JSON válido.'}, status=400)
 
-        if not itens_venda:
-            return JsonResponse({'success': False, 'message': 'Nenhum item na venda para finalizar.'}, status=400)
+    codigos = data.get('codigos', [])
+    if not isinstance(codigos, list):
+        return JsonResponse({'success': False, 'message': "O campo 'codigos' deve ser uma lista."}, status=400)
 
-        with transaction.atomic():
-            nova_venda = Venda.objects.create(status='finalizada')
+    codigos = [str(codigo).strip() for codigo in codigos if str(codigo).strip()]
+    encontrados = lotes_por_codigo(codigos)
+    return JsonResponse({
+        'success': True,
+        'lotes': [encontrados[codigo] for codigo in codigos if codigo in encontrados],
+        'nao_encontrados': [codigo for codigo in codigos if codigo not in encontrados],
+    })
 
-            for item_data in itens_venda:
-                lote_id = item_data.get('lote_id')
-                quantidade_solicitada = int(item_data.get('quantidade'))
-                preco_unitario = item_data.get('preco_unitario')
+CATALOGO_CACHE_TTL = getattr(settings, 'PDV_CATALOGO_CACHE_TTL', 60)
 
-                if not all([lote_id, quantidade_solicitada, preco_unitario is not None]):
-                    raise ValueError("Dados incompletos ou inválidos para um item da venda.")
-                
-                try:
-                    preco_unitario_decimal = Decimal(str(preco_unitario))
-                except Exception:
-                    raise ValueError(f"Preço unitário inválido para item do lote {lote_id}.")
+@require_GET
+@gzip_page
+def catalogo_lotes_api(request):
+    """
+    Snapshot do catálogo local do PDV: todos os lotes vendáveis em formato
+    compacto (ver caixa_pdv.catalogo_local) e a versão para sincronizar depois
+    com catalogo_alteracoes_api. O ETag é a versão: sem alterações, 304.
+    """
+    versao = versao_catalogo()
+    etag = f'"catalogo-{versao}"'
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        cache_key = f"pdv:catalogo:{versao}"
+        dados = cache.get(cache_key)
+        if dados is None:
+            dados = snapshot_catalogo()
+            cache.set(cache_key, dados, CATALOGO_CACHE_TTL)
+        response = JsonResponse(dados)
+
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
-                # Obtenha o objeto Lote usando o lote_id
-                lote_do_item = Lote.objects.select_for_update().get(id=lote_id)
+@require_GET
+@gzip_page
+def catalogo_alteracoes_api(request):
+    """
+    Lotes alterados desde a versão do terminal (?desde=). Com 'recarregar'
+    na resposta, o terminal deve baixar o snapshot de novo.
+    """
+    try:
+        desde = int(request.GET.get('desde', ''))
+    except ValueError:
+        return JsonResponse({'success': False, 'message': "Parâmetro 'desde' deve ser um número inteiro."}, status=400)
+    return JsonResponse(alteracoes_catalogo(max(desde, 0)))
+
+# Espera máxima de cada consulta (long-poll curto) e pausa sugerida ao terminal
+# antes da próxima: um worker síncrono fica preso no máximo ESTOQUE_ESPERA segundos.
+ESTOQUE_ESPERA = getattr(settings, 'PDV_ESTOQUE_ESPERA', 2.0)
+ESTOQUE_INTERVALO = getattr(settings, 'PDV_ESTOQUE_INTERVALO', 0.5)
+ESTOQUE_RETRY_MS = getattr(settings, 'PDV_ESTOQUE_RETRY_MS', 3000)
+ESTOQUE_LOTE = 500
+
+def _eventos_estoque_depois(ultimo_id):
+    return list(
+        EventoEstoque.objects.filter(id__gt=ultimo_id).order_by('id')
+        .values_list('id', 'lote_id', 'quantidade')[:ESTOQUE_LOTE]
+    )
 
-                if lote_do_item.quantidade < quantidade_solicitada:
-                    raise ValueError(f"Estoque insuficiente para o lote '{lote_do_item.codigo}'. Disponível: {lote_do_item.quantidade}, Solicitado: {quantidade_solicitada}.")
+@require_GET
+def estoque_alteracoes_api(request):
+    """
+    Alterações de estoque dos lotes depois do evento 'desde', para os terminais
+    manterem resultados de busca e carrinho atualizados sem refazer consultas.
+
+    Long-poll curto: sem eventos novos, espera até ESTOQUE_ESPERA segundos
+    (consultando a cada ESTOQUE_INTERVALO) e responde vazio. 'retry' é a pausa,
+    em milissegundos, antes da próxima consulta. Sem 'desde', devolve só o
+    último id. Cada volta da espera lê só o último id (versao_catalogo); os
+    eventos são lidos uma vez, quando ele passa de 'desde'. Só lê: os eventos
+    antigos são apagados na gravação (registrar_eventos_estoque).
+    """
+    ultimo_existente = versao_catalogo()
+    resposta = {'ultimo': ultimo_existente, 'lotes': {}, 'recarregar': False, 'retry': ESTOQUE_RETRY_MS}
+    try:
+        ultimo_id = int(request.GET.get('desde', ''))
+    except ValueError:
+        return JsonResponse(resposta)
+    if ultimo_id > ultimo_existente:
+        return JsonResponse(resposta)
+    mais_antigo = EventoEstoque.objects.order_by('id').values_list('id', flat=True).first()
+    if mais_antigo is not None and mais_antigo > ultimo_id + 1:
+        # Eventos já descartados: o terminal precisa refazer a busca.
+        resposta['recarregar'] = True
+        return JsonResponse(resposta)
+
+    fim = time.monotonic() + ESTOQUE_ESPERA
+    while ultimo_existente <= ultimo_id and time.monotonic() + ESTOQUE_INTERVALO <= fim:
+        time.sleep(ESTOQUE_INTERVALO)
+        ultimo_existente = versao_catalogo()
+    eventos = _eventos_estoque_depois(ultimo_id) if ultimo_existente > ultimo_id else []
+
+    resposta['ultimo'] = eventos[-1][0] if eventos else ultimo_id
+    resposta['lotes'] = {str(lote_id): quantidade for _, lote_id, quantidade in eventos}
+    if len(eventos) == ESTOQUE_LOTE:
+        # Há mais eventos na fila: o terminal consulta de novo em seguida.
+        resposta['retry'] = 0
+    return JsonResponse(resposta)
 
-                subtotal_item = preco_unitario_decimal * quantidade_solicitada
+@require_POST
+def abrir_sessao_caixa(request):
+    """
+    Abre uma sessão de caixa neste terminal com o troco inicial informado.
+    """
+    if _sessao_caixa_id(request):
+        messages.error(request, 'Este terminal já tem uma sessão de caixa aberta.')
+        return redirect('caixa_pdv:pdv')
+    try:
+        sessao = abrir_sessao(
+            request.POST.get('terminal'),
+            request.POST.get('valor_abertura') or '0',
+            operador=request.user if request.user.is_authenticated else None,
+        )
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('caixa_pdv:pdv')
+    request.session[SESSAO_CAIXA_CHAVE] = sessao.id
+    messages.success(request, f'Sessão de caixa #{sessao.id} aberta no terminal {sessao.terminal}.')
+    return redirect('caixa_pdv:pdv')
+
+@require_http_methods(["GET", "POST"])
+def fechar_sessao_caixa(request):
+    """
+    Conferência e fechamento da sessão de caixa do terminal: mostra os totais
+    mantidos durante a sessão e grava o valor contado e a diferença.
+    """
+    sessao_id = _sessao_caixa_id(request)
+    if sessao_id is None:
+        messages.error(request, 'Nenhuma sessão de caixa aberta neste terminal.')
+        return redirect('caixa_pdv:pdv')
 
-                ItemVenda.objects.create(
-                    venda=nova_venda,
-                    produto=lote_do_item.produto,
-                    quantidade=quantidade_solicitada,
-                    preco_unitario_vendido=preco_unitario_decimal,
-                    subtotal=subtotal_item,
-                    lote=lote_do_item  # Usamos a variável que acabamos de definir
-                )
+    if request.method == 'POST':
+        try:
+            sessao = fechar_sessao(sessao_id, request.POST.get('valor_contado', ''), request.POST.get('observacoes', ''))
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('caixa_pdv:fechar_sessao_caixa')
+        del request.session[SESSAO_CAIXA_CHAVE]
+        messages.success(
+            request,
+            f'Sessão #{sessao.id} fechada. Esperado R$ {sessao.saldo_esperado:.2f}, contado R$ {sessao.valor_contado:.2f}, diferença R$ {sessao.diferenca:.2f}.',
+        )
+        return redirect('caixa_pdv:pdv')
 
-                lote_do_item.quantidade -= quantidade_solicitada
-                lote_do_item.save()
+    context = {
+        'page_title': 'Fechar Sessão de Caixa',
+        'sessao': SessaoCaixa.objects.select_related('operador').get(id=sessao_id),
+    }
+    return render(request, 'caixa_pdv/fechar_sessao.html', context)
+
+@require_GET
+def sessao_caixa_api(request):
+    """
+    Totais correntes da sessão de caixa do terminal (uma leitura da linha da sessão).
+    """
+    sessao_id = _sessao_caixa_id(request)
+    if sessao_id is None:
+        return JsonResponse({'success': True, 'sessao': None})
+    sessao = SessaoCaixa.objects.select_related('operador').get(id=sessao_id)
+    return JsonResponse({'success': True, 'sessao': _sessao_json(sessao)})
 
-            nova_venda.calcular_total()
-            nova_venda.save()
+@require_POST
+def finalizar_venda_api(request):
+    """
+    Finaliza uma venda, criando a Venda e os Itens de Venda,
+    e deduzindo a quantidade dos lotes correspondentes.
 
+    O pagamento pode ser dividido: 'pagamentos' é uma lista de
+    {'forma': 'dinheiro'|'pix'|'cartao', 'valor': ...} que soma o total da
+    venda. Sem ela, o total é pago em 'forma_pagamento' (padrão: dinheiro).
+    """
+    try:
+        data = json.loads(request.body)
+        itens_venda = data.get('itens', [])
+
+        # Chave gerada pelo PDV: um reenvio da mesma venda devolve a venda já gravada.
+        chave = str(data.get('chave_idempotencia') or '').strip()[:64] or None
+
+        if not itens_venda:
+            return JsonResponse({'success': False, 'message': 'Nenhum item na venda para finalizar.'}, status=400)
+
+        if chave:
+            existente = Venda.objects.filter(chave_idempotencia=chave).values_list('id', flat=True).first()
+            if existente is not None:
+                return JsonResponse({'success': True, 'message': 'Venda já registrada.', 'venda_id': existente, 'duplicada': True})
+
+        try:
+            nova_venda = transacao_com_retentativa(finalizar_venda)(
+                itens_venda,
+                pagamentos=data.get('pagamentos'),
+                forma_pagamento=data.get('forma_pagamento'),
+                chave_idempotencia=chave,
+                sessao_id=_sessao_caixa_id(request),
+            )
+        except IntegrityError:
+            # Reenvio concorrente: o outro pedido gravou a venda primeiro.
+            existente = Venda.objects.filter(chave_idempotencia=chave).values_list('id', flat=True).first() if chave else None
+            if existente is None:
+                raise
+            return JsonResponse({'success': True, 'message': 'Venda já registrada.', 'venda_id': existente, 'duplicada': True})
+
+        gerar_fechamentos_pendentes()
         return JsonResponse({'success': True, 'message': 'Venda finalizada com sucesso!', 'venda_id': nova_venda.id})
 
     except Lote.DoesNotExist:
@@ -138,35 +374,97 @@ def finalizar_venda_api(request):
         return JsonResponse({'success': False, 'message': str(e)}, status=400)
     except json.JSONDecodeError:
         return JsonResponse({'success': False, 'message': 'Requisição inválida: O corpo da requisição não é um JSON válido.'}, status=400)
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Erro inesperado ao finalizar a venda.")
         return JsonResponse({'success': False, 'message': 'Ocorreu um erro interno inesperado ao finalizar a venda. Por favor, tente novamente.'}, status=500)
 
+SINCRONIZACAO_LIMITE = 200
+
+@require_POST
+def sincronizar_vendas_api(request):
+    """
+    Recebe de uma vez as vendas enfileiradas por um terminal, cada uma com sua
+    chave de idempotência, e responde com o resultado de cada venda.
+    Vendas já gravadas (reenvios) não são duplicadas.
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'Requisição inválida: O corpo da requisição não é um JSON válido.'}, status=400)
+
+    vendas = data.get('vendas') if isinstance(data, dict) else None
+    if not isinstance(vendas, list) or not vendas:
+        return JsonResponse({'success': False, 'message': "O campo 'vendas' deve ser uma lista não vazia."}, status=400)
+    if len(vendas) > SINCRONIZACAO_LIMITE:
+        return JsonResponse({'success': False, 'message': f'Envie no máximo {SINCRONIZACAO_LIMITE} vendas por vez.'}, status=400)
+
+    resultados = transacao_com_retentativa(finalizar_vendas_em_lote)(vendas, sessao_id=_sessao_caixa_id(request))
+    gerar_fechamentos_pendentes()
+
+    return JsonResponse({'success': all(resultado['success'] for resultado in resultados), 'resultados': resultados})
+
+EXTRATO_LIMITE = 20
+EXTRATO_LIMITE_MAXIMO = 100
+
 def historico_vendas_view(request):
     """
     Renderiza a página de histórico de vendas e calcula o saldo do caixa.
     """
-    # 1. Calcular o total de entradas no caixa (total das vendas)
-    total_vendas = Venda.objects.aggregate(Sum('total_venda'))['total_venda__sum'] or 0
-
-    # 2. Calcular o total de retiradas do caixa
-    total_retiradas = MovimentoCaixa.objects.filter(tipo='retirada').aggregate(Sum('valor'))['valor__sum'] or 0
-    
-    # 3. Calcular o saldo atual
-    saldo_caixa = total_vendas - total_retiradas
+    # O saldo parte do último fechamento de caixa e soma apenas o movimento
+    # posterior a ele (vendas, entradas e retiradas). Só leitura: os fechamentos
+    # diários são gerados depois das vendas e movimentos (gerar_fechamentos_pendentes).
+    saldo_caixa = saldo_atual()
 
-    # 4. Obter o extrato dos movimentos do caixa para exibir
-    movimentos_caixa = MovimentoCaixa.objects.all().order_by('-data_hora')
+    # Apenas a primeira página do extrato; as seguintes vêm de movimentos_caixa_api.
+    movimentos_caixa, proximo_cursor = extrato_movimentos(limite=EXTRATO_LIMITE)
 
     context = {
         'page_title': 'Histórico de Vendas',
         'saldo_caixa': saldo_caixa,
+        'ultimo_fechamento': FechamentoCaixa.objects.filter(tipo='turno').order_by('-periodo_fim').first(),
         'movimentos_caixa': movimentos_caixa,
+        'proximo_cursor_movimentos': proximo_cursor,
         # Você pode adicionar outras informações de contexto aqui, como a lista de vendas, se necessário
     }
     return render(request, 'caixa_pdv/historico_vendas.html', context)
 
+@require_GET
+def movimentos_caixa_api(request):
+    """
+    Extrato do caixa paginado por cursor (data_hora, id), com o saldo acumulado
+    de entradas e retiradas após cada movimento. Usado na rolagem infinita.
+    """
+    try:
+        limite = min(max(int(request.GET.get('limit', EXTRATO_LIMITE)), 1), EXTRATO_LIMITE_MAXIMO)
+        movimentos, proximo_cursor = extrato_movimentos(request.GET.get('cursor') or None, limite)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Parâmetros de paginação inválidos.'}, status=400)
+
+    return JsonResponse({
+        'movimentos': [
+            {
+                'id': movimento.id,
+                'data_hora': timezone.localtime(movimento.data_hora).strftime('%d/%m/%Y %H:%M'),
+                'tipo': movimento.tipo,
+                'tipo_display': movimento.get_tipo_display(),
+                'valor': float(movimento.valor),
+                'descricao': movimento.descricao or '',
+                'saldo_apos': float(movimento.saldo_apos),
+            }
+            for movimento in movimentos
+        ],
+        'proximo_cursor': proximo_cursor,
+    })
+
+@require_POST
+def fechar_caixa_view(request):
+    """
+    Fecha o turno do caixa, gravando os totais desde o último fechamento.
+    """
+    fechamento = fechar_caixa(tipo='turno')
+    messages.success(request, f'Caixa fechado com saldo de R$ {fechamento.saldo:.2f}.')
+    return redirect('caixa_pdv:historico_vendas')
+
 @require_POST
 def caixa_movimento(request):
     """
@@ -178,34 +476,126 @@ def caixa_movimento(request):
 
         if valor <= 0:
             messages.error(request, 'O valor da retirada deve ser maior que zero.')
-            return redirect('historico_vendas') # Redirecione para a URL correta
+            return redirect('caixa_pdv:historico_vendas')
 
         # Crie o novo registo de movimento de caixa
         MovimentoCaixa.objects.create(
             tipo='retirada',
             valor=valor,
-            descricao=descricao
+            descricao=descricao,
+            sessao_id=_sessao_caixa_id(request),
         )
+        gerar_fechamentos_pendentes()
         messages.success(request, f'Retirada de R$ {valor:.2f} realizada com sucesso!')
     except (ValueError, TypeError):
         messages.error(request, 'Valor inválido para a retirada.')
     
-    return redirect('historico_vendas') # Redirecione para a URL correta
+    return redirect('caixa_pdv:historico_vendas')
+
+VENDAS_LIMITE_MAXIMO = 100
+
+def _periodo_exportacao(request):
+    """Lê start_date/end_date (YYYY-MM-DD, inclusive). Levanta ValueError se inválidas."""
+    datas = [
+        datetime.datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+        for valor in (request.GET.get('start_date'), request.GET.get('end_date'))
+    ]
+    return periodo(*datas)
+
+AGRUPAMENTOS_RESUMO = {
+    'dia': receita_por_dia,
+    'produto': vendas_por_produto,
+    'tipo': receita_por_tipo,
+    'pagamento': receita_por_forma_pagamento,
+}
+
+@require_GET
+def resumo_vendas_api(request):
+    """
+    Totais de vendas finalizadas no período, a partir dos resumos diários,
+    agrupados por dia, produto, tipo de produto ou dia e forma de pagamento
+    (?agrupar=dia|produto|tipo|pagamento).
+    """
+    consulta = AGRUPAMENTOS_RESUMO.get(request.GET.get('agrupar', 'dia'))
+    if consulta is None:
+        return JsonResponse({'success': False, 'message': "Agrupamento inválido. Use 'dia', 'produto', 'tipo' ou 'pagamento'."}, status=400)
+    try:
+        datas = [
+            datetime.datetime.strptime(valor, '%Y-%m-%d').date() if valor else None
+            for valor in (request.GET.get('start_date'), request.GET.get('end_date'))
+        ]
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Formato de data inválido. Use YYYY-MM-DD.'}, status=400)
+
+    linhas = []
+    for linha in consulta(*datas):
+        linha['total_receita'] = f"{linha['total_receita']:.2f}"
+        if 'data' in linha:
+            linha['data'] = linha['data'].strftime('%d/%m/%Y')
+        linhas.append(linha)
+    return JsonResponse({'success': True, 'linhas': linhas})
+
+@require_GET
+def exportar_vendas_csv(request):
+    """
+    Exporta as vendas do período em CSV, transmitido à medida que as linhas
+    são lidas do banco.
+    """
+    try:
+        inicio, fim = _periodo_exportacao(request)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Formato de data inválido. Use YYYY-MM-DD.'}, status=400)
+
+    response = StreamingHttpResponse(gerar_csv(linhas_vendas(inicio, fim)), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = 'attachment; filename="vendas.csv"'
+    return response
+
+@require_GET
+def exportar_vendas_xlsx(request):
+    """
+    Exporta as vendas do período em XLSX. A planilha é montada em modo
+    write-only num arquivo temporário e enviada em blocos.
+    """
+    try:
+        inicio, fim = _periodo_exportacao(request)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Formato de data inválido. Use YYYY-MM-DD.'}, status=400)
+
+    arquivo = tempfile.TemporaryFile()
+    salvar_xlsx(linhas_vendas(inicio, fim), arquivo)
+    arquivo.seek(0)
+    return FileResponse(
+        arquivo,
+        as_attachment=True,
+        filename='vendas.xlsx',
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    )
 
 @require_GET
 def search_vendas_api(request):
     """
-    API para buscar vendas no histórico com filtros.
+    API para buscar vendas no histórico com filtros, paginada por cursor sobre
+    (data_venda, id). Cada página custa duas consultas (vendas e itens com
+    produto e lote); a contagem total só é feita com 'incluir_total=1'.
     """
     start_date_str = request.GET.get('start_date')
     end_date_str = request.GET.get('end_date')
     # O filtro de cliente foi removido
     venda_id_query = request.GET.get('venda_id')
-    page = int(request.GET.get('page', 1))
-    page_size = int(request.GET.get('page_size', 10))
+    status_query = request.GET.get('status', 'finalizada')
+    cursor = request.GET.get('cursor')
+    incluir_total = request.GET.get('incluir_total') == '1'
+    try:
+        page_size = min(max(int(request.GET.get('page_size', 10)), 1), VENDAS_LIMITE_MAXIMO)
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Tamanho de página inválido.'}, status=400)
 
-    # select_related e prefetch_related foram ajustados para remover a dependência de 'cliente'
-    vendas = Venda.objects.prefetch_related('itens').all()
+    # Por padrão só as vendas ativas, pelo índice parcial venda_ativa_data_id_idx.
+    vendas = Venda.objects.all()
+    if status_query in ('finalizada', 'cancelada'):
+        vendas = vendas.filter(status=status_query)
+    elif status_query != 'todas':
+        return JsonResponse({'success': False, 'message': "Status inválido. Use 'finalizada', 'cancelada' ou 'todas'."}, status=400)
 
     if start_date_str:
         try:
@@ -231,12 +621,27 @@ def search_vendas_api(request):
         except ValueError:
             return JsonResponse({'success': False, 'message': 'ID da venda inválido.'}, status=400)
 
-    vendas = vendas.order_by('-data_venda')
+    total_vendas = vendas.count() if incluir_total else None
 
-    total_vendas = vendas.count()
-    offset = (page - 1) * page_size
-    limit = offset + page_size
-    vendas_paginadas = vendas[offset:limit]
+    if cursor:
+        try:
+            vendas = vendas.filter(filtro_antes('data_venda', *decodificar_cursor(cursor)))
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'Cursor inválido.'}, status=400)
+
+    # Busca um item a mais só para saber se há próxima página; os itens são
+    # carregados depois, apenas para as vendas exibidas.
+    vendas_paginadas = list(vendas.order_by('-data_venda', '-id')[:page_size + 1])
+    proximo_cursor = None
+    if len(vendas_paginadas) > page_size:
+        vendas_paginadas = vendas_paginadas[:page_size]
+        ultima = vendas_paginadas[-1]
+        proximo_cursor = codificar_cursor(ultima.data_venda, ultima.id)
+    prefetch_related_objects(
+        vendas_paginadas,
+        Prefetch('itens', queryset=ItemVenda.objects.select_related('produto', 'lote')),
+        'pagamentos',
+    )
 
     vendas_data = []
     for venda in vendas_paginadas:
@@ -244,7 +649,7 @@ def search_vendas_api(request):
         for item in venda.itens.all():
             itens_data.append({
                 'produto_nome': item.produto.variedade,
-                'lote_codigo': item.lote.codigo if hasattr(item, 'lote') and item.lote else 'N/A',
+                'lote_codigo': item.lote.codigo if item.lote else 'N/A',
                 'quantidade': item.quantidade,
                 'preco_unitario_vendido': str(item.preco_unitario_vendido),
                 'subtotal': str(item.subtotal),
@@ -254,7 +659,8 @@ def search_vendas_api(request):
             'data_venda': timezone.localtime(venda.data_venda).strftime('%d/%m/%Y %H:%M:%S'),
             # A referência ao cliente foi removida
             'nome_cliente': 'Não Informado', 
-            'forma_pagamento': venda.forma_pagamento.capitalize() if hasattr(venda, 'forma_pagamento') and venda.forma_pagamento else 'N/A',
+            'forma_pagamento': venda.forma_pagamento or 'N/A',
+            'pagamentos': [{'forma': pagamento.forma, 'valor': str(pagamento.valor)} for pagamento in venda.pagamentos.all()],
             'total_venda': str(venda.total_venda),
             'status': venda.status.capitalize(),
             'observacoes': venda.observacoes if hasattr(venda, 'observacoes') and venda.observacoes else 'N/A',
@@ -265,154 +671,216 @@ def search_vendas_api(request):
         'success': True,
         'vendas': vendas_data,
         'total_vendas': total_vendas,
-        'total_paginas': (total_vendas + page_size - 1) // page_size,
-        'pagina_atual': page,
+        'total_paginas': (total_vendas + page_size - 1) // page_size if total_vendas is not None else None,
+        'proximo_cursor': proximo_cursor,
     })
 
 @require_http_methods(["DELETE"])
-@transaction.atomic
 def delete_venda_api(request, venda_id):
     """
-    API para apagar uma venda e seus itens associados.
+    API para apagar uma venda e seus itens associados, devolvendo o estoque.
     """
     try:
-        venda = get_object_or_404(Venda, id=venda_id)
-        for item in venda.itens.all():
-            if item.lote:
-                lote = Lote.objects.select_for_update().get(id=item.lote.id)
-                lote.quantidade += item.quantidade
-                lote.save()
-            else:
-                print(f"Aviso: Lote (ID {item.lote_id}) não encontrado para restauração de estoque na Venda {venda_id}.")
+        transacao_com_retentativa(apagar_venda)(venda_id)
 
-        venda_id_apagada = venda.id
-        venda.delete()
+        return JsonResponse({'success': True, 'message': f'Venda #{venda_id} apagada com sucesso e estoque restaurado.'})
 
-        return JsonResponse({'success': True, 'message': f'Venda #{venda_id_apagada} apagada com sucesso e estoque restaurado.'})
+    except Venda.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Venda não encontrada.'}, status=404)
+    except Exception:
+        logger.exception("Erro inesperado ao apagar a venda #%s.", venda_id)
+        return JsonResponse({'success': False, 'message': 'Ocorreu um erro interno inesperado ao apagar a venda. Por favor, tente novamente.'}, status=500)
 
+@require_POST
+def cancelar_venda_api(request, venda_id):
+    """
+    API para cancelar uma venda: o estoque é devolvido e a venda fica no
+    histórico com status 'cancelada'.
+    """
+    try:
+        transacao_com_retentativa(cancelar_venda)(venda_id)
     except Venda.DoesNotExist:
         return JsonResponse({'success': False, 'message': 'Venda não encontrada.'}, status=404)
-    except Exception as e:
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({'success': False, 'message': f'Ocorreu um erro ao apagar a venda: {str(e)}'}, status=500)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    return JsonResponse({'success': True, 'message': f'Venda #{venda_id} cancelada e estoque restaurado.'})
 
 def gerar_termo_conformidade_pdf(request, venda_id):
     """
     Gera um PDF de Termo de Conformidade para uma venda específica.
+    O PDF vem do cache em disco quando a venda não mudou desde a última geração.
     """
-    try:
-        # 1. SUBSTITUA 'NOME_DO_CAMPO_CORRETO_AQUI' PELO NOME DO CAMPO NO SEU MODELO Venda.
-        #    Exemplo: se o campo se chama 'comprador', a linha ficaria:
-        #    venda = get_object_or_404(Venda.objects.select_related('comprador'), pk=venda_id)
-        venda = get_object_or_404(Venda.objects.select_related('NOME_DO_CAMPO_CORRETO_AQUI'), pk=venda_id)
-        itens_venda = ItemVenda.objects.filter(venda=venda).select_related('produto', 'lote')
-
-        response = HttpResponse(content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="termo_conformidade_venda_{venda.id}.pdf"'
-
-        doc = SimpleDocTemplate(response, pagesize=A4, rightMargin=2*cm, leftMargin=2*cm, topMargin=2.5*cm, bottomMargin=2.5*cm)
-        story = []
-        styles = getSampleStyleSheet()
-
-        styles.add(ParagraphStyle(name='TitleStyle', fontSize=18, leading=22, alignment=1, fontName='Helvetica', spaceAfter=6))
-        styles.add(ParagraphStyle(name='HeaderInfo', fontSize=10, leading=12, alignment=1, fontName='Helvetica', spaceAfter=0))
-        styles.add(ParagraphStyle(name='SubTitleStyle', fontSize=14, leading=18, alignment=1, fontName='Helvetica', spaceAfter=12))
-        styles.add(ParagraphStyle(name='BodyTextCustom', fontSize=12, leading=14, fontName='Helvetica', spaceAfter=6))
-        styles.add(ParagraphStyle(name='TableHeading', fontSize=10, leading=12, fontName='Helvetica-Bold', alignment=1))
-        styles.add(ParagraphStyle(name='TableCell', fontSize=10, leading=12, fontName='Helvetica', alignment=0))
-
-        story.append(Paragraph("Viveiro Lagni", styles['TitleStyle']))
-        story.append(Paragraph("Rua Santa Rita, nº 595 - Centro", styles['HeaderInfo']))
-        story.append(Paragraph("Chapecó - SC, CEP 89801-081", styles['HeaderInfo']))
-        story.append(Paragraph("Fone: (49) 3328-5690 / (49) 99990-2550", styles['HeaderInfo']))
-        story.append(Paragraph("E-mail: viveiro@lagnimudas.com.br", styles['HeaderInfo']))
-        story.append(Spacer(1, 0.5*cm))
-
-        story.append(Paragraph("Termo de Conformidade de Produtos", styles['SubTitleStyle']))
-        story.append(Spacer(1, 0.5*cm))
-
-        # Dados da Venda e Cliente
-        # 2. SUBSTITUA 'venda.cliente' pelo nome real do campo
-        cliente_obj = getattr(venda, 'NOME_DO_CAMPO_CORRETO_AQUI', None)
-        if cliente_obj:
-            nome = getattr(cliente_obj, 'nome_completo', None) or getattr(cliente_obj, 'nome', 'Não informado')
-            cpf_cnpj = getattr(cliente_obj, 'cpf_cnpj', 'Não informado')
-            endereco = getattr(cliente_obj, 'endereco', 'Não informado')
-            cidade = getattr(cliente_obj, 'cidade', 'Não informado')
-            estado = getattr(cliente_obj, 'estado', 'Não informado')
-
-            cliente_info = f'<b>Cliente:</b> {nome}<br/>'
-            cliente_info += f'<b>Documento:</b> {cpf_cnpj}<br/>'
-            cliente_info += f'<b>Endereço:</b> {endereco}, {cidade} - {estado}<br/>'
-        else:
-            cliente_info = "<b>Cliente:</b> Cliente não especificado<br/>"
-
-        cliente_info += f'<b>ID da Venda:</b> {venda.id}<br/>'
-        cliente_info += f'<b>Data da Venda:</b> {venda.data_venda.strftime("%d/%m/%Y")}<br/>'
-
-        story.append(Paragraph(cliente_info, styles['BodyTextCustom']))
-        story.append(Spacer(1, 0.5*cm))
-
-        data = [['ID', 'Produto', 'Lote', 'Quantidade', 'Preço Unitário', 'Subtotal']]
-        for item in itens_venda:
-            data.append([
-                str(item.id),
-                item.produto.variedade if item.produto else 'N/A',
-                item.lote.codigo if item.lote else 'N/A',
-                f"{item.quantidade}",
-                f"R$ {item.preco_unitario_vendido}",
-                f"R$ {item.subtotal}"
-            ])
-
-        table_style = TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6D4C41')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#E0E0D4')),
-            ('BOX', (0, 0), (-1, -1), 1, colors.HexColor('#E0E0D4')),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.HexColor('#F8F4E3')),
-        ])
-
-        col_widths = [1*cm, 5*cm, 2.5*cm, 2.5*cm, 3*cm, 3*cm]
-        table = Table(data, colWidths=col_widths)
-        table.setStyle(table_style)
-        story.append(table)
-        story.append(Spacer(1, 0.5*cm))
-
-        story.append(Paragraph(f'<b>Total da Venda:</b> R$ {venda.total_venda}', styles['BodyTextCustom']))
-        story.append(Paragraph(f'<b>Forma de Pagamento:</b> {venda.forma_pagamento}', styles['BodyTextCustom']))
-        story.append(Paragraph(f'<b>Observações da Venda:</b> {venda.observacoes}', styles['BodyTextCustom']))
-        story.append(Spacer(1, 1*cm))
-
-        termo = """
-        <br/><b>Termo de Conformidade</b><br/><br/>
-        Declaro, para os devidos fins, que os produtos listados acima foram inspecionados no ato da compra e se encontram em plenas condições de sanidade e vigor, de acordo com as informações fornecidas e as normas de qualidade do Viveiro Lagni. O cliente é responsável por seguir as instruções de plantio e cuidado para garantir o desenvolvimento saudável das plantas.
-        <br/><br/><br/><br/>
-        __________________________________<br/>
-        Assinatura do Cliente
-        <br/><br/><br/>
-        __________________________________<br/>
-        Assinatura do Responsável Viveiro Lagni
-        """
-        story.append(Paragraph(termo, styles['BodyTextCustom']))
-        
-        doc.build(story)
-        return response
+    venda = get_object_or_404(Venda, pk=venda_id)
+    itens_venda = ItemVenda.objects.filter(venda=venda).select_related('produto', 'lote').order_by('id')
 
-    except Venda.DoesNotExist:
-        return HttpResponse("Venda não encontrada.", status=404)
+    try:
+        caminho = caminho_termo(venda, itens_venda)
     except Exception as e:
         return HttpResponse(f"Ocorreu um erro: {e}", status=500)
 
+    return FileResponse(
+        open(caminho, 'rb'),
+        as_attachment=True,
+        filename=f'termo_conformidade_venda_{venda.id}.pdf',
+        content_type='application/pdf',
+    )
+
+@require_GET
+def recibo_venda(request, venda_id):
+    """
+    Recibo ESC/POS de uma venda. 'formato=texto' devolve a prévia em texto puro;
+    sem ele, os bytes ESC/POS para enviar à impressora. 'largura' é 58 ou 80 (mm).
+    """
+    try:
+        recibo = montar_recibo(carregar_venda(venda_id), request.GET.get('largura'))
+    except Venda.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Venda não encontrada.'}, status=404)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+
+    if request.GET.get('formato') == 'texto':
+        return HttpResponse(recibo.como_texto(), content_type='text/plain; charset=utf-8')
+    response = HttpResponse(bytes(recibo.dados), content_type='application/octet-stream')
+    response['Content-Disposition'] = f'attachment; filename="recibo_venda_{venda_id}.bin"'
+    return response
+
+@require_POST
+def imprimir_recibo_api(request, venda_id):
+    """
+    Envia o recibo da venda para a impressora térmica configurada em PDV_RECIBO_IMPRESSORA.
+    """
+    try:
+        recibo = montar_recibo(carregar_venda(venda_id), request.GET.get('largura'))
+        enviar_para_impressora(recibo.dados)
+    except Venda.DoesNotExist:
+        return JsonResponse({'success': False, 'message': 'Venda não encontrada.'}, status=404)
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    except OSError as e:
+        return JsonResponse({'success': False, 'message': f'Falha ao comunicar com a impressora: {e}'}, status=502)
+    return JsonResponse({'success': True, 'message': f'Recibo da venda #{venda_id} enviado para a impressora.'})
+
+TERMOS_LOTE_LIMITE = getattr(settings, 'PDV_TERMOS_LOTE_LIMITE', 2000)
+
+@require_GET
+def gerar_termos_conformidade_lote(request):
+    """
+    Termos de Conformidade de várias vendas de uma vez: as vendas do período
+    (start_date/end_date) e/ou da lista 'ids' (separados por vírgula).
+    'formato=zip' envia um PDF por venda num ZIP transmitido à medida que os
+    termos ficam prontos; 'formato=pdf' (um único PDF) é enfileirado como
+    TarefaDocumento e a resposta 202 traz os links de status e download.
+    """
+    formato = request.GET.get('formato', 'pdf')
+    if formato not in ('pdf', 'zip'):
+        return JsonResponse({'success': False, 'message': "Formato inválido. Use 'pdf' ou 'zip'."}, status=400)
+    try:
+        inicio, fim = _periodo_exportacao(request)
+        ids = [int(valor) for valor in request.GET.get('ids', '').split(',') if valor.strip()] or None
+    except ValueError:
+        return JsonResponse({'success': False, 'message': 'Parâmetros inválidos. Use datas YYYY-MM-DD e ids numéricos.'}, status=400)
+    if ids is None and inicio is None and fim is None:
+        return JsonResponse({'success': False, 'message': 'Informe um período ou uma lista de vendas.'}, status=400)
+
+    vendas = vendas_para_termos(ids, inicio, fim)
+    quantidade = vendas.count()
+    if quantidade == 0:
+        return JsonResponse({'success': False, 'message': 'Nenhuma venda encontrada.'}, status=404)
+    if quantidade > TERMOS_LOTE_LIMITE:
+        return JsonResponse({'success': False, 'message': f'No máximo {TERMOS_LOTE_LIMITE} termos por vez; reduza o período.'}, status=400)
+
+    if formato == 'zip':
+        response = StreamingHttpResponse(gerar_termos_zip(vendas), content_type='application/zip')
+        response['Content-Disposition'] = 'attachment; filename="termos_conformidade.zip"'
+        return response
+
+    # O PDF único precisa ser montado inteiro antes de enviar; fica para o worker.
+    tarefa = criar_tarefa('termos', {
+        'formato': 'pdf',
+        'ids': ids,
+        'start_date': request.GET.get('start_date'),
+        'end_date': request.GET.get('end_date'),
+    })
+    response = JsonResponse({'success': True, 'tarefa': _tarefa_json(tarefa)}, status=202)
+    response['Location'] = reverse('caixa_pdv:status_tarefa_api', args=[tarefa.id])
+    return response
+
+def _tarefa_json(tarefa):
+    return {
+        'id': tarefa.id,
+        'tipo': tarefa.tipo,
+        'status': tarefa.status,
+        'progresso': tarefa.progresso,
+        'total': tarefa.total,
+        'mensagem': tarefa.mensagem,
+        'status_url': reverse('caixa_pdv:status_tarefa_api', args=[tarefa.id]),
+        'download_url': reverse('caixa_pdv:download_tarefa', args=[tarefa.id]) if tarefa.status == 'concluida' else None,
+    }
+
+@require_POST
+def criar_tarefa_api(request):
+    """
+    Enfileira a geração de um documento ('termos' ou 'etiquetas') e responde
+    na hora; o arquivo é gerado pelo worker (comando processar_tarefas).
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'Requisição inválida: O corpo da requisição não é um JSON válido.'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'message': 'Requisição inválida.'}, status=400)
+
+    try:
+        tarefa = criar_tarefa(data.get('tipo'), data.get('parametros', {}))
+    except ValueError as e:
+        return JsonResponse({'success': False, 'message': str(e)}, status=400)
+    return JsonResponse({'success': True, 'tarefa': _tarefa_json(tarefa)}, status=202)
+
+@require_GET
+def status_tarefa_api(request, tarefa_id):
+    tarefa = get_object_or_404(TarefaDocumento, pk=tarefa_id)
+    return JsonResponse({'success': True, 'tarefa': _tarefa_json(tarefa)})
+
+@require_GET
+def download_tarefa(request, tarefa_id):
+    tarefa = get_object_or_404(TarefaDocumento, pk=tarefa_id)
+    if tarefa.status != 'concluida':
+        return JsonResponse({'success': False, 'message': 'O documento ainda não está pronto.', 'tarefa': _tarefa_json(tarefa)}, status=409)
+    try:
+        arquivo = open(tarefa.arquivo, 'rb')
+    except OSError:
+        return JsonResponse({'success': False, 'message': 'O arquivo desta tarefa não existe mais.'}, status=410)
+    return FileResponse(arquivo, as_attachment=True, filename=nome_arquivo(tarefa))
+
 # NOVAS VIEWS PARA A API
 class VendaViewSet(viewsets.ModelViewSet):
-    queryset = Venda.objects.all().order_by('-data_venda')
+    """
+    A listagem usa a representação resumida (quantidade de itens por anotação),
+    paginada por cursor quando o cliente envia 'cursor' ou 'page_size'; o
+    detalhe traz os itens com lote e produto em uma única consulta extra.
+    A exclusão passa por apagar_venda, que devolve o estoque e estorna resumos,
+    sessão e fechamentos.
+    """
+    queryset = Venda.objects.all().order_by('-data_venda', '-id')
     serializer_class = VendaSerializer
+    pagination_class = PaginacaoVendas
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action == 'list':
+            return queryset.annotate(quantidade_itens=Count('itens'))
+        return queryset.prefetch_related(
+            Prefetch('itens', queryset=ItemVenda.objects.select_related('lote__produto').order_by('id')),
+            'pagamentos',
+        )
+
+    def get_serializer_class(self):
+        if self.action == 'list':
+            return VendaResumoSerializer
+        return super().get_serializer_class()
+
+    def perform_destroy(self, instance):
+        transacao_com_retentativa(apagar_venda)(instance.id)
 
 class ItemVendaViewSet(viewsets.ModelViewSet):
     queryset = ItemVenda.objects.all()
@@ -8,7 +8,8 @@ from django.views.decorators.http import require_http_methods
 from .utils import get_cart, save_cart
 from produtos.models import Produto
 from django.contrib import messages
-from django.db import transaction
+from caixa_pdv.banco import transacao_com_retentativa
+from caixa_pdv.services import bloquear_lotes, aplicar_delta_estoque
 from pedidos.models import Pedido, ItemPedido
 from lotes.models import Lote
 from django.views.decorators.http import require_POST
@@ -276,6 +277,70 @@ def obter_conteudo_carrinho(request):
     })
 
 
+@transacao_com_retentativa
+def _criar_pedido(carrinho):
+    """
+    Cria o Pedido e os ItensPedido do carrinho e deduz a quantidade dos lotes,
+    numa transação refeita automaticamente se o banco estiver travado.
+
+    Cada item sai do lote mais antigo (data de semeadura) do produto que tenha
+    quantidade suficiente. Os lotes são travados de uma vez, os itens gravados
+    com um bulk_create e o estoque baixado com um UPDATE por tabela.
+    """
+    itens = list(carrinho.values())
+    produtos = Produto.objects.in_bulk({int(item['produto_id']) for item in itens})
+    if len(produtos) != len({int(item['produto_id']) for item in itens}):
+        raise ValidationError("Um dos produtos do carrinho não foi encontrado.")
+
+    ordem = list(
+        Lote.objects.filter(produto_id__in=produtos, quantidade__gt=0)
+        .order_by('data_semeadura', 'id')
+        .values_list('id', flat=True)
+    )
+    lotes = bloquear_lotes(ordem)
+    disponivel = {pk: lotes[pk].quantidade for pk in ordem}
+
+    novos_itens = []
+    deltas_lote = {}
+    deltas_produto = {}
+    for item_data in itens:
+        produto = produtos[int(item_data['produto_id'])]
+        quantidade_pedida = int(item_data['quantidade'])
+        preco_unitario_item = Decimal(item_data['preco_unitario'])
+
+        lote_id = next(
+            (pk for pk in ordem
+             if lotes[pk].produto_id == produto.id and disponivel[pk] >= quantidade_pedida),
+            None,
+        )
+        if lote_id is None:
+            raise ValidationError(f"Estoque insuficiente para o produto {produto.variedade}.")
+
+        disponivel[lote_id] -= quantidade_pedida
+        deltas_lote[lote_id] = deltas_lote.get(lote_id, 0) - quantidade_pedida
+        deltas_produto[produto.id] = deltas_produto.get(produto.id, 0) - quantidade_pedida
+        novos_itens.append(ItemPedido(
+            produto=produto,
+            lote_id=lote_id,
+            quantidade=quantidade_pedida,
+            preco_unitario=preco_unitario_item,
+            subtotal=quantidade_pedida * preco_unitario_item,
+        ))
+
+    # bulk_create não dispara o post_save de ItemPedido (que recalcula o total a
+    # cada item): o pedido já nasce com o total dos itens.
+    novo_pedido = Pedido.objects.create(
+        status='PENDENTE',
+        total_pedido=sum((item.subtotal for item in novos_itens), Decimal('0.00')),
+    )
+    for item in novos_itens:
+        item.pedido = novo_pedido
+    ItemPedido.objects.bulk_create(novos_itens)
+    aplicar_delta_estoque(deltas_lote, deltas_produto)
+
+    return novo_pedido
+
+
 @require_POST
 def finalizar_compra(request):
     """
@@ -290,44 +355,14 @@ def finalizar_compra(request):
         return JsonResponse({'success': False, 'message': 'Carrinho vazio.'})
 
     try:
-        with transaction.atomic():
-            novo_pedido = Pedido.objects.create(
-                status='PENDENTE',
-            )
-
-            for item_key, item_data in carrinho.items():
-                produto = get_object_or_404(Produto, id=item_data['produto_id'])
-                quantidade_pedida = item_data['quantidade']
-                preco_unitario_item = Decimal(item_data['preco_unitario'])
-
-                # Encontrar o lote mais apropriado para o produto
-                lote_usado = Lote.objects.filter(
-                    produto=produto,
-                    quantidade__gte=quantidade_pedida,
-                    ativo=True
-                ).order_by('data_validade').first()
-
-                if not lote_usado:
-                    raise ValidationError(f"Estoque insuficiente para o produto {produto.variedade}.")
-
-                ItemPedido.objects.create(
-                    pedido=novo_pedido,
-                    produto=produto,
-                    lote=lote_usado,
-                    quantidade=quantidade_pedida,
-                    preco_unitario=preco_unitario_item,
-                )
-
-                # Deduz a quantidade do lote
-                lote_usado.quantidade -= quantidade_pedida
-                lote_usado.save()
-
-            del request.session['carrinho']
-            request.session.modified = True
-
-            messages.success(request, f"Seu pedido #{novo_pedido.id} foi finalizado com sucesso!")
-
-            return JsonResponse({'success': True, 'message': 'Pedido finalizado com sucesso!', 'redirect_url': reverse('catalogo:lista_produtos')})
+        novo_pedido = _criar_pedido(carrinho)
+
+        del request.session['carrinho']
+        request.session.modified = True
+
+        messages.success(request, f"Seu pedido #{novo_pedido.id} foi finalizado com sucesso!")
+
+        return JsonResponse({'success': True, 'message': 'Pedido finalizado com sucesso!', 'redirect_url': reverse('catalogo:lista_produtos')})
 
     except ValidationError as e:
         messages.error(request, f"Erro de validação: {e.message}")
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.3 on 2026-10-18 08:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lotes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoLotes',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('versao', models.PositiveBigIntegerField(default=0, verbose_name='Versão')),
+            ],
+            options={
+                'verbose_name': 'Versão dos Lotes',
+                'verbose_name_plural': 'Versão dos Lotes',
+            },
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:12
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lotes', '0002_versaolotes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EventoEstoque',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lote_id', models.PositiveBigIntegerField(verbose_name='Lote')),
+                ('quantidade', models.IntegerField(verbose_name='Quantidade')),
+                ('criado_em', models.DateTimeField(db_index=True, default=django.utils.timezone.now, verbose_name='Criado em')),
+            ],
+            options={
+                'verbose_name': 'Evento de Estoque',
+                'verbose_name_plural': 'Eventos de Estoque',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.3 on 2026-10-18 09:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lotes', '0003_eventoestoque'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='versaolotes',
+            name='versao_texto',
+            field=models.PositiveBigIntegerField(default=0, verbose_name='Versão do Texto'),
+        ),
+    ]
@@ -1,9 +1,15 @@
 # lotes/models.py
 
+from django.conf import settings
 from django.db import models
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.utils import timezone
 from produtos.models import Produto
+import datetime
 import random
+import time
 from decimal import Decimal
 
 class Lote(models.Model):
@@ -66,6 +72,7 @@ class Lote(models.Model):
 
     def save(self, *args, **kwargs):
         old_qty = 0
+        old_instance = None
         if self.pk:
             try:
                 old_instance = Lote.objects.get(pk=self.pk)
@@ -92,6 +99,9 @@ class Lote(models.Model):
             if self.preco_unitario is None:
                 self.preco_unitario = Decimal('0.00')
 
+        # Lote novo ou com outro código/produto: muda o texto pesquisável (ver versao_texto_lotes).
+        self._texto_alterado = old_instance is None or (old_instance.codigo, old_instance.produto_id) != (self.codigo, self.produto_id)
+
         super().save(*args, **kwargs)
 
         # Atualiza o estoque no Produto conforme a diferença de quantidade do lote
@@ -140,4 +150,152 @@ class Lote(models.Model):
             if self.produto.variedade:
                 return self.produto.variedade
             return self.produto.get_tipo_display() # Fallback para o tipo
-        return 'Produto Desconhecido'
\ No newline at end of file
+        return 'Produto Desconhecido'
+
+
+class VersaoLotes(models.Model):
+    """
+    Contadores monotônicos (linha única) das alterações de lotes.
+
+    'versao' sobe a cada alteração: cadastro, estoque ou dados do produto
+    exibidos no PDV; é a versão de ETags e caches das APIs de lotes.
+    'versao_texto' sobe só quando muda o texto pesquisável (lote criado ou
+    apagado, código ou produto do lote, variedade ou tipo do produto); é a
+    versão do índice de busca em memória, que assim não é refeito a cada venda.
+    Ambos são compartilhados entre os workers.
+    """
+    versao = models.PositiveBigIntegerField(default=0, verbose_name="Versão")
+    versao_texto = models.PositiveBigIntegerField(default=0, verbose_name="Versão do Texto")
+
+    class Meta:
+        verbose_name = "Versão dos Lotes"
+        verbose_name_plural = "Versão dos Lotes"
+
+    def __str__(self):
+        return f"Versão {self.versao}"
+
+
+def versao_lotes():
+    """Retorna a versão atual da tabela de lotes."""
+    versao = VersaoLotes.objects.filter(pk=1).values_list('versao', flat=True).first()
+    return versao or 0
+
+
+def incrementar_versao_lotes():
+    """Incrementa a versão da tabela de lotes com um UPDATE atômico."""
+    if not VersaoLotes.objects.filter(pk=1).update(versao=F('versao') + 1):
+        VersaoLotes.objects.get_or_create(pk=1, defaults={'versao': 1})
+
+
+def versao_texto_lotes():
+    """Retorna a versão do texto pesquisável dos lotes."""
+    versao = VersaoLotes.objects.filter(pk=1).values_list('versao_texto', flat=True).first()
+    return versao or 0
+
+
+def incrementar_versao_texto_lotes():
+    """Incrementa as duas versões (o texto também é dado exibido) com um UPDATE atômico."""
+    if not VersaoLotes.objects.filter(pk=1).update(versao=F('versao') + 1, versao_texto=F('versao_texto') + 1):
+        VersaoLotes.objects.get_or_create(pk=1, defaults={'versao': 1, 'versao_texto': 1})
+
+
+# Segundos que os eventos de estoque ficam guardados para terminais reconectando.
+EVENTOS_ESTOQUE_RETENCAO = getattr(settings, 'PDV_ESTOQUE_EVENTOS_RETENCAO', 3600)
+# Intervalo mínimo (segundos), por processo, entre duas limpezas feitas na gravação de eventos.
+EVENTOS_ESTOQUE_LIMPEZA_INTERVALO = getattr(settings, 'PDV_ESTOQUE_EVENTOS_LIMPEZA_INTERVALO', 300)
+
+# Instante (time.monotonic) a partir do qual este processo limpa os eventos de novo.
+_proxima_limpeza_eventos = 0.0
+
+
+class EventoEstoque(models.Model):
+    """
+    Registro de curta duração da nova quantidade de um lote, lido pela consulta
+    de estoque ao vivo do PDV e pela sincronização do catálogo local dos
+    terminais. Alterações nos dados do produto também geram eventos para os
+    seus lotes. O id crescente é o cursor dos terminais; o lote_id não é chave
+    estrangeira para que a remoção do lote também vire evento.
+
+    A limpeza dos eventos antigos acontece na própria gravação
+    (registrar_eventos_estoque), no máximo uma vez a cada
+    PDV_ESTOQUE_EVENTOS_LIMPEZA_INTERVALO segundos por processo, então não
+    depende de nenhum worker ou agendamento.
+    """
+    lote_id = models.PositiveBigIntegerField(verbose_name="Lote")
+    quantidade = models.IntegerField(verbose_name="Quantidade")
+    criado_em = models.DateTimeField(default=timezone.now, db_index=True, verbose_name="Criado em")
+
+    class Meta:
+        verbose_name = "Evento de Estoque"
+        verbose_name_plural = "Eventos de Estoque"
+
+    def __str__(self):
+        return f"Lote {self.lote_id}: {self.quantidade}"
+
+
+def registrar_eventos_estoque(quantidades):
+    """
+    Grava um evento por lote ({lote_id: quantidade}) com um único INSERT e,
+    passado o intervalo de limpeza deste processo, apaga os eventos antigos.
+    """
+    global _proxima_limpeza_eventos
+    if not quantidades:
+        return
+    EventoEstoque.objects.bulk_create(
+        [EventoEstoque(lote_id=lote_id, quantidade=quantidade) for lote_id, quantidade in quantidades.items()]
+    )
+    agora = time.monotonic()
+    if agora >= _proxima_limpeza_eventos:
+        _proxima_limpeza_eventos = agora + EVENTOS_ESTOQUE_LIMPEZA_INTERVALO
+        limpar_eventos_estoque()
+
+
+def limpar_eventos_estoque():
+    """
+    Apaga os eventos mais antigos que a retenção, preservando sempre o último:
+    a versão do catálogo (id do último evento) continua conhecida mesmo sem
+    alterações recentes, então um terminal já em dia segue sincronizando por
+    delta, e um terminal com cursor anterior ao evento mais antigo sabe que
+    perdeu eventos e baixa o snapshot. Os ids são AUTOINCREMENT (SQLite) e
+    nunca voltam atrás depois da limpeza.
+    """
+    ultimo = EventoEstoque.objects.order_by('-id').values_list('id', flat=True).first()
+    if ultimo is not None:
+        limite = timezone.now() - datetime.timedelta(seconds=EVENTOS_ESTOQUE_RETENCAO)
+        EventoEstoque.objects.filter(criado_em__lt=limite, id__lt=ultimo).delete()
+
+
+@receiver(post_save, sender=Lote)
+def lote_salvo(sender, instance, created, **kwargs):
+    if created or getattr(instance, '_texto_alterado', True):
+        incrementar_versao_texto_lotes()
+    else:
+        incrementar_versao_lotes()
+
+
+@receiver(post_delete, sender=Lote)
+def lote_apagado(sender, **kwargs):
+    incrementar_versao_texto_lotes()
+
+
+@receiver(post_save, sender=Lote)
+def lote_salvo_evento(sender, instance, **kwargs):
+    registrar_eventos_estoque({instance.pk: instance.quantidade})
+
+
+@receiver(post_delete, sender=Lote)
+def lote_apagado_evento(sender, instance, **kwargs):
+    registrar_eventos_estoque({instance.pk: 0})
+
+
+@receiver(post_save, sender=Produto)
+def produto_alterado(sender, instance, update_fields=None, **kwargs):
+    # Atualizações só de estoque do produto não mudam os dados dos lotes.
+    if update_fields and set(update_fields) <= {'estoque', 'status'}:
+        return
+    if instance.texto_busca_alterado():
+        incrementar_versao_texto_lotes()
+    else:
+        incrementar_versao_lotes()
+    # Nome, tipo e imagem dos lotes no catálogo local dos terminais.
+    registrar_eventos_estoque(dict(instance.lotes.values_list('id', 'quantidade')))
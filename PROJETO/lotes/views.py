@@ -6,50 +6,16 @@ from .models import Lote
 from .forms import LoteForm
 from rest_framework import viewsets
 from .serializers import LoteSerializer
+from produtos.busca_textual import buscar_lotes
 
 # NOVO: Importar Q para consultas complexas
 from django.db.models import Q # <--- ESSA LINHA FOI ADICIONADA/CORRIGIDA AQUI
 
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib.units import mm
-from reportlab.lib.utils import ImageReader
-from reportlab.pdfbase import pdfmetrics
-from reportlab.pdfbase.ttfonts import TTFont
 from django.http import JsonResponse
 from django.urls import reverse
-from reportlab.lib.utils import ImageReader
 
 from io import BytesIO
-import requests
-import os
-from PIL import Image
-
-# Importações para o código de barras da biblioteca python-barcode
-from barcode import Code128
-from barcode.writer import ImageWriter
-
-# --- Registro da Fonte ---
-FONT_PATH = os.path.join(os.path.dirname(__file__), 'static', 'lotes', 'fonts', 'AgencyFB.ttf')
-AGENCY_FB_FONT_NAME = 'AgencyFB'
-FALLBACK_FONT_NAME = 'Helvetica'
-
-agency_fb_registered = False
-
-try:
-    if os.path.exists(FONT_PATH):
-        pdfmetrics.registerFont(TTFont(AGENCY_FB_FONT_NAME, FONT_PATH))
-        agency_fb_registered = True
-        print(f"Fonte '{AGENCY_FB_FONT_NAME}' registrada com sucesso de: {FONT_PATH}")
-    else:
-        print(f"ATENÇÃO: '{AGENCY_FB_FONT_NAME}.ttf' não encontrado em {FONT_PATH}. O ReportLab usará uma fonte padrão para '{AGENCY_FB_FONT_NAME}'.")
-except Exception as e:
-    print(f"ERRO ao tentar registrar a fonte '{AGENCY_FB_FONT_NAME}' de {FONT_PATH}: {e}. O ReportLab usará uma fonte padrão para '{AGENCY_FB_FONT_NAME}'.")
-
-
-# --- Caminho da Logo ---
-LOGO_PATH = os.path.join(os.path.dirname(__file__), 'static', 'lotes', 'images', 'Studio Santana (14).png')
-
+from .etiqueta_pdf import renderizar_etiquetas
 
 def lote_list(request):
     # Lógica de pesquisa adicionada/corrigida aqui
@@ -57,12 +23,7 @@ def lote_list(request):
     lotes = Lote.objects.all().order_by("data_semeadura")
 
     if query:
-        lotes = lotes.filter(
-            Q(codigo__icontains=query) |
-            Q(variedade__icontains=query) |
-            Q(produto__variedade__icontains=query) |
-            Q(produto__especie__icontains=query)
-        ).distinct()
+        lotes = buscar_lotes(lotes, query)
 
     return render(request, "lotes/lote_list.html", {"lotes": lotes, "query": query})
 
@@ -99,16 +60,11 @@ def criar_novo_lote(request):
 
 def listar_lotes_api(request):
     query = request.GET.get('search', '')
-    lotes = Lote.objects.all()
+    lotes = Lote.objects.select_related('produto')
 
     if query:
-        # Filtra por código do lote, nome do produto, ou data de semeadura
-        lotes = lotes.filter(
-            Q(codigo__icontains=query) |
-            Q(produto__variedade__icontains=query) |
-            Q(produto__tipo__icontains=query) |
-            Q(data_semeadura__icontains=query.replace('/', '-')) # Permite buscar por data em DD-MM-AAAA
-        )
+        # Filtra por código do lote, nome do produto, ou data de semeadura (DD/MM/AAAA)
+        lotes = buscar_lotes(lotes, query)
     
     final_data = []
     for lote in lotes:
@@ -141,142 +97,7 @@ def gerar_etiqueta_lote(request, pk):
             print(f"DEBUG: Parâmetro 'quantidade' inválido ('{quantidade_para_etiqueta_str}'). Usando quantidade original do lote: {lote.quantidade}")
 
     buffer = BytesIO()
-
-    # --- DIMENSÕES DA ETIQUETA DE ROLO ---
-    etiqueta_largura = 50 * mm
-    etiqueta_altura = 15 * mm
-
-    p = canvas.Canvas(buffer, pagesize=(etiqueta_largura, etiqueta_altura))
-
-    # --- DEFINIÇÕES DE MARGENS INTERNAS DA ETIQUETA ---
-    margem_para_logo_esquerda = 15 * mm
-    margem_direita_conteudo = 1 * mm
-
-    margem_inicial_topo = 1.5 * mm
-    espacamento_entre_linhas = 3.2 * mm
-
-    font_to_use = AGENCY_FB_FONT_NAME if agency_fb_registered else FALLBACK_FONT_NAME
-
-    # --- POSICIONAMENTO DO TEXTO ---
-    base_font_size = 9
-
-    x_pos_text = margem_para_logo_esquerda
-    y_pos_lote = etiqueta_altura - margem_inicial_topo - base_font_size * 0.8
-
-    p.setFont(font_to_use, base_font_size)
-    p.drawString(x_pos_text, y_pos_lote, f"LOTE: {lote.codigo}")
-
-    y_pos_renasem = y_pos_lote - espacamento_entre_linhas
-    p.setFont(font_to_use, base_font_size)
-    p.drawString(x_pos_text, y_pos_renasem, "RENASEM: SC-04016/2022")
-
-    y_pos_produto_variedade = y_pos_renasem - espacamento_entre_linhas
-
-    # Usa o str(lote.produto) que agora pega APENAS a variedade (se o __str__ de Produto estiver configurado)
-    product_variety_line = str(lote.produto) .upper()
-
-    original_font_size_variety = 9
-    min_font_size_variety = 8
-    current_font_size_variety = original_font_size_variety
-
-    max_text_width_variety = etiqueta_largura - x_pos_text - margem_direita_conteudo
-
-    font_for_width_calc = font_to_use
-    while True:
-        text_width = p.stringWidth(product_variety_line, font_for_width_calc, current_font_size_variety)
-        if text_width <= max_text_width_variety:
-            break
-        if current_font_size_variety <= min_font_size_variety:
-            break
-        current_font_size_variety -= 0.5
-
-    p.setFont(font_to_use, current_font_size_variety)
-    p.drawString(x_pos_text, y_pos_produto_variedade, product_variety_line)
-
-
-    # Geração do Código de Barras (Code 128) usando python-barcode
-    barcode_value = lote.codigo
-
-    try:
-        # Cria um objeto BytesIO para armazenar a imagem do código de barras
-        barcode_img_buffer = BytesIO()
-
-        # Configurações para o ImageWriter: write_text=False para não incluir os números
-        writer_options = {
-            'write_text': False,
-            'text_distance': 0.0,
-            'font_size': 0,
-            'module_height': 5.0,
-            'module_width': 0.18,
-            'quiet_zone': 0.5,
-            'dpi': 300,
-        }
-
-        # Gera o código de barras e salva no buffer como PNG
-        Code128(barcode_value, writer=ImageWriter()).write(barcode_img_buffer, options=writer_options)
-        barcode_img_buffer.seek(0) # Volta ao início do buffer para leitura
-
-        barcode_image_reader = ImageReader(barcode_img_buffer)
-
-        # Dimensões e posicionamento para o ReportLab
-        barcode_pdf_height = 4 * mm
-        barcode_pdf_width = 30 * mm
-
-        # Posição X: Centraliza o código de barras na área disponível à direita da logo
-        max_barcode_width_available = etiqueta_largura - margem_para_logo_esquerda - margem_direita_conteudo
-        barcode_x_pos = x_pos_text  
-        
-        # Garante que o código de barras não vá muito para a esquerda
-        if barcode_x_pos < margem_para_logo_esquerda:
-            barcode_x_pos = margem_para_logo_esquerda
-
-        barcode_y_pos = 0 * mm # Posição Y: Próximo à parte inferior da etiqueta
-
-        p.drawImage(barcode_image_reader, barcode_x_pos, barcode_y_pos,
-                            width=barcode_pdf_width, height=barcode_pdf_height)
-        
-
-    except Exception as e:
-        p.setFont("Helvetica-Bold", 6)
-        p.drawString(x_pos_text, 0.5*mm, f"Erro ao gerar código de barras: {e}")
-        print(f"Erro ao gerar código de barras para o lote {lote.codigo}: {e}")
-
-    # --- DESENHAR A LOGO ---
-    try:
-        if os.path.exists(LOGO_PATH):
-            # 1. Abre a imagem PNG com Pillow
-            img_pillow = Image.open(LOGO_PATH)
-
-            # 2. Cria um buffer de bytes para salvar a imagem como PNG.
-            # Isso garante que a transparência seja mantida e ReportLab a processe.
-            img_buffer = BytesIO()
-            # Salva a imagem no buffer como PNG, mantendo o canal alpha se presente
-            img_pillow.save(img_buffer, format='PNG')
-            img_buffer.seek(0) # Volta ao início do buffer para que o ImageReader possa ler
-
-            # 3. Cria um ImageReader a partir do buffer de bytes
-            logo_image_reader = ImageReader(img_buffer)
-
-            # Dimensões da logo (ajuste conforme necessário para sua imagem)
-            logo_width = 13 * mm 
-            logo_height = 13 * mm 
-
-            # Posição da logo (centralizada verticalmente na margem da esquerda)
-            logo_x = 1 * mm 
-            logo_y = (etiqueta_altura / 2) - (logo_height / 2)
-
-            # Desenha a imagem. Sem o parâmetro 'mask' explícito, o ReportLab
-            # deve usar o canal alpha presente no próprio arquivo PNG.
-            p.drawImage(logo_image_reader, logo_x, logo_y,
-                                width=logo_width, height=logo_height)
-            print(f"Logo desenhada com sucesso de: {LOGO_PATH}")
-        else:
-            print(f"AVISO: Logo não encontrada em {LOGO_PATH}. A etiqueta será gerada sem a logo.")
-    except Exception as e:
-        print(f"ERRO ao desenhar a logo de {LOGO_PATH}: {e}")
-
-
-    p.save()
+    renderizar_etiquetas([lote], buffer)
 
     pdf = buffer.getvalue()
     buffer.close()
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ProdutosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'produtos'
+
+    def ready(self):
+        # Registra os sinais que mantêm o índice FTS5 de produtos e lotes atualizado.
+        from . import busca_textual  # noqa: F401
@@ -0,0 +1,315 @@
+# produtos/busca_textual.py
+"""
+Busca textual de produtos e lotes com o índice FTS5 do SQLite.
+
+As tabelas virtuais são criadas pela migração produtos.0003 e mantidas em dia
+pelos sinais deste módulo; o comando 'reconstruir_busca_textual' as refaz do zero.
+Quando o FTS5 não está disponível (outro banco ou SQLite compilado sem FTS5),
+as funções de busca caem nos filtros 'icontains' do ORM.
+
+Cada linha indexada é o texto do registro sem acentos e em minúsculas (função
+SQL 'sem_acentos', registrada em cada conexão), numa única coluna com o
+tokenizador 'trigram': uma palavra de 3 ou mais letras é encontrada também no
+meio do texto ('rosa' acha 'Amarosa'), pelo próprio índice. Palavras de 1 ou 2
+letras são conferidas com LIKE sobre a tabela FTS, que é bem menor que as
+tabelas do ORM com os JOINs de NCM e CFOP.
+"""
+import logging
+import unicodedata
+
+from django.conf import settings
+from django.db import connection, OperationalError, DatabaseError
+from django.db.backends.signals import connection_created
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import Produto, NCM, CFOP
+
+logger = logging.getLogger(__name__)
+
+TABELA_PRODUTOS_FTS = 'produtos_produto_fts'
+TABELA_LOTES_FTS = 'lotes_lote_fts'
+
+# Número máximo de ids ranqueados devolvidos por ids_lotes_ranqueados.
+BUSCA_FTS_LIMITE = getattr(settings, 'BUSCA_FTS_LIMITE', 1000)
+
+# Tamanho mínimo de uma palavra para o índice trigram; as menores usam LIKE.
+TAMANHO_TRIGRAMA = 3
+
+SQL_CRIAR_TABELAS = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_PRODUTOS_FTS} USING fts5(texto, tokenize = 'trigram')",
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA_LOTES_FTS} USING fts5(texto, tokenize = 'trigram')",
+]
+
+SQL_APAGAR_TABELAS = [
+    f"DROP TABLE IF EXISTS {TABELA_PRODUTOS_FTS}",
+    f"DROP TABLE IF EXISTS {TABELA_LOTES_FTS}",
+]
+
+# INSERTs que geram as linhas indexadas; recebem um filtro WHERE opcional.
+# Sempre executados com parâmetros, por isso o '%' literal vem escapado.
+SQL_LINHAS_PRODUTOS = f"""
+    INSERT INTO {TABELA_PRODUTOS_FTS}(rowid, texto)
+    SELECT p.id, sem_acentos(
+               p.cod || ' ' || p.variedade || ' ' || COALESCE(p.especie, '') || ' ' || COALESCE(p.cultivar_info, '')
+               || ' ' || p.tipo || ' ' || COALESCE(n.codigo, '') || ' ' || COALESCE(n.descricao, '')
+               || ' ' || COALESCE(c.codigo, '') || ' ' || COALESCE(c.descricao, '')
+           )
+    FROM produtos_produto p
+    LEFT JOIN produtos_ncm n ON n.id = p.ncm_id
+    LEFT JOIN produtos_cfop c ON c.id = p.cfop_id
+"""
+
+SQL_LINHAS_LOTES = f"""
+    INSERT INTO {TABELA_LOTES_FTS}(rowid, texto)
+    SELECT l.id, sem_acentos(
+               l.codigo || ' ' || p.variedade || ' ' || p.tipo || ' ' || COALESCE(p.especie, '')
+               || ' ' || strftime('%%d/%%m/%%Y', l.data_semeadura) || ' ' || l.data_semeadura
+           )
+    FROM lotes_lote l
+    JOIN produtos_produto p ON p.id = l.produto_id
+"""
+
+
+def dobrar_acentos(texto):
+    """
+    Normaliza o texto para busca: minúsculas e sem acentos ('Hortaliças' -> 'hortalicas').
+    """
+    if not texto:
+        return ''
+    decomposto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in decomposto if not unicodedata.combining(c)).lower().strip()
+
+
+@receiver(connection_created)
+def registrar_sem_acentos(sender, connection, **kwargs):
+    # Usada nos INSERTs do índice; o texto da busca é normalizado em Python.
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('sem_acentos', 1, dobrar_acentos, deterministic=True)
+
+
+_disponivel = None
+
+
+def fts_disponivel():
+    """
+    Indica se o banco atual tem as tabelas FTS5 (resultado guardado por processo).
+    """
+    global _disponivel
+    if _disponivel is None:
+        _disponivel = False
+        if connection.vendor == 'sqlite':
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN (%s, %s)",
+                        [TABELA_PRODUTOS_FTS, TABELA_LOTES_FTS],
+                    )
+                    _disponivel = cursor.fetchone()[0] == 2
+            except DatabaseError:
+                _disponivel = False
+    return _disponivel
+
+
+def criar_tabelas(cursor):
+    """
+    Cria as tabelas virtuais FTS5. Devolve False se o SQLite não suportar FTS5.
+    """
+    global _disponivel
+    try:
+        for sql in SQL_CRIAR_TABELAS:
+            cursor.execute(sql)
+    except OperationalError as e:
+        logger.warning("FTS5 indisponível, a busca textual usará os filtros do ORM (%s).", e)
+        return False
+    _disponivel = None
+    return True
+
+
+def reconstruir(cursor):
+    """
+    Reindexa todos os produtos e lotes. Usa apenas SQL, para poder ser chamada
+    também a partir de migrações.
+    """
+    cursor.execute(f"DELETE FROM {TABELA_PRODUTOS_FTS}")
+    cursor.execute(SQL_LINHAS_PRODUTOS, [])
+    cursor.execute(f"DELETE FROM {TABELA_LOTES_FTS}")
+    cursor.execute(SQL_LINHAS_LOTES, [])
+
+
+def _reindexar_produtos(where, params):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABELA_PRODUTOS_FTS} WHERE rowid IN (SELECT p.id FROM produtos_produto p WHERE {where})",
+            params,
+        )
+        cursor.execute(f"{SQL_LINHAS_PRODUTOS} WHERE {where}", params)
+
+
+def _reindexar_lotes(where, params):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {TABELA_LOTES_FTS} WHERE rowid IN (SELECT l.id FROM lotes_lote l JOIN produtos_produto p ON p.id = l.produto_id WHERE {where})",
+            params,
+        )
+        cursor.execute(f"{SQL_LINHAS_LOTES} WHERE {where}", params)
+
+
+def _remover(tabela, rowid):
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {tabela} WHERE rowid = %s", [rowid])
+
+
+def condicao_fts(tabela, texto):
+    """
+    Converte o texto digitado em (condição SQL, parâmetros) sobre a tabela FTS:
+    todas as palavras precisam aparecer no texto do registro, em qualquer
+    posição. As de TAMANHO_TRIGRAMA letras ou mais vão num MATCH (uma frase
+    entre aspas por palavra); as menores, num LIKE cada. Devolve
+    (condição, parâmetros, tem_match), com condição vazia para texto vazio;
+    'tem_match' indica se a condição tem MATCH (e pode ordenar por bm25).
+    """
+    palavras = dobrar_acentos(texto).split()
+    longas = [palavra for palavra in palavras if len(palavra) >= TAMANHO_TRIGRAMA]
+    condicoes, parametros = [], []
+    if longas:
+        condicoes.append(f"{tabela} MATCH %s")
+        parametros.append(' '.join('"' + palavra.replace('"', '""') + '"' for palavra in longas))
+    for palavra in palavras:
+        if len(palavra) < TAMANHO_TRIGRAMA:
+            condicoes.append("texto LIKE %s ESCAPE '\\'")
+            parametros.append('%' + palavra.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%')
+    return ' AND '.join(condicoes), parametros, bool(longas)
+
+
+def _filtrar(queryset, tabela, texto):
+    """
+    Filtra o queryset pelos ids encontrados na tabela FTS (uma subconsulta).
+    Com MATCH, ordena por relevância (bm25 de cada registro encontrado) e
+    desempata pela ordenação original; sem MATCH, mantém a ordenação original.
+    """
+    condicao, parametros, tem_match = condicao_fts(tabela, texto)
+    if not condicao:
+        return queryset
+    queryset = queryset.filter(pk__in=RawSQL(f"SELECT rowid FROM {tabela} WHERE {condicao}", parametros))
+    if not tem_match:
+        return queryset
+    ordenacao = list(queryset.query.order_by or queryset.model._meta.ordering)
+    coluna_id = f'"{queryset.model._meta.db_table}"."{queryset.model._meta.pk.column}"'
+    return queryset.annotate(
+        relevancia=RawSQL(
+            f"SELECT bm25({tabela}) FROM {tabela} WHERE {tabela} MATCH %s AND {tabela}.rowid = {coluna_id}",
+            parametros[:1],
+        )
+    ).order_by(F('relevancia').asc(), *ordenacao)
+
+
+def filtro_produtos_orm(texto):
+    return (
+        Q(cod__icontains=texto) |
+        Q(variedade__icontains=texto) |
+        Q(especie__icontains=texto) |
+        Q(cultivar_info__icontains=texto) |
+        Q(tipo__icontains=texto) |
+        Q(ncm__codigo__icontains=texto) |
+        Q(ncm__descricao__icontains=texto) |
+        Q(cfop__codigo__icontains=texto) |
+        Q(cfop__descricao__icontains=texto)
+    )
+
+
+def filtro_lotes_orm(texto):
+    return (
+        Q(codigo__icontains=texto) |
+        Q(produto__variedade__icontains=texto) |
+        Q(produto__tipo__icontains=texto) |
+        Q(produto__especie__icontains=texto) |
+        Q(data_semeadura__icontains=texto.replace('/', '-'))
+    )
+
+
+def ids_lotes_ranqueados(texto):
+    """
+    Ids de lotes por relevância (bm25), no máximo BUSCA_FTS_LIMITE. Devolve
+    None se o FTS5 não estiver disponível ou se nenhuma palavra tiver o
+    tamanho mínimo do trigrama (sem MATCH não há bm25): quem chama usa a
+    própria busca por prefixo.
+    """
+    if not fts_disponivel():
+        return None
+    condicao, parametros, tem_match = condicao_fts(TABELA_LOTES_FTS, texto)
+    if not condicao:
+        return []
+    if not tem_match:
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {TABELA_LOTES_FTS} WHERE {condicao} ORDER BY bm25({TABELA_LOTES_FTS}) LIMIT %s",
+            [*parametros, BUSCA_FTS_LIMITE],
+        )
+        return [linha[0] for linha in cursor.fetchall()]
+
+
+def buscar_produtos(queryset, texto):
+    """
+    Filtra o queryset de produtos pelo texto (também no meio das palavras, sem
+    acentos), os mais relevantes (bm25) primeiro. Sem FTS5, usa os filtros
+    icontains do ORM na ordenação original.
+    """
+    if not fts_disponivel():
+        return queryset.filter(filtro_produtos_orm(texto)).distinct()
+    return _filtrar(queryset, TABELA_PRODUTOS_FTS, texto)
+
+
+def buscar_lotes(queryset, texto):
+    """
+    Filtra o queryset de lotes pelo texto (também no meio das palavras, sem
+    acentos), os mais relevantes (bm25) primeiro. Sem FTS5, usa os filtros
+    icontains do ORM na ordenação original.
+    """
+    if not fts_disponivel():
+        return queryset.filter(filtro_lotes_orm(texto)).distinct()
+    return _filtrar(queryset, TABELA_LOTES_FTS, texto)
+
+
+# --- Sincronização do índice ---
+
+@receiver(post_save, sender=Produto)
+def indexar_produto(sender, instance, update_fields=None, **kwargs):
+    # Baixas de estoque não alteram os campos indexados.
+    if not fts_disponivel() or (update_fields and set(update_fields) <= {'estoque', 'status'}):
+        return
+    _reindexar_produtos('p.id = %s', [instance.pk])
+    _reindexar_lotes('p.id = %s', [instance.pk])
+
+
+@receiver(post_delete, sender=Produto)
+def desindexar_produto(sender, instance, **kwargs):
+    if fts_disponivel():
+        _remover(TABELA_PRODUTOS_FTS, instance.pk)
+
+
+@receiver(post_save, sender=NCM)
+def reindexar_produtos_do_ncm(sender, instance, created, **kwargs):
+    if fts_disponivel() and not created:
+        _reindexar_produtos('p.ncm_id = %s', [instance.pk])
+
+
+@receiver(post_save, sender=CFOP)
+def reindexar_produtos_do_cfop(sender, instance, created, **kwargs):
+    if fts_disponivel() and not created:
+        _reindexar_produtos('p.cfop_id = %s', [instance.pk])
+
+
+@receiver(post_save, sender='lotes.Lote')
+def indexar_lote(sender, instance, **kwargs):
+    if fts_disponivel():
+        _reindexar_lotes('l.id = %s', [instance.pk])
+
+
+@receiver(post_delete, sender='lotes.Lote')
+def desindexar_lote(sender, instance, **kwargs):
+    if fts_disponivel():
+        _remover(TABELA_LOTES_FTS, instance.pk)
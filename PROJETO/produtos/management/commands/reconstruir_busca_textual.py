@@ -0,0 +1,23 @@
+# produtos/management/commands/reconstruir_busca_textual.py
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from produtos import busca_textual
+
+
+class Command(BaseCommand):
+    help = 'Recria e reindexa as tabelas FTS5 da busca textual de produtos e lotes.'
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            self.stderr.write(self.style.WARNING("A busca FTS5 só está disponível no SQLite. As buscas continuam usando os filtros do ORM."))
+            return
+
+        with transaction.atomic(), connection.cursor() as cursor:
+            for sql in busca_textual.SQL_APAGAR_TABELAS:
+                cursor.execute(sql)
+            if not busca_textual.criar_tabelas(cursor):
+                self.stderr.write(self.style.ERROR("Este SQLite não suporta FTS5. As buscas continuam usando os filtros do ORM."))
+                return
+            busca_textual.reconstruir(cursor)
+
+        self.stdout.write(self.style.SUCCESS("Índice de busca textual reconstruído com sucesso!"))
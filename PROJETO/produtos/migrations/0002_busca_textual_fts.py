@@ -0,0 +1,33 @@
+# Cria as tabelas FTS5 da busca textual de produtos e lotes (apenas no SQLite).
+
+from django.db import migrations
+
+from produtos import busca_textual
+
+
+def criar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        if busca_textual.criar_tabelas(cursor):
+            busca_textual.reconstruir(cursor)
+
+
+def apagar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in busca_textual.SQL_APAGAR_TABELAS:
+            cursor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0001_initial'),
+        ('lotes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.RunPython(criar_indice, apagar_indice),
+    ]
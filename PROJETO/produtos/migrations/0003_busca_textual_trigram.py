@@ -0,0 +1,27 @@
+# Recria as tabelas FTS5 da busca textual com o tokenizador trigram (apenas no SQLite).
+
+from django.db import migrations
+
+from produtos import busca_textual
+
+
+def recriar_indice(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for sql in busca_textual.SQL_APAGAR_TABELAS:
+            cursor.execute(sql)
+        if busca_textual.criar_tabelas(cursor):
+            busca_textual.reconstruir(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('produtos', '0002_busca_textual_fts'),
+    ]
+
+    operations = [
+        # O formato das tabelas vem de produtos.busca_textual: ao desfazer, não há o que voltar.
+        migrations.RunPython(recriar_indice, migrations.RunPython.noop),
+    ]
@@ -83,6 +83,17 @@ class Produto(models.Model):
     def __str__(self):
         return f"{self.variedade}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Texto pesquisável lido do banco, para saber se a busca de lotes precisa ser refeita.
+        instance._texto_busca_original = (instance.__dict__.get('variedade'), instance.__dict__.get('tipo'))
+        return instance
+
+    def texto_busca_alterado(self):
+        """Indica se variedade ou tipo mudaram desde a leitura (sempre True para produto novo)."""
+        return getattr(self, '_texto_busca_original', None) != (self.variedade, self.tipo)
+
     def save(self, *args, **kwargs):
         update_fields_arg = kwargs.pop('update_fields', None)
 
@@ -95,6 +106,8 @@ class Produto(models.Model):
             super().save(*args, update_fields=update_fields_arg, **kwargs)
         else:
             super().save(*args, **kwargs)
+        # Depois dos sinais post_save, que ainda comparam com o texto anterior.
+        self._texto_busca_original = (self.variedade, self.tipo)
 
     @property
     def valor_total(self):
@@ -1,3 +1,67 @@
+import datetime
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from lotes.models import Lote
+from produtos import busca_textual
+from produtos.busca_textual import buscar_lotes, buscar_produtos, ids_lotes_ranqueados
+from produtos.models import Produto
+
+
+def criar_produto(cod, variedade, especie=''):
+    return Produto.objects.create(
+        cod=cod, unidade='BDJ', qtd_unid='1UN', tipo='Hortalicas',
+        variedade=variedade, especie=especie, preco=Decimal('1.00'), estoque=0,
+    )
+
+
+class BuscaTextualTests(TestCase):
+    def setUp(self):
+        self.rucula = criar_produto('RUC', 'Rúcula Cultivada')
+        self.amarosa = criar_produto('AMA', 'Batata Amarosa')
+        self.rosa = criar_produto('ROS', 'Rosa do Deserto')
+        self.lote = Lote.objects.create(produto=self.rucula, data_semeadura=datetime.date(2025, 2, 3), quantidade=10)
+        self.assertTrue(busca_textual.fts_disponivel())
+
+    def ids(self, queryset):
+        return list(queryset.values_list('id', flat=True))
+
+    def test_trecho_no_meio_da_palavra_e_sem_acentos(self):
+        self.assertEqual(self.ids(buscar_produtos(Produto.objects.order_by('cod'), 'rucula')), [self.rucula.id])
+        self.assertEqual(self.ids(buscar_produtos(Produto.objects.order_by('cod'), 'CULTIV')), [self.rucula.id])
+        self.assertEqual(set(self.ids(buscar_produtos(Produto.objects.order_by('cod'), 'rosa'))), {self.amarosa.id, self.rosa.id})
+        self.assertEqual(self.ids(buscar_produtos(Produto.objects.order_by('cod'), 'rosa deserto')), [self.rosa.id])
+
+    def test_palavras_curtas_usam_like(self):
+        self.assertEqual(self.ids(buscar_produtos(Produto.objects.order_by('cod'), 'do')), [self.rosa.id])
+        self.assertEqual(self.ids(buscar_produtos(Produto.objects.order_by('cod'), 'ro ser')), [self.rosa.id])
+        self.assertEqual(self.ids(buscar_produtos(Produto.objects.order_by('cod'), '%')), [])
+
+    def test_sinais_mantem_o_indice(self):
+        self.rosa.variedade = 'Orquídea'
+        self.rosa.save()
+        self.assertEqual(self.ids(buscar_produtos(Produto.objects.all(), 'rosa')), [self.amarosa.id])
+        self.assertEqual(self.ids(buscar_lotes(Lote.objects.all(), 'cultivada')), [self.lote.id])
+        self.assertEqual(self.ids(buscar_lotes(Lote.objects.all(), '03/02/2025')), [self.lote.id])
+
+        self.lote.delete()
+        self.assertEqual(self.ids(buscar_lotes(Lote.objects.all(), 'cultivada')), [])
+
+    def test_ranqueamento_do_pdv(self):
+        self.assertEqual(ids_lotes_ranqueados('rucul'), [self.lote.id])
+        # Sem palavra do tamanho do trigrama não há bm25: o PDV usa o índice em memória.
+        self.assertIsNone(ids_lotes_ranqueados('ru'))
+
+    def test_sem_fts5_usa_os_filtros_do_orm(self):
+        with mock.patch.object(busca_textual, 'fts_disponivel', return_value=False):
+            self.assertEqual(self.ids(buscar_produtos(Produto.objects.order_by('cod'), 'Amarosa')), [self.amarosa.id])
+            self.assertEqual(self.ids(buscar_lotes(Lote.objects.all(), 'Rúcula')), [self.lote.id])
+            self.assertIsNone(ids_lotes_ranqueados('rucula'))
+
+    def test_comando_de_reconstrucao(self):
+        call_command('reconstruir_busca_textual', stdout=StringIO())
+        self.assertEqual(self.ids(buscar_produtos(Produto.objects.all(), 'deserto')), [self.rosa.id])
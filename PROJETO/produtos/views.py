@@ -11,6 +11,7 @@ from .forms import ProdutoFilterForm
 from django.views.generic import ListView, DetailView, CreateView, UpdateView, DeleteView
 from rest_framework import viewsets
 from .serializers import ProdutoSerializer, NCMSerializer, CFOPSerializer
+from .busca_textual import buscar_produtos
 
 
 class ProdutoListView(ListView):
@@ -29,16 +30,8 @@ class ProdutoListView(ListView):
             status = form.cleaned_data.get('status')
 
             if query:
-                queryset = queryset.filter(
-                    Q(cod__icontains=query) |
-                    Q(variedade__icontains=query) |
-                    Q(especie__icontains=query) |
-                    Q(cultivar_info__icontains=query) |
-                    Q(ncm__codigo__icontains=query) | # Adicionado __codigo para busca em Foreign Key
-                    Q(ncm__descricao__icontains=query) | # Adicionado __descricao para busca em Foreign Key
-                    Q(cfop__codigo__icontains=query) | # Adicionado __codigo para busca em Foreign Key
-                    Q(cfop__descricao__icontains=query) # Adicionado __descricao para busca em Foreign Key
-                )
+                # Índice FTS5 (trecho de palavra, sem acentos), os mais relevantes (bm25) primeiro
+                queryset = buscar_produtos(queryset, query)
 
             if tipo:
                 queryset = queryset.filter(tipo=tipo)
@@ -75,6 +75,15 @@ DATABASES = {
     }
 }
 
+# Concorrência do SQLite (caixa_pdv/banco.py): PRAGMAs aplicados a cada conexão
+# e retentativas das transações de venda quando o banco está travado. Só essas
+# transações abrem com BEGIN IMMEDIATE; as demais usam o BEGIN padrão do SQLite.
+PDV_SQLITE_JOURNAL_MODE = 'WAL'
+PDV_SQLITE_BUSY_TIMEOUT_MS = 5000
+PDV_SQLITE_SYNCHRONOUS = 'NORMAL'
+PDV_TRANSACAO_TENTATIVAS = 3
+PDV_TRANSACAO_ESPERA = 0.1
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
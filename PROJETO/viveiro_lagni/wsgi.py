@@ -14,3 +14,11 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'viveiro_lagni.settings')
 
 application = get_wsgi_application()
+
+# Pré-constrói o índice de busca de lotes do PDV para que a primeira busca de
+# cada worker não pague o custo da construção.
+try:
+    from caixa_pdv.busca import indice_lotes
+    indice_lotes.construir()
+except Exception as e:
+    print(f"Aviso: não foi possível construir o índice de busca de lotes na inicialização: {e}")